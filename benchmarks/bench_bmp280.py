@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Scalar vs. batch BMP280 compensation of raw ADC samples."""
+
+import argparse
+import numpy as np
+import time
+
+from piweather.sensors import BMP280
+
+
+def sensor():
+    # Compensation only needs the calibration, skip the i2c setup
+    s = BMP280.__new__(BMP280)
+    s.calibration = dict(
+        T1=27504, T2=26435, T3=-1000,
+        P1=36477, P2=-10685, P3=3024, P4=2855, P5=140, P6=-7, P7=15500,
+        P8=-14600, P9=6000,
+    )
+    return s
+
+
+def scalar(s, raw_T, raw_p):
+    for t, p in zip(raw_T.tolist(), raw_p.tolist()):
+        s._compensated_pressure(p, s._compensated_temperature(t))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10**3, 10**4, 10**5])
+    args = parser.parse_args()
+
+    s = sensor()
+    print("{:>9s} {:>12s} {:>12s}".format("samples", "scalar [ms]",
+                                          "batch [ms]"))
+    for n in args.sizes:
+        raw_T = np.random.randint(400000, 600000, n)
+        raw_p = np.random.randint(300000, 500000, n)
+
+        start = time.perf_counter()
+        scalar(s, raw_T, raw_p)
+        t_scalar = time.perf_counter() - start
+
+        start = time.perf_counter()
+        s.compensate(raw_T, raw_p)
+        t_batch = time.perf_counter() - start
+
+        print("{:9d} {:12.2f} {:12.2f}".format(n, t_scalar * 1e3,
+                                               t_batch * 1e3))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Peak memory and latency of Measurement.data(), object matrix vs typed."""
+
+import argparse
+import numpy as np
+import os
+import piweather
+import random
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime, timedelta
+from piweather import Measurement
+from piweather.database import get_engine, get_schema
+from piweather.sensors import Dummy
+
+
+def fill(measurement, n, chunk=100000):
+    schema = get_schema()
+    t0 = datetime(2017, 1, 1)
+    with schema.engine.begin() as con:
+        for start in range(0, n, chunk):
+            schema.write(con, measurement.table, [
+                dict(time=t0 + timedelta(seconds=i),
+                     random=random.random(),
+                     randint=random.randint(0, 5))
+                for i in range(start, min(n, start + chunk))
+            ])
+
+
+def object_matrix(measurement):
+    """The former implementation of Measurement.data()."""
+    schema = get_schema()
+    with schema.engine.connect() as con:
+        rs = con.execute(schema.select(measurement.table))
+        matrix = np.array(rs.fetchall())
+        return {col: matrix[:, i] for i, col in enumerate(rs.keys())}
+
+
+def profile(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10**5, 10**6])
+    args = parser.parse_args()
+
+    print("{:>9s} {:>7s} {:>10s} {:>10s}".format(
+        "rows", "path", "time [s]", "peak [MB]"))
+    for n in args.sizes:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        try:
+            piweather.db = piweather.schema = None
+            get_engine("sqlite:///" + path)
+            m = Measurement(Dummy(), table="bench")
+            fill(m, n)
+
+            for name, func in (("object", object_matrix),
+                               ("typed", Measurement.data)):
+                elapsed, peak = profile(func, m)
+                print("{:9d} {:>7s} {:10.2f} {:10.1f}".format(
+                    n, name, elapsed, peak / 2**20))
+        finally:
+            os.remove(path)
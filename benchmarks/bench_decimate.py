@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Render payload and time of Scatter traces with and without decimation."""
+
+import argparse
+import json
+import numpy as np
+import time
+
+from datetime import datetime, timedelta
+from piweather.decimate import decimate
+
+
+def trace(n, gap_fraction=0.05):
+    t0 = datetime(2017, 1, 1)
+    x = np.array([t0 + timedelta(seconds=i) for i in range(n)], dtype=object)
+    y = np.sin(np.arange(n) / 600.) + np.random.normal(0, 0.1, n)
+    gaps = np.random.choice(n, int(n * gap_fraction / 100), replace=False)
+    for start in gaps:
+        y[start:start + 100] = np.nan
+    return x, y
+
+
+def payload(x, y):
+    return len(json.dumps({
+        "x": [t.isoformat() for t in x],
+        "y": [None if np.isnan(v) else float(v) for v in y],
+    }))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=1000,
+                        help="per-trace point budget")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10**4, 10**5, 10**6])
+    args = parser.parse_args()
+
+    print("{:>9s} {:>7s} {:>12s} {:>12s} {:>10s}".format(
+        "rows", "method", "raw [B]", "decim. [B]", "time [ms]"))
+    for n in args.sizes:
+        x, y = trace(n)
+        raw = payload(x, y)
+        for method in ("lttb", "minmax"):
+            start = time.perf_counter()
+            keep = decimate(x, y, args.points, method=method)
+            elapsed = time.perf_counter() - start
+            print("{:9d} {:>7s} {:12d} {:12d} {:10.1f}".format(
+                n, method, raw, payload(x[keep], y[keep]), elapsed * 1e3))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Insert throughput and read latency of the engine profiles under a
+concurrent writer (acquisition) and reader (dashboard) load."""
+
+import argparse
+import numpy as np
+import os
+import piweather
+import tempfile
+import threading
+import time
+
+from datetime import datetime, timedelta
+from piweather import Measurement
+from piweather.database import create_profiled_engine, get_schema
+from piweather.sensors import Dummy
+from sqlalchemy.exc import OperationalError
+
+
+def writer(measurement, stop, stats):
+    """One transaction per row, like an unbuffered acquisition job."""
+    while not stop.is_set():
+        try:
+            measurement.acquire()
+            stats["inserts"] += 1
+        except OperationalError:
+            stats["write_errors"] += 1
+
+
+def reader(measurement, stop, stats, window):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            measurement.data(since=datetime.now() - window)
+            stats["latency"].append(time.perf_counter() - start)
+        except OperationalError:
+            stats["read_errors"] += 1
+
+
+def run(url, profile, duration, readers, prefill):
+    piweather.db = create_profiled_engine(url, profile=profile)
+    piweather.schema = None
+    m = Measurement(Dummy(), table="bench_{}".format(profile or "bare"))
+
+    schema = get_schema()
+    t0 = datetime.now() - timedelta(seconds=prefill)
+    with schema.engine.begin() as con:
+        schema.write(con, m.table, [
+            dict(time=t0 + timedelta(seconds=i), random=0.5, randint=1)
+            for i in range(prefill)])
+
+    stop = threading.Event()
+    stats = dict(inserts=0, write_errors=0, read_errors=0, latency=[])
+    threads = [threading.Thread(target=writer, args=(m, stop, stats))]
+    threads += [threading.Thread(target=reader, args=(
+        m, stop, stats, timedelta(seconds=prefill))) for _ in range(readers)]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    piweather.db.dispose()
+
+    latency = np.array(stats["latency"] or [np.nan]) * 1e3
+    return (stats["inserts"] / duration,
+            np.percentile(latency, 50), np.percentile(latency, 95),
+            stats["write_errors"] + stats["read_errors"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="client/server database to compare "
+                        "the 'server' profile against a bare engine on, "
+                        "a temporary SQLite file by default")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--prefill", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.url is None:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        url, profiles = "sqlite:///" + path, (None, "sqlite")
+    else:
+        path, url, profiles = None, args.url, (None, "server")
+
+    print("{:>8s} {:>12s} {:>12s} {:>12s} {:>7s}".format(
+        "profile", "inserts/s", "read p50 ms", "read p95 ms", "errors"))
+    try:
+        for profile in profiles:
+            result = run(url, profile, args.duration, args.readers,
+                         args.prefill)
+            print("{:>8s} {:12.0f} {:12.2f} {:12.2f} {:7d}".format(
+                profile or "bare", *result))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if path is not None and os.path.exists(path + suffix):
+                os.remove(path + suffix)
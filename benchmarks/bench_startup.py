@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Import time and peak RSS of the headless and the dashboard startup path.
+
+Every scenario runs in a fresh interpreter. The exit status is non-zero if
+the headless path loads a dashboard module or exceeds the given limits.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+
+SCENARIOS = {
+    "package": "import piweather",
+    "headless": "import piweather.main, piweather.sensors\n"
+                "from piweather import Measurement",
+    "dashboard": "import piweather.main, piweather.sensors\n"
+                 "from piweather import Measurement\n"
+                 "import piweather.dashboard",
+}
+
+DASHBOARD_MODULES = ("dash", "plotly", "flask")
+
+CHILD = """
+import resource, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(repr((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            sorted(m for m in {modules!r} if m in sys.modules))))
+"""
+
+
+def measure(code):
+    out = subprocess.check_output(
+        [sys.executable, "-c", CHILD.format(code=code,
+                                            modules=DASHBOARD_MODULES)],
+        stderr=subprocess.DEVNULL, universal_newlines=True)
+    return eval(out.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float,
+                        help="limit of the headless import time")
+    parser.add_argument("--max-rss", type=float,
+                        help="limit of the headless peak RSS in MB")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    print("{:>10s} {:>10s} {:>9s}  {}".format(
+        "scenario", "time [ms]", "RSS [MB]", "dashboard modules"))
+    for name, code in SCENARIOS.items():
+        runs = [measure(code) for _ in range(args.repeat)]
+        seconds = float(np.median([run[0] for run in runs]))
+        rss = max(run[1] for run in runs) / 1024.
+        loaded = runs[0][2]
+        results[name] = dict(seconds=seconds, rss_mb=rss, dashboard=loaded)
+        print("{:>10s} {:10.1f} {:9.1f}  {}".format(
+            name, seconds * 1e3, rss, ", ".join(loaded) or "-"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    headless = results["headless"]
+    failures = []
+    if headless["dashboard"]:
+        failures.append("headless startup loads {}".format(
+            ", ".join(headless["dashboard"])))
+    if args.max_seconds and headless["seconds"] > args.max_seconds:
+        failures.append("headless startup takes {:.2f} s".format(
+            headless["seconds"]))
+    if args.max_rss and headless["rss_mb"] > args.max_rss:
+        failures.append("headless startup needs {:.1f} MB".format(
+            headless["rss_mb"]))
+    for failure in failures:
+        print("FAIL: " + failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Benchmark suite of the acquisition, storage, query and dashboard paths.
+
+Runs offline against temporary SQLite files. Results are written as JSON
+(`--output`), a previous result file given as `--baseline` is compared
+against case by case.
+"""
+
+import argparse
+import json
+import logging
+import numpy as np
+import os
+import piweather
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+from apscheduler.events import (EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED,
+                                EVENT_JOB_SUBMITTED)
+from apscheduler.schedulers.background import BackgroundScheduler
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from piweather import Measurement
+from piweather.database import get_engine, get_schema
+from piweather.sensors import Dummy
+
+
+SCALES = {
+    "quick": dict(
+        acquire=[1, 10], acquire_rounds=20,
+        rows=[10**3, 10**4], windows=[0.01, 1.0], repeat=3,
+        points=[10**3, 10**4],
+        jobs=[10, 50], job_interval=0.2, job_duration=2,
+    ),
+    "full": dict(
+        acquire=[1, 10, 100], acquire_rounds=100,
+        rows=[10**4, 10**5, 10**6], windows=[0.001, 0.01, 0.1, 1.0],
+        repeat=5,
+        points=[10**3, 10**4, 10**5],
+        jobs=[10, 100, 500], job_interval=1, job_duration=10,
+    ),
+}
+
+
+@contextmanager
+def database():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    piweather.db = piweather.schema = None
+    get_engine("sqlite:///" + path)
+    try:
+        yield
+    finally:
+        piweather.db.dispose()
+        piweather.db = piweather.schema = None
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def fill(measurement, n, end=None, chunk=100000):
+    """Insert `n` rows one second apart, the last one at `end`."""
+    schema = get_schema()
+    t0 = (end or datetime.now()) - timedelta(seconds=n - 1)
+    with schema.engine.begin() as con:
+        for start in range(0, n, chunk):
+            schema.write(con, measurement.table, [
+                dict(time=t0 + timedelta(seconds=i),
+                     random=random.random(),
+                     randint=random.randint(0, 5))
+                for i in range(start, min(n, start + chunk))
+            ])
+    return t0
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    """Median wall time of `repeat` calls in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def bench_acquire(scale):
+    """Measurement.acquire() throughput of N Dummy measurements."""
+    for n in scale["acquire"]:
+        with database():
+            with get_schema().deferred():
+                ms = [Measurement(Dummy(), table="acquire_{}".format(i))
+                      for i in range(n)]
+
+            start = time.perf_counter()
+            for _ in range(scale["acquire_rounds"]):
+                for m in ms:
+                    m.acquire()
+            elapsed = time.perf_counter() - start
+
+        total = n * scale["acquire_rounds"]
+        yield dict(measurements=n), dict(
+            acquisitions_per_s=total / elapsed,
+            us_per_acquisition=elapsed / total * 1e6)
+
+
+def bench_data(scale):
+    """Measurement.data() latency by table size and `since` window."""
+    for n in scale["rows"]:
+        with database():
+            m = Measurement(Dummy(), table="data")
+            end = datetime.now()
+            t0 = fill(m, n, end)
+            for window in scale["windows"]:
+                since = end - (end - t0) * window
+                rows = len(m.data(columns="random", since=since)["random"])
+                latency = timed(m.data, since=since, repeat=scale["repeat"])
+                yield dict(rows=n, window=window), dict(
+                    returned=rows, latency_ms=latency * 1e3)
+
+
+def bench_dashboard(scale):
+    """Scatter and default_layout() construction by point count."""
+    try:
+        from piweather import dashboard
+    except ImportError as e:
+        logging.warning("Skip dashboard benchmark: {}".format(e))
+        return
+
+    for n in scale["points"]:
+        with database():
+            m = Measurement(Dummy(), table="dashboard")
+            fill(m, n)
+            piweather.config = types.ModuleType("config")
+            piweather.config.TITLE = "benchmark"
+            piweather.config.VIEWPORT = timedelta(seconds=n)
+            piweather.config.MAX_POINTS = 1000
+            piweather.config.MEASUREMENTS = [m]
+            try:
+                scatter = timed(dashboard.Scatter, m, "random",
+                                repeat=scale["repeat"])
+                layout = timed(dashboard.default_layout,
+                               repeat=scale["repeat"])
+            finally:
+                piweather.config = None
+
+        yield dict(points=n), dict(
+            scatter_ms=scatter * 1e3, layout_ms=layout * 1e3)
+
+
+def bench_scheduler(scale):
+    """Lateness of N concurrent acquisition jobs on the scheduler."""
+    interval = scale["job_interval"]
+    default = piweather.scheduler
+
+    for n in scale["jobs"]:
+        lateness, missed = [], [0]
+
+        def on_submitted(event):
+            now = datetime.now(event.scheduled_run_times[0].tzinfo)
+            lateness.extend((now - t).total_seconds()
+                            for t in event.scheduled_run_times)
+
+        def on_missed(event):
+            missed[0] += 1
+
+        scheduler = piweather.scheduler = BackgroundScheduler()
+        scheduler.add_listener(on_submitted, EVENT_JOB_SUBMITTED)
+        scheduler.add_listener(
+            on_missed, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        try:
+            with database():
+                with get_schema().deferred():
+                    ms = [Measurement(Dummy(), table="job_{}".format(i))
+                          for i in range(n)]
+                for m in ms:
+                    m.frequency = interval
+                scheduler.start()
+                time.sleep(scale["job_duration"])
+                scheduler.shutdown(wait=True)
+        finally:
+            piweather.scheduler = default
+
+        runs = len(lateness)
+        lateness = np.array(lateness or [np.nan]) * 1e3
+        yield dict(jobs=n, interval=interval), dict(
+            runs=runs, missed=missed[0],
+            lateness_p50_ms=float(np.percentile(lateness, 50)),
+            lateness_p95_ms=float(np.percentile(lateness, 95)),
+            lateness_max_ms=float(np.max(lateness)))
+
+
+CASES = {
+    "acquire": bench_acquire,
+    "data": bench_data,
+    "dashboard": bench_dashboard,
+    "scheduler": bench_scheduler,
+}
+
+
+def metadata(scale):
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        time=datetime.now().isoformat(),
+        commit=commit,
+        scale=scale,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        machine=platform.machine(),
+    )
+
+
+def key(result):
+    return result["case"], json.dumps(result["params"], sort_keys=True)
+
+
+def report(results, baseline=None):
+    previous = {key(r): r["metrics"] for r in (baseline or {}).get(
+        "results", [])}
+
+    for result in results:
+        params = " ".join("{}={}".format(k, v)
+                          for k, v in sorted(result["params"].items()))
+        print("{:>10s}  {}".format(result["case"], params))
+        before = previous.get(key(result), {})
+        for name, value in sorted(result["metrics"].items()):
+            line = "{:>12s}  {:<20s} {:14.3f}".format("", name, value)
+            if before.get(name):
+                line += "  ({:+.1%})".format(value / before[name] - 1)
+            print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("cases", nargs="*", metavar="case",
+                        help="cases to run out of {}, all by default".format(
+                            ", ".join(sorted(CASES))))
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    args = parser.parse_args()
+
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error("unknown case(s) {}".format(", ".join(sorted(unknown))))
+
+    scale = SCALES[args.scale]
+    results = []
+    for case in args.cases or sorted(CASES):
+        print("running {} ...".format(case), file=sys.stderr)
+        for params, metrics in CASES[case](scale):
+            results.append(dict(case=case, params=params, metrics=metrics))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(meta=metadata(args.scale), results=results), f,
+                      indent=2)
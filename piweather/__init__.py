@@ -1,7 +1,27 @@
+import sys
+
 from apscheduler.schedulers.background import BackgroundScheduler
-from piweather.measurements import Measurement  # noqa
 
 scheduler = BackgroundScheduler()
+async_scheduler = None
 db = None
+schema = None
+write_buffer = None
+write_journal = None
+query_cache = None
 config = None
 app = None
+
+
+def __getattr__(name):
+    # Import Measurement (and with it sqlalchemy and numpy) on first use only
+    if name == "Measurement":
+        from piweather import measurements
+        return measurements.Measurement
+    raise AttributeError(
+        "module 'piweather' has no attribute '{}'".format(name))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ (PEP 562) is not available, import eagerly
+    from piweather.measurements import Measurement  # noqa
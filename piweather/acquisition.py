@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import piweather
+import threading
+
+from apscheduler.triggers.interval import IntervalTrigger
+from piweather import metrics
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_async_scheduler():
+    if piweather.async_scheduler is None:
+        workers = getattr(piweather.config, "ASYNC_WORKERS", 4)
+        piweather.async_scheduler = AsyncScheduler(max_workers=workers)
+    return piweather.async_scheduler
+
+
+async def run_blocking(func, *args):
+    """Run a blocking callable in the bounded executor of the scheduler."""
+    scheduler = get_async_scheduler()
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(scheduler.executor, func, *args)
+
+
+class AsyncJob(object):
+    """Interval job of an `AsyncScheduler`, mimicking the APScheduler API."""
+
+    def __init__(self, scheduler, func, seconds):
+        self._scheduler = scheduler
+        self.func = func
+        self.trigger = IntervalTrigger(seconds=seconds)
+        self._task = None
+
+    def reschedule(self, trigger="interval", seconds=0):
+        self.trigger = IntervalTrigger(seconds=seconds)
+        self._scheduler._restart(self)
+
+    def remove(self):
+        self._scheduler._remove(self)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        interval = self.trigger.interval.total_seconds()
+        next_time = loop.time() + interval
+
+        label = metrics.job_label(self.func)
+
+        while True:
+            await asyncio.sleep(max(0, next_time - loop.time()))
+            metrics.JOB_LATENESS.labels(job=label).observe(
+                max(0, loop.time() - next_time))
+            try:
+                await self.func()
+            except Exception:
+                logging.exception("Async job {} raised".format(self.func))
+
+            next_time += interval
+            if next_time < loop.time():
+                missed = (loop.time() - next_time) // interval + 1
+                logging.warning("Async job {} missed {:.0f} run(s)".format(
+                    self.func, missed))
+                metrics.JOB_MISSED.labels(job=label).inc(int(missed))
+                next_time = loop.time() + interval
+
+
+class AsyncScheduler(object):
+    """Runs acquisition jobs as coroutines on an event loop in one thread.
+
+    Native async sensors are awaited directly, blocking `Sensor.read()`
+    calls and database writes go to an executor of `max_workers` threads,
+    so the number of measurements is not bound by the number of threads.
+    """
+
+    def __init__(self, max_workers=4):
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = None
+        self._jobs = []
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def loop(self):
+        return self._loop
+
+    @property
+    def executor(self):
+        return self._executor
+
+    def get_jobs(self):
+        return list(self._jobs)
+
+    def add_job(self, func, trigger="interval", seconds=0):
+        job = AsyncJob(self, func, seconds)
+        self._jobs.append(job)
+        if self.running:
+            self._start(job)
+        return job
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="piweather-acquisition",
+            daemon=True)
+        self._thread.start()
+        for job in self._jobs:
+            self._start(job)
+
+    def shutdown(self, wait=True):
+        if not self.running:
+            return
+        jobs, self._jobs = self._jobs, []
+        asyncio.run_coroutine_threadsafe(self._stop(jobs), self._loop)
+        if wait:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+        self._thread = None
+
+    async def _stop(self, jobs):
+        tasks = [job._task for job in jobs if job._task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
+
+    def _start(self, job):
+        def create():
+            job._task = self._loop.create_task(job.run())
+        self._loop.call_soon_threadsafe(create)
+
+    def _restart(self, job):
+        if self.running:
+            self._cancel(job)
+            self._start(job)
+
+    def _remove(self, job):
+        self._jobs.remove(job)
+        if self.running:
+            self._cancel(job)
+
+    def _cancel(self, job):
+        def cancel():
+            if job._task is not None:
+                job._task.cancel()
+                job._task = None
+        self._loop.call_soon_threadsafe(cancel)
@@ -0,0 +1,186 @@
+import json
+import logging
+import numpy as np
+import os
+import struct
+import zlib
+
+from piweather.cache import get_query_cache
+from piweather.database import get_schema, map_numpy_dtype
+
+
+MAGIC = b"PIWX"
+VERSION = 1
+EXTENSION = ".pwx"
+
+# rows of a chunk, per column: dtype and length of the compressed values
+CHUNK = struct.Struct("<I")
+COLUMN = struct.Struct("<4sI")
+
+TYPES = {type_.__name__: type_ for type_ in (int, float)}
+
+
+def export(measurement, path, since=None, until=None, chunk_rows=None,
+           level=6):
+    """Stream the rows of `measurement` into a compressed columnar file.
+
+    The rows are read in chunks of `chunk_rows` by `iter_data()` and written
+    as one zlib compressed block per column and chunk. Timestamps are stored
+    as deltas of microseconds, which compress to almost nothing for regular
+    sampling. Every block records its dtype, integer columns containing NULLs
+    are stored as float64 with NaN. Returns the number of rows exported.
+    """
+    dtypes = measurement.sensor.dtypes
+    columns = ("time",) + tuple(sorted(dtypes))
+    header = json.dumps(dict(
+        table=measurement.table,
+        dtypes={col: dtypes[col].__name__ for col in columns[1:]},
+    )).encode("utf-8")
+
+    count = 0
+    previous = np.int64(0)
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<BI", VERSION, len(header)) + header)
+
+        for chunk in measurement.iter_data(columns, since, until, chunk_rows):
+            times = np.asarray(chunk["time"], dtype="datetime64[us]") \
+                .astype(np.int64)
+            deltas = np.diff(np.concatenate([[previous], times]))
+            previous = times[-1]
+
+            f.write(CHUNK.pack(len(times)))
+            _write_column(f, deltas, level)
+            for col in columns[1:]:
+                values = np.asarray(chunk[col])
+                if values.dtype == object:
+                    try:
+                        values = values.astype(map_numpy_dtype(dtypes[col]))
+                    except TypeError:
+                        values = np.array(values.tolist(), dtype=np.float64)
+                _write_column(f, values, level)
+
+            count += len(times)
+            logging.debug("exported {} rows of '{}'".format(
+                count, measurement.table))
+
+        f.write(CHUNK.pack(0))
+    return count
+
+
+def read(path):
+    """The table name, dtypes and an iterator over the chunks of `path`."""
+    f = open(path, "rb")
+    try:
+        magic, version, size = struct.unpack("<4sBI", f.read(9))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("'{}' is no piweather export".format(path))
+        header = json.loads(f.read(size).decode("utf-8"))
+    except Exception:
+        f.close()
+        raise
+
+    dtypes = {col: TYPES[name] for col, name in header["dtypes"].items()}
+    columns = ("time",) + tuple(sorted(dtypes))
+    return header["table"], dtypes, _iter_chunks(f, columns)
+
+
+def restore(measurement, path):
+    """Bulk-load an `export()` file into the table of `measurement`.
+
+    Every chunk is inserted at once, into the archive of the measurement if
+    it has one or within one transaction otherwise. The rollup buckets a
+    chunk covers are merged within the same transaction, and the tail window
+    is warmed again afterwards. Rows are appended, the table is expected not
+    to contain them yet. Returns the number of rows restored.
+    """
+    table, dtypes, chunks = read(path)
+    missing = set(measurement.sensor.dtypes) - set(dtypes)
+    if missing:
+        raise ValueError("Export of '{}' lacks the columns {}".format(
+            table, ", ".join(sorted(missing))))
+
+    count = 0
+    schema = get_schema()
+    for chunk in chunks:
+        if measurement.archive is not None:
+            measurement.archive.write_columns(measurement.table, chunk)
+        else:
+            keys = ("time",) + tuple(measurement.sensor.dtypes)
+            values = [_values(chunk[key], dtypes.get(key)) for key in keys]
+            rows = [dict(zip(keys, row)) for row in zip(*values)]
+            with schema.engine.begin() as con:
+                schema.write(con, measurement.table, rows)
+                if measurement.rollups is not None:
+                    measurement.rollups.rebuild(schema, con, rows)
+        count += len(chunk["time"])
+        logging.debug("restored {} rows of '{}'".format(
+            count, measurement.table))
+
+    cache = get_query_cache()
+    if cache is not None:
+        cache.invalidate(measurement.table)
+        if measurement.rollups is not None:
+            for rollup in measurement.rollups.tables.values():
+                cache.invalidate(rollup)
+    if measurement.tail is not None:
+        measurement.warm_tail()
+    return count
+
+
+def export_all(measurements, directory, **kwargs):
+    os.makedirs(directory, exist_ok=True)
+    for m in measurements:
+        path = os.path.join(directory, m.table + EXTENSION)
+        logging.info("export '{}' to {}".format(m.table, path))
+        count = export(m, path, **kwargs)
+        logging.info("exported {} rows of '{}'".format(count, m.table))
+
+
+def restore_all(measurements, directory):
+    for m in measurements:
+        path = os.path.join(directory, m.table + EXTENSION)
+        if not os.path.exists(path):
+            logging.warning("no export of '{}' at {}".format(m.table, path))
+            continue
+        logging.info("restore '{}' from {}".format(m.table, path))
+        count = restore(m, path)
+        logging.info("restored {} rows of '{}'".format(count, m.table))
+
+
+def _values(values, dtype):
+    """Python values of a column, NaN of integer columns as NULL."""
+    if dtype is int and values.dtype.kind == "f":
+        return [None if np.isnan(v) else v for v in values.tolist()]
+    return values.tolist()
+
+
+def _write_column(f, values, level):
+    values = np.ascontiguousarray(values)
+    data = zlib.compress(values.tobytes(), level)
+    f.write(COLUMN.pack(values.dtype.str.encode("ascii"), len(data)))
+    f.write(data)
+
+
+def _read_column(f, rows):
+    dtype, size = COLUMN.unpack(f.read(COLUMN.size))
+    values = np.frombuffer(zlib.decompress(f.read(size)),
+                           dtype=dtype.rstrip(b"\0").decode("ascii"))
+    if len(values) != rows:
+        raise ValueError("Corrupt export chunk")
+    return values
+
+
+def _iter_chunks(f, columns):
+    with f:
+        previous = np.int64(0)
+        while True:
+            rows, = CHUNK.unpack(f.read(CHUNK.size))
+            if not rows:
+                return
+
+            times = np.cumsum(_read_column(f, rows)) + previous
+            previous = times[-1]
+            chunk = dict(time=times.astype("datetime64[us]"))
+            for col in columns[1:]:
+                chunk[col] = _read_column(f, rows)
+            yield chunk
@@ -0,0 +1,122 @@
+import logging
+import piweather
+import threading
+import time
+
+from apscheduler.events import EVENT_SCHEDULER_SHUTDOWN
+from apscheduler.jobstores.base import JobLookupError
+from piweather.database import get_schema
+
+
+def get_buffer():
+    schema = get_schema()
+    buf = piweather.write_buffer
+
+    if buf is not None and buf.schema is schema:
+        return buf
+
+    settings = getattr(piweather.config, "WRITE_BUFFER", None)
+    if not settings:
+        return None
+
+    if buf is not None:
+        buf.close()
+    piweather.write_buffer = WriteBuffer(schema, **settings)
+    return piweather.write_buffer
+
+
+class WriteBuffer(object):
+    """Write-behind buffer collecting rows of all measurements of an engine.
+
+    Rows are flushed in a single transaction using executemany once
+    `max_rows` are queued, once the oldest row is `max_age` seconds old and
+    when the scheduler shuts down. `max_age` thus bounds the window of samples
+    lost on a crash. Callbacks passed along with the rows are called once
+    the rows are written.
+    """
+
+    def __init__(self, schema, max_rows=100, max_age=10):
+        self._schema = schema
+        self.max_rows = max_rows
+        self.max_age = max_age
+
+        self._rows = {}
+        self._callbacks = []
+        self._size = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._job = piweather.scheduler.add_job(
+            self.flush, "interval", seconds=max_age)
+        piweather.scheduler.add_listener(
+            self._on_shutdown, EVENT_SCHEDULER_SHUTDOWN)
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def __len__(self):
+        return self._size
+
+    def append(self, table, row, on_stored=None):
+        self.extend([(table, row)], on_stored)
+
+    def extend(self, rows, on_stored=None):
+        """Queue `(table, row)` pairs, `on_stored()` is called once written."""
+        with self._lock:
+            for table, row in rows:
+                self._rows.setdefault(table, []).append(row)
+            if on_stored is not None:
+                self._callbacks.append(on_stored)
+            self._size += len(rows)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (self._size >= self.max_rows or
+                   time.monotonic() - self._oldest >= self.max_age)
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, {}
+                callbacks, self._callbacks = self._callbacks, []
+                size, self._size = self._size, 0
+                oldest, self._oldest = self._oldest, None
+
+            if not rows and not callbacks:
+                return
+
+            logging.debug("flush {} buffered rows".format(size))
+            try:
+                with self._schema.engine.begin() as con:
+                    for table, batch in rows.items():
+                        self._schema.write(con, table, batch)
+            except Exception:
+                self._requeue(rows, callbacks, size, oldest)
+                raise
+
+        for callback in callbacks:
+            callback()
+
+    def close(self):
+        piweather.scheduler.remove_listener(self._on_shutdown)
+        try:
+            self._job.remove()
+        except JobLookupError:
+            pass
+        self.flush()
+
+    def _requeue(self, rows, callbacks, size, oldest):
+        with self._lock:
+            for table, batch in self._rows.items():
+                rows.setdefault(table, []).extend(batch)
+            self._rows = rows
+            self._callbacks = callbacks + self._callbacks
+            self._size += size
+            self._oldest = oldest
+
+    def _on_shutdown(self, event):
+        self.flush()
@@ -0,0 +1,217 @@
+import logging
+import numpy as np
+import piweather
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import timedelta
+from piweather import metrics
+from piweather.database import get_schema, fetch_columns
+from piweather.rollups import bucket
+
+
+def get_query_cache():
+    schema = get_schema()
+    cache = piweather.query_cache
+
+    if cache is not None and cache.schema is schema:
+        return cache
+
+    settings = getattr(piweather.config, "QUERY_CACHE", None)
+    if not settings:
+        return None
+
+    piweather.query_cache = QueryCache(schema, **settings)
+    return piweather.query_cache
+
+
+class Entry(object):
+    """Typed columns of one query, extended by rows inserted afterwards.
+
+    Appended rows are collected as tuples and converted into the columns in
+    one go the next time the entry is read, or once `COMPACT_ROWS` of them
+    are pending. Pending rows are counted by the size they take as columns.
+    """
+
+    COMPACT_ROWS = 1024
+
+    def __init__(self, columns, keys, dtypes):
+        self.created = time.monotonic()
+        self._columns = columns
+        self._keys = keys
+        self._dtypes = dtypes
+        self._tail = []
+        self._row_nbytes = sum(getattr(columns[key], "itemsize", 8)
+                               for key in keys)
+        times = columns["time"]
+        self._last = times[-1] if len(times) else None
+
+    @property
+    def nbytes(self):
+        return sum(getattr(col, "nbytes", 0)
+                   for col in self._columns.values()) + \
+            len(self._tail) * self._row_nbytes
+
+    def expired(self, ttl):
+        return time.monotonic() - self.created >= ttl
+
+    def append(self, row):
+        """Append `row` if it is newer, returns the number of bytes added."""
+        t = np.datetime64(row["time"], "us")
+        if self._last is not None and t <= self._last:
+            return 0
+        self._tail.append(tuple(row[key] for key in self._keys))
+        self._last = t
+        if len(self._tail) < Entry.COMPACT_ROWS:
+            return self._row_nbytes
+
+        before = self.nbytes - self._row_nbytes
+        self.columns()
+        return self.nbytes - before
+
+    def columns(self):
+        if self._tail:
+            tail = fetch_columns([self._tail], self._keys, self._dtypes)
+            if len(self._columns["time"]):
+                tail = {key: np.concatenate([self._columns[key], tail[key]])
+                        for key in self._keys}
+            self._columns, self._tail = tail, []
+        return self._columns
+
+
+class QueryCache(object):
+    """LRU cache of `Measurement.data()` query results of an engine.
+
+    Entries are keyed by table, columns and `since` floored to `bucket`
+    seconds, requests within the same bucket are served from the entry with
+    the rows up to `since` filtered out. Only the `max_since` newest buckets
+    of a table and columns are kept, older ones are superseded by the
+    moving `since` of a live view. Rows written by `store()` are appended to
+    the entries of their table, entries of rollup tables are dropped when a
+    bucket is written. Entries are dropped after `ttl` seconds to pick up
+    rows written elsewhere, the least recently used ones are evicted beyond
+    `max_bytes`.
+    """
+
+    def __init__(self, schema, max_bytes=32 * 2**20, ttl=300, bucket=60,
+                 max_since=4):
+        self._schema = schema
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bucket = timedelta(seconds=bucket)
+        self.max_since = max_since
+
+        self._entries = OrderedDict()
+        self._tables = {}
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def schema(self):
+        return self._schema
+
+    @property
+    def stats(self):
+        with self._lock:
+            requests = self._hits + self._misses
+            return dict(
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=self._hits / requests if requests else 0.,
+                entries=len(self._entries),
+                bytes=self._nbytes,
+            )
+
+    def get(self, table, columns, since, query, dtypes):
+        """Columns of the rows of `table` after `since`.
+
+        `columns` must contain "time" (or be None for all columns), on a miss
+        `query(since)` is called with the bucketed `since`.
+        """
+        floored = None if since is None else bucket(since, self.bucket)
+        key = (table, columns, floored)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expired(self.ttl):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                before = entry.nbytes
+                data = entry.columns()
+                self._nbytes += entry.nbytes - before
+            else:
+                self._misses += 1
+
+        metrics.QUERY_CACHE_REQUESTS.labels(
+            result="miss" if entry is None else "hit").inc()
+
+        if entry is None:
+            data = query(floored)
+            entry = Entry(data, tuple(data), dtypes)
+            self._put(key, entry)
+
+        metrics.QUERY_CACHE_BYTES.labels().set(self._nbytes)
+        if since is None or since == floored or not len(data["time"]):
+            return dict(data)
+
+        mask = data["time"] > np.datetime64(since, "us")
+        return {col: values[mask] for col, values in data.items()}
+
+    def extend(self, table, row):
+        with self._lock:
+            for key in list(self._tables.get(table, ())):
+                entry = self._entries[key]
+                if entry.expired(self.ttl):
+                    self._drop(key)
+                else:
+                    self._nbytes += entry.append(row)
+            self._evict()
+        metrics.QUERY_CACHE_BYTES.labels().set(self._nbytes)
+
+    def invalidate(self, table):
+        with self._lock:
+            for key in list(self._tables.get(table, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self._nbytes = 0
+
+    def _put(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            keys = self._tables.setdefault(key[0], set())
+            keys.add(key)
+            self._nbytes += entry.nbytes
+
+            buckets = sorted((k for k in keys if k[1] == key[1]),
+                             key=lambda k: (k[2] is not None, k[2]))
+            for superseded in buckets[:-self.max_since]:
+                logging.debug("drop superseded cached query {}".format(
+                    superseded))
+                self._drop(superseded)
+            self._evict()
+
+    def _evict(self):
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            evicted = next(iter(self._entries))
+            self._drop(evicted)
+            logging.debug("evict cached query {}".format(evicted))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        keys = self._tables[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._tables[key[0]]
+        self._nbytes -= entry.nbytes
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Append-only columnar archive of measurement tables.
+
+Every table is a directory of daily partitions, each holding one `.npy`
+file per column:
+
+    <directory>/<table>/columns.json
+    <directory>/<table>/<YYYYMMDD>/time.npy
+    <directory>/<table>/<YYYYMMDD>/<column>.npy
+
+The sorted `time.npy` of a partition is its index: range reads only open the
+partitions overlapping the range, memory-map their columns and slice them
+via a binary search on the time column without copying. Rows are appended
+by writing the values behind the last row and updating the row count in the
+fixed-size header afterwards. The time column is written last and its length
+is the row count of the partition: every column is appended at that offset,
+so rows of a partially written append are ignored and overwritten by the
+next one. A column added to a partition that already holds rows is missing
+for these rows, integer columns fall back to float64 with NaN then.
+"""
+
+import argparse
+import json
+import logging
+import numpy as np
+import os
+import struct
+import threading
+
+from datetime import datetime, timedelta
+from piweather.database import map_numpy_dtype, iter_columns
+from sqlalchemy import Integer, Float, DateTime
+
+
+HEADER_SIZE = 128
+MAGIC = b"\x93NUMPY\x01\x00"
+PARTITION_FORMAT = "%Y%m%d"
+
+
+def _header(dtype, length):
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}" \
+        .format(np.lib.format.dtype_to_descr(dtype), length)
+    size = HEADER_SIZE - len(MAGIC) - 2
+    return MAGIC + struct.pack("<H", size) + \
+        header.ljust(size - 1).encode("latin1") + b"\n"
+
+
+def _read_header(f):
+    f.seek(0)
+    np.lib.format.read_magic(f)
+    shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    return dtype, shape[0]
+
+
+def _length(f):
+    return _read_header(f)[1]
+
+
+def _missing(dtype, length):
+    """`length` missing values, integer columns fall back to float64/NaN."""
+    if dtype.kind == "M":
+        return np.full(length, np.datetime64("NaT"), dtype=dtype)
+    if dtype.kind != "f":
+        dtype = np.dtype(np.float64)
+    return np.full(length, np.nan, dtype=dtype)
+
+
+def array_length(path):
+    """Length of the array stored at `path`, 0 if there is none."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        return _length(f)
+
+
+def append_array(path, values, length=None):
+    """Append `values` to the one-dimensional array stored at `path`.
+
+    The values are written behind the first `length` elements, replacing any
+    element after them, by default behind the length stored in the header.
+    A new array is filled with missing values up to `length`.
+    """
+    values = np.ascontiguousarray(values)
+    if not os.path.exists(path):
+        gap = _missing(values.dtype, length or 0)
+        with open(path, "wb") as f:
+            f.write(_header(gap.dtype if len(gap) else values.dtype, 0))
+            f.write(gap.tobytes())
+
+    with open(path, "r+b") as f:
+        dtype, stored = _read_header(f)
+        if length is None:
+            length = stored
+        values = np.ascontiguousarray(values, dtype=dtype)
+        f.seek(HEADER_SIZE + length * values.dtype.itemsize)
+        f.write(values.tobytes())
+        f.flush()
+        f.seek(0)
+        f.write(_header(values.dtype, length + len(values)))
+
+
+def load_array(path):
+    """Memory-map the array stored at `path`, read-only."""
+    values = np.load(path, mmap_mode="r")
+    if not len(values):
+        return np.asarray(values)
+    return values
+
+
+class ColumnarArchive(object):
+    """Daily partitioned `.npy` columns of measurement tables.
+
+    Empty results are returned as empty lists like `Measurement.data()`
+    does, a result within a single partition as read-only views of the
+    memory-mapped files.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._dtypes = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def register(self, table, dtypes):
+        """Create `table` or add the missing columns of `dtypes` to it."""
+        path = os.path.join(self._directory, table)
+        os.makedirs(path, exist_ok=True)
+        meta = os.path.join(path, "columns.json")
+
+        with self._lock:
+            stored = {}
+            if os.path.exists(meta):
+                with open(meta) as f:
+                    stored = json.load(f)
+
+            columns = dict(stored)
+            for col, type_ in dtypes.items():
+                columns.setdefault(
+                    col, np.dtype(map_numpy_dtype(type_)).str)
+            if columns != stored:
+                with open(meta, "w") as f:
+                    json.dump(columns, f, indent=2, sort_keys=True)
+
+            self._dtypes[table] = {
+                col: np.dtype(dtype) for col, dtype in columns.items()}
+
+    def dtypes(self, table):
+        if table not in self._dtypes:
+            with open(os.path.join(self._directory, table,
+                                   "columns.json")) as f:
+                self._dtypes[table] = {
+                    col: np.dtype(dtype)
+                    for col, dtype in json.load(f).items()}
+        return self._dtypes[table]
+
+    def write(self, table, rows):
+        if isinstance(rows, dict):
+            rows = [rows]
+        columns = {col: np.array([row[col] for row in rows], dtype=dtype)
+                   for col, dtype in self.dtypes(table).items()}
+        columns["time"] = np.array([row["time"] for row in rows],
+                                   dtype="datetime64[us]")
+        self.write_columns(table, columns)
+
+    def write_columns(self, table, columns):
+        """Append time ordered `columns` to the partitions of their days."""
+        dtypes = self.dtypes(table)
+        times = np.asarray(columns["time"], dtype="datetime64[us]")
+        if not len(times):
+            return
+
+        days = times.astype("datetime64[D]")
+        bounds = np.concatenate(
+            [[0], np.flatnonzero(days[1:] != days[:-1]) + 1, [len(times)]])
+
+        with self._lock:
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                path = self._partition(table, days[start], create=True)
+                time_path = os.path.join(path, "time.npy")
+                length = array_length(time_path)
+                for col, dtype in dtypes.items():
+                    values = np.asarray(columns[col][start:end], dtype=dtype)
+                    append_array(os.path.join(path, col + ".npy"), values,
+                                 length)
+                append_array(time_path, times[start:end], length)
+
+    def partitions(self, table, since=None, until=None):
+        """Paths of the partitions overlapping `(since, until]`."""
+        path = os.path.join(self._directory, table)
+        days = sorted(name for name in os.listdir(path)
+                      if os.path.isdir(os.path.join(path, name)))
+        if since is not None:
+            days = [d for d in days if d >= since.strftime(PARTITION_FORMAT)]
+        if until is not None:
+            days = [d for d in days if d <= until.strftime(PARTITION_FORMAT)]
+        return [os.path.join(path, day) for day in days]
+
+    def iter_data(self, table, columns=None, since=None, until=None,
+                  chunk_rows=None):
+        """Iterate over the rows within `(since, until]` in columnar chunks.
+
+        The chunks are views of the memory-mapped partitions, at most one per
+        partition or `chunk_rows` rows each.
+        """
+        columns = self._columns(table, columns)
+        for path in self.partitions(table, since, until):
+            times = load_array(os.path.join(path, "time.npy"))
+            first, last = 0, len(times)
+            if since is not None:
+                first = np.searchsorted(
+                    times, np.datetime64(since, "us"), side="right")
+            if until is not None:
+                last = np.searchsorted(
+                    times, np.datetime64(until, "us"), side="right")
+            if first >= last:
+                continue
+
+            data = {col: self._column(path, col, len(times))
+                    for col in columns}
+            step = chunk_rows or last - first
+            for start in range(first, last, step):
+                stop = min(start + step, last)
+                yield {col: values[start:stop]
+                       for col, values in data.items()}
+
+    def data(self, table, columns=None, since=None, until=None):
+        chunks = list(self.iter_data(table, columns, since, until))
+        if not chunks:
+            return {col: [] for col in self._columns(table, columns)}
+        if len(chunks) == 1:
+            return chunks[0]
+        return {col: np.concatenate([chunk[col] for chunk in chunks])
+                for col in chunks[0]}
+
+    def _columns(self, table, columns):
+        if isinstance(columns, str):
+            return (columns,)
+        elif columns is None:
+            return ("time",) + tuple(sorted(self.dtypes(table)))
+        return tuple(columns)
+
+    def _column(self, path, col, length):
+        filename = os.path.join(path, col + ".npy")
+        if not os.path.exists(filename):
+            # column added after the partition was written
+            return np.full(length, np.nan)
+        return load_array(filename)[:length]
+
+    def _partition(self, table, day, create=False):
+        path = os.path.join(self._directory, table,
+                            day.astype(datetime).strftime(PARTITION_FORMAT))
+        if create and not os.path.isdir(path):
+            logging.debug("create archive partition '{}'".format(path))
+            os.makedirs(path, exist_ok=True)
+        return path
+
+
+SQL_DTYPE_MAP = (
+    (DateTime, datetime),
+    (Integer, int),
+    (Float, float),
+)
+
+
+def reflect_dtypes(table):
+    """Map the columns of a reflected SQL `table` to sensor dtypes."""
+    dtypes = {}
+    for column in table.c:
+        if column.name == "time":
+            continue
+        for sql_type, type_ in SQL_DTYPE_MAP:
+            if isinstance(column.type, sql_type):
+                dtypes[column.name] = type_
+                break
+        else:
+            raise TypeError("No dtype known to map for column '{}' "
+                            "of type {}".format(column.name, column.type))
+    return dtypes
+
+
+def migrate(schema, table, archive, since=None, until=None,
+            chunk_rows=100000):
+    """Copy the rows of the SQL `table` into `archive` in bounded chunks.
+
+    Only rows after the newest archived row are copied, so an interrupted
+    migration can be resumed. Returns the number of rows copied.
+    """
+    dtypes = reflect_dtypes(schema.table(table))
+    archive.register(table, dtypes)
+
+    partitions = archive.partitions(table)
+    if partitions:
+        times = load_array(os.path.join(partitions[-1], "time.npy"))
+        if len(times):
+            newest = times[-1].astype(datetime)
+            since = newest if since is None else max(since, newest)
+
+    columns = ("time",) + tuple(sorted(dtypes))
+    count = 0
+    for chunk in iter_columns(schema, table, columns, dict(
+            dtypes, time=datetime), since, until, chunk_rows):
+        archive.write_columns(table, chunk)
+        count += len(chunk["time"])
+        logging.info("migrated {} rows of '{}'".format(count, table))
+    return count
+
+
+if __name__ == '__main__':
+    from piweather.database import create_profiled_engine, Schema
+
+    parser = argparse.ArgumentParser(
+        description="Migrate SQL measurement tables into a columnar archive")
+    parser.add_argument("url", help="database url")
+    parser.add_argument("directory", help="archive directory")
+    parser.add_argument("tables", nargs="+")
+    parser.add_argument("--days", type=int,
+                        help="only migrate the last DAYS days")
+    parser.add_argument("--chunk-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    schema = Schema(create_profiled_engine(args.url))
+    archive = ColumnarArchive(args.directory)
+    since = None
+    if args.days:
+        since = datetime.now() - timedelta(days=args.days)
+    for table in args.tables:
+        migrate(schema, table, archive, since, chunk_rows=args.chunk_rows)
@@ -1,32 +1,129 @@
 import dash
 import dash_html_components as html
 import dash_core_components as dcc
+import flask
+import numpy as np
 import plotly.graph_objs as go
 import piweather
 import uuid
 
-from piweather.helper import get_viewport
+from dash.dependencies import Input, Output, State, MATCH
+from dash.exceptions import PreventUpdate
+from datetime import datetime, timedelta
+from piweather import metrics
+from piweather.decimate import decimate
+from piweather.helper import get_viewport, get_resolution
+
+
+# points of a live trace are counted per 1/TRIM_SLOTS of the viewport
+TRIM_SLOTS = 100
 
 
 def create_app():
     app = dash.Dash(piweather.config.TITLE)
     app.title = piweather.config.TITLE
+    app.config.suppress_callback_exceptions = True
     app.css.append_css({
         "external_url": "https://codepen.io/chriddyp/pen/bWLwgP.css"})
+
+    app.callback(
+        [Output(LiveGraph.ids("graph"), "extendData"),
+         Output(LiveGraph.ids("watermarks"), "data")],
+        [Input(LiveGraph.ids("interval"), "n_intervals")],
+        [State(LiveGraph.ids("watermarks"), "data")],
+    )(extend_live_graph)
+    app.server.route("/metrics")(metrics_endpoint)
+
     return app
 
 
+def metrics_endpoint():
+    return flask.Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 def default_layout():
     layout = [TitleBar()]
+    live = getattr(piweather.config, "LIVE_INTERVAL", None)
 
     for measurement in getattr(piweather.config, "MEASUREMENTS", []):
-        layout.append(
-            Graph([Scatter(measurement, c) for c in measurement.columns])
-        )
+        plots = [Scatter(measurement, c) for c in measurement.columns]
+        layout.append(LiveGraph(plots) if live else Graph(plots))
 
     return html.Div(layout, className="container")
 
 
+def extend_live_graph(n_intervals, watermarks):
+    """Fetch the rows inserted since each trace's watermark.
+
+    Rows are queried at the resolution the trace was drawn with, so traces
+    drawn from rollups are extended by rollup rows only. Returns the
+    `extendData` update of a `LiveGraph` together with the advanced
+    watermarks. Traces are trimmed on the client to the points within
+    `VIEWPORT`, to the precision of one slot.
+    """
+    measurements = {
+        m.table: m for m in getattr(piweather.config, "MEASUREMENTS", [])
+    }
+    first_slot = _slot(get_viewport())
+
+    update, indices, max_points = dict(x=[], y=[]), [], []
+    for i, trace in enumerate(watermarks["traces"]):
+        measurement = measurements.get(trace["table"])
+        if measurement is None:
+            continue
+
+        column = trace["column"]
+        data = measurement.data(
+            columns=["time", column],
+            since=_from_watermark(trace["since"]),
+            resolution=timedelta(seconds=trace["resolution"]))
+        if len(data["time"]) == 0:
+            continue
+
+        slots = dict(trace["slots"])
+        for slot, count in _count_slots(data["time"]):
+            slots[slot] = slots.get(slot, 0) + count
+        trace["slots"] = sorted(
+            [slot, count] for slot, count in slots.items()
+            if slot >= first_slot)
+
+        update["x"].append(data["time"])
+        update["y"].append(data[column])
+        indices.append(i)
+        max_points.append(sum(count for _, count in trace["slots"]))
+        trace["since"] = _to_watermark(np.max(data["time"]))
+
+    if not indices:
+        raise PreventUpdate
+
+    limit = dict(x=max_points, y=max_points)
+    return [update, indices, limit], watermarks
+
+
+def _to_watermark(time):
+    return str(np.datetime64(time, "us"))
+
+
+def _from_watermark(watermark):
+    return np.datetime64(watermark, "us").astype(datetime)
+
+
+def _slot_width():
+    viewport = getattr(piweather.config, "VIEWPORT", timedelta(hours=24))
+    return max(1, int(viewport.total_seconds() * 1e6) // TRIM_SLOTS)
+
+
+def _slot(time):
+    return int(np.datetime64(time, "us").astype(np.int64)) // _slot_width()
+
+
+def _count_slots(times):
+    slots = np.asarray(times, dtype="datetime64[us]").astype(np.int64) \
+        // _slot_width()
+    return [[int(slot), int(count)]
+            for slot, count in zip(*np.unique(slots, return_counts=True))]
+
+
 class TitleBar(html.H1):
 
     style = {"textAlign": "center"}
@@ -84,11 +181,55 @@ class Graph(dcc.Graph):
         )
 
 
+class LiveGraph(html.Div):
+    """Graph appending the samples inserted after the page was loaded.
+
+    Every `interval` seconds only the rows newer than each trace's watermark
+    are queried and sent to the client via the graph's `extendData`.
+    """
+
+    @staticmethod
+    def ids(kind, index=MATCH):
+        return {"type": "piweather-live-" + kind, "index": index}
+
+    def __init__(self, plots=[], ylabel="", interval=None, *args, **kwargs):
+        if interval is None:
+            interval = getattr(piweather.config, "LIVE_INTERVAL", 10)
+        index = str(uuid.uuid4())
+
+        watermarks = {"traces": [plot._watermark for plot in plots]}
+        super(LiveGraph, self).__init__([
+            Graph(plots, ylabel, id=self.ids("graph", index)),
+            dcc.Interval(id=self.ids("interval", index),
+                         interval=interval * 1000),
+            dcc.Store(id=self.ids("watermarks", index), data=watermarks),
+        ], *args, **kwargs)
+
+
 class Scatter(go.Scatter):
 
-    def __init__(self, measurement, column, **kwargs):
+    def __init__(self, measurement, column, max_points=None,
+                 decimation="lttb", **kwargs):
+        if max_points is None:
+            max_points = getattr(piweather.config, "MAX_POINTS", 1000)
+
+        resolution = get_resolution()
         data = measurement.data(columns=["time", column],
-                                since=get_viewport())
+                                since=get_viewport(), resolution=resolution)
+        x, y = np.asarray(data["time"]), np.asarray(data[column])
+        if max_points and len(y) > max_points:
+            keep = decimate(x, y, max_points, method=decimation)
+            x, y = x[keep], y[keep]
+
         kwargs.setdefault("mode", "markers")
         kwargs.setdefault("name", column)
-        super(Scatter, self).__init__(x=data["time"], y=data[column], **kwargs)
+        super(Scatter, self).__init__(x=x, y=y, **kwargs)
+
+        since = np.max(x) if len(x) else get_viewport()
+        self._watermark = {
+            "table": measurement.table,
+            "column": column,
+            "since": _to_watermark(since),
+            "resolution": resolution.total_seconds(),
+            "slots": _count_slots(x),
+        }
@@ -1,7 +1,14 @@
 import logging
+import numpy as np
 import piweather
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from sqlalchemy import create_engine
+from piweather import metrics
+from piweather.partitions import MonthlyPartitions
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy import MetaData, Table, Column, Index, sql
 from sqlalchemy import Integer, Float, DateTime
 
 
@@ -11,6 +18,32 @@ DTYPE_MAP = {
     datetime: DateTime,
 }
 
+NUMPY_DTYPE_MAP = {
+    int: np.int64,
+    float: np.float64,
+    datetime: "datetime64[us]",
+}
+
+
+ENGINE_PROFILES = {
+    # PRAGMAs applied to every new SQLite connection
+    "sqlite": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 2**20,
+        "cache_size": -16 * 2**10,      # in KiB if negative
+        "busy_timeout": 5000,           # in ms
+    },
+    # keyword arguments of create_engine() for client/server databases
+    "server": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": 3600,
+        "pool_pre_ping": True,
+    },
+}
+
 
 def get_engine(url=None):
     if piweather.db is None:
@@ -22,12 +55,384 @@ def get_engine(url=None):
         else:
             logging.error("No DB_ENGINE url specified")
             raise RuntimeError
-        piweather.db = create_engine(db_url)
+        piweather.db = create_profiled_engine(db_url)
 
     return piweather.db
 
 
+def create_profiled_engine(url, profile=None, **options):
+    """Create an engine for `url` tuned by one of `ENGINE_PROFILES`.
+
+    `profile` and `options` default to the DB_PROFILE and DB_OPTIONS config
+    settings, options override the settings of the profile. The "auto"
+    profile picks "sqlite" for SQLite urls and "server" otherwise, None
+    creates a bare engine.
+    """
+    if profile is None:
+        profile = getattr(piweather.config, "DB_PROFILE", "auto")
+    if not options:
+        options = getattr(piweather.config, "DB_OPTIONS", {})
+    if profile == "auto":
+        profile = "sqlite" if str(url).startswith("sqlite") else "server"
+    if profile is None:
+        return create_engine(url)
+    if profile not in ENGINE_PROFILES:
+        raise ValueError("Unknown engine profile '{}'".format(profile))
+
+    settings = dict(ENGINE_PROFILES[profile], **options)
+    logging.debug("create engine with profile '{}': {}".format(
+        profile, settings))
+
+    if profile == "server":
+        return create_engine(url, **settings)
+
+    engine = create_engine(url)
+    event.listen(engine, "connect", _sqlite_pragmas(settings))
+    return engine
+
+
+def _sqlite_pragmas(pragmas):
+    def on_connect(dbapi_con, con_record):
+        cursor = dbapi_con.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(pragma, value))
+        cursor.close()
+    return on_connect
+
+
+def get_schema():
+    engine = get_engine()
+    if piweather.schema is None or piweather.schema.bind is not engine:
+        piweather.schema = Schema(engine)
+    return piweather.schema
+
+
 def map_dtype(dtype):
     if dtype not in DTYPE_MAP:
         raise TypeError("No column known to map for '{}'".format(dtype))
     return DTYPE_MAP[dtype]
+
+
+def map_numpy_dtype(dtype):
+    if dtype not in NUMPY_DTYPE_MAP:
+        raise TypeError("No array type known to map for '{}'".format(dtype))
+    return NUMPY_DTYPE_MAP[dtype]
+
+
+def fetch_columns(chunks, keys, dtypes):
+    """Fill one typed array per column from an iterable of row chunks.
+
+    Only a single chunk is held as Python objects at a time. Integer columns
+    containing NULLs fall back to float64 with NaN.
+    """
+    parts = {key: [] for key in keys}
+    for rows in chunks:
+        if not rows:
+            continue
+        for key, values in zip(keys, zip(*rows)):
+            parts[key].append(_typed_array(values, dtypes.get(key)))
+
+    if not any(parts.values()):
+        return {key: [] for key in keys}
+    return {key: np.concatenate(parts[key]) for key in keys}
+
+
+def iter_columns(schema, name, columns, dtypes, since=None, until=None,
+                 chunk_rows=10000):
+    """Iterate over the rows of `name` within `(since, until]` in chunks.
+
+    Pages of `chunk_rows` rows are fetched in time order through a
+    server-side cursor, each continuing after the timestamp the previous one
+    ended with (keyset pagination), so memory stays bounded by `chunk_rows`
+    regardless of the table size. Rows sharing a timestamp have no defined
+    order, so the rows at the last timestamp of a full page are fetched as a
+    whole and a chunk may exceed `chunk_rows` by them.
+    """
+    columns = tuple(columns)
+    query = columns if "time" in columns else columns + ("time",)
+    pos = query.index("time")
+
+    with schema.engine.connect() as con:
+        con = con.execution_options(stream_results=True)
+        after = since
+
+        while True:
+            stm = schema.page(name, query, after, until)
+            rows = con.execute(stm, since=after, until=until,
+                               limit=chunk_rows).fetchall()
+            if not rows:
+                return
+
+            full = len(rows) == chunk_rows
+            if full:
+                after = rows[-1][pos]
+                rows = [row for row in rows if row[pos] != after]
+                rows.extend(con.execute(schema.at(name, query, after),
+                                        since=after, until=after))
+
+            chunk = fetch_columns([rows], query, dtypes)
+            yield {col: chunk[col] for col in columns}
+
+            if not full:
+                return
+
+
+def _typed_array(values, dtype):
+    if dtype is None:
+        return np.array(values)
+    try:
+        return np.array(values, dtype=map_numpy_dtype(dtype))
+    except (TypeError, ValueError):
+        return np.array(values, dtype=np.float64)
+
+
+class Schema(object):
+    """Registry of the measurement tables of one engine.
+
+    Tables are reflected or created once and handed out as cached `Table`
+    objects together with their insert/select statements, which are compiled
+    only once per engine. Within `deferred()` registrations are collected and
+    created in a single batch. Every table gets an index on `time`, existing
+    tables lacking it or some of the registered columns are migrated on
+    registration, the existing partitions of partitioned tables included.
+
+    Partitioned tables store their rows in one partition per month. PostgreSQL
+    routes rows and prunes queries natively, on other backends the partitions
+    are separate `<table>_YYYYMM` tables which `write()` and `select()` route
+    to.
+    """
+
+    def __init__(self, engine):
+        self._bind = engine
+        self._engine = engine.execution_options(compiled_cache={})
+        self._metadata = MetaData()
+        self._pending = {}
+        self._partitions = {}
+        self._statements = {}
+        self._deferred = 0
+        self._lock = threading.RLock()
+
+    @property
+    def bind(self):
+        return self._bind
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def native_partitioning(self):
+        return self._bind.dialect.name == "postgresql"
+
+    def register(self, name, dtypes, partitioned=False):
+        columns = [Column("time", map_dtype(datetime), index=True)]
+        for col, type_ in dtypes.items():
+            columns.append(Column(col, map_dtype(type_)))
+
+        with self._lock:
+            if name in self._metadata.tables:
+                return
+            self._pending[name] = (columns, partitioned)
+            if not self._deferred:
+                self.flush()
+
+    @contextmanager
+    def deferred(self):
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+
+            with self._bind.connect() as con:
+                inspector = inspect(con)
+                existing = set(inspector.get_table_names())
+                created = []
+                for name, (columns, partitioned) in self._pending.items():
+                    if name in existing:
+                        logging.debug("reflect table '{}'".format(name))
+                        table = Table(name, self._metadata, autoload_with=con)
+                        self._migrate_columns(con, table, columns)
+                        self._migrate_time_index(con, inspector, table)
+                    else:
+                        logging.debug("create table '{}'".format(name))
+                        kwargs = {}
+                        if partitioned and self.native_partitioning:
+                            kwargs["postgresql_partition_by"] = "RANGE (time)"
+                        created.append(
+                            Table(name, self._metadata, *columns, **kwargs))
+
+                    if partitioned:
+                        router = self._partitions[name] = MonthlyPartitions(
+                            name, existing)
+                        if name in existing and not self.native_partitioning:
+                            self._migrate_partitions(con, router, columns)
+                self._metadata.create_all(con, tables=created)
+
+            self._pending = {}
+
+    def partitions(self, name):
+        self.table(name)
+        return self._partitions.get(name)
+
+    def write(self, con, name, rows):
+        if isinstance(rows, dict):
+            rows = [rows]
+
+        start = time.perf_counter()
+        self._write(con, name, rows)
+        metrics.INSERT_SECONDS.labels(table=name).observe(
+            time.perf_counter() - start)
+        metrics.ROWS_WRITTEN.labels(table=name).observe(len(rows))
+
+    def _write(self, con, name, rows):
+        router = self.partitions(name)
+        if router is None:
+            con.execute(self.insert(name), rows)
+            return
+
+        routed = {}
+        for row in rows:
+            routed.setdefault(router.name(row["time"]), []).append(row)
+
+        for partition, batch in routed.items():
+            self._create_partition(con, router, batch[0]["time"])
+            if self.native_partitioning:
+                partition = name
+            con.execute(self.insert(partition), batch)
+
+    def table(self, name):
+        with self._lock:
+            if name in self._pending:
+                self.flush()
+            if name not in self._metadata.tables:
+                Table(name, self._metadata, autoload_with=self._bind)
+            return self._metadata.tables[name]
+
+    def insert(self, name):
+        key = ("insert", name)
+        if key not in self._statements:
+            self._statements[key] = self.table(name).insert()
+        return self._statements[key]
+
+    def select(self, name, columns=None, since=None):
+        tables = self._route(name, since)
+        key = ("select", tables, columns, since is not None)
+        if key not in self._statements:
+            self._statements[key] = self._union(
+                tables, columns, since is not None)
+        return self._statements[key]
+
+    def page(self, name, columns=None, since=None, until=None):
+        """Time ordered select of the first `limit` rows."""
+        tables = self._route(name, since, until)
+        key = ("page", tables, columns, since is not None, until is not None)
+        if key not in self._statements:
+            stm = self._union(tables, columns, since is not None,
+                              until is not None)
+            self._statements[key] = stm \
+                .order_by(sql.literal_column("time")) \
+                .limit(sql.bindparam("limit"))
+        return self._statements[key]
+
+    def at(self, name, columns, time):
+        """Select of the rows at `time`, bound as both `since` and `until`."""
+        tables = self._route(name, time, time)
+        key = ("at", tables, columns)
+        if key not in self._statements:
+            self._statements[key] = self._union(
+                tables, columns, True, True, inclusive=True)
+        return self._statements[key]
+
+    def latest(self, name, columns=None, since=None):
+        """Select of the newest `limit` rows, newest first."""
+        tables = self._route(name, since)
+        key = ("latest", tables, columns, since is not None)
+        if key not in self._statements:
+            stm = self._union(tables, columns, since is not None)
+            self._statements[key] = stm \
+                .order_by(sql.literal_column("time").desc()) \
+                .limit(sql.bindparam("limit"))
+        return self._statements[key]
+
+    def _route(self, name, since=None, until=None):
+        router = self.partitions(name)
+        if router is None or self.native_partitioning:
+            return (name,)
+        return tuple(router.partitions(since, until)) or (name,)
+
+    def _union(self, tables, columns, since, until=False, inclusive=False):
+        stms = []
+        for table in map(self.table, tables):
+            if columns is None:
+                stm = sql.select([table])
+            else:
+                stm = sql.select([table.c[col] for col in columns])
+            if since and inclusive:
+                stm = stm.where(table.c.time >= sql.bindparam("since"))
+            elif since:
+                stm = stm.where(table.c.time > sql.bindparam("since"))
+            if until:
+                stm = stm.where(table.c.time <= sql.bindparam("until"))
+            stms.append(stm)
+
+        if len(stms) == 1:
+            return stms[0]
+        return sql.union_all(*stms)
+
+    def _create_partition(self, con, router, time):
+        if router.exists(time):
+            return
+
+        with self._lock:
+            start, end = router.bounds(time)
+            partition = router.name(time)
+            logging.debug("create partition '{}'".format(partition))
+
+            if self.native_partitioning:
+                con.execute(
+                    "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} "
+                    "FOR VALUES FROM ('{}') TO ('{}')".format(
+                        partition, router.table, start, end))
+            elif partition not in self._metadata.tables:
+                parent = self.table(router.table)
+                columns = [Column(c.name, c.type, index=(c.name == "time"))
+                           for c in parent.c]
+                Table(partition, self._metadata, *columns).create(
+                    con, checkfirst=True)
+
+            router.add(time)
+
+    def _migrate_columns(self, con, table, columns):
+        for column in columns:
+            if column.name in table.c:
+                continue
+
+            logging.info("add missing column '{}' to '{}'".format(
+                column.name, table.name))
+            con.execute("ALTER TABLE {} ADD COLUMN {} {}".format(
+                table.name, column.name,
+                column.type.compile(dialect=con.dialect)))
+            table.append_column(Column(column.name, column.type))
+
+    def _migrate_partitions(self, con, router, columns):
+        for partition in router.partitions():
+            table = Table(partition, self._metadata, autoload_with=con)
+            self._migrate_columns(con, table, columns)
+
+    def _migrate_time_index(self, con, inspector, table):
+        for index in inspector.get_indexes(table.name):
+            if index["column_names"][:1] == ["time"]:
+                return
+
+        logging.info("create missing time index on '{}'".format(table.name))
+        Index("ix_{}_time".format(table.name), table.c.time).create(con)
@@ -0,0 +1,107 @@
+import numpy as np
+
+
+def as_float(x):
+    """Convert timestamps to a float array suitable for geometry."""
+    x = np.asarray(x)
+    if x.dtype == object:
+        x = x.astype("datetime64[us]")
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[us]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def _edges(n, n_buckets, first=0):
+    return np.linspace(first, n, n_buckets + 1).astype(np.intp)
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets, returns the indices to keep.
+
+    The first and last point are always kept, of every bucket in between the
+    point spanning the largest triangle with the previously selected point
+    and the average of the next bucket is chosen.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n) if n <= n_out else np.array([0, n - 1])
+
+    edges = _edges(n - 1, n_out - 2, first=1)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) -
+                      (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + np.argmax(area)
+        keep[i + 1] = a
+
+    return keep
+
+
+def minmax(x, y, n_out):
+    """Keep the minimum and maximum of each of `n_out // 2` buckets."""
+    n = len(y)
+    if n <= n_out or n_out < 2:
+        return np.arange(n) if n <= n_out else np.array([0, n - 1])
+
+    bucket = np.repeat(np.arange(n_out // 2),
+                       np.diff(_edges(n, n_out // 2)))
+    order = np.lexsort((y, bucket))
+    first = np.r_[True, bucket[order][1:] != bucket[order][:-1]]
+    last = np.r_[first[1:], True]
+
+    return np.unique(np.r_[order[first], order[last]])
+
+
+METHODS = {
+    "lttb": lttb,
+    "minmax": minmax,
+}
+
+
+def decimate(x, y, n_out, method="lttb"):
+    """Return the indices of at most `n_out` points preserving the shape.
+
+    Runs of non-finite values are treated as gaps and the first index of a
+    gap is kept, so the gap survives. At most a quarter of the budget goes to
+    gaps, the widest ones win and the finite points around narrower gaps are
+    decimated as one run. The rest of the budget is shared out among the runs
+    in proportion to their length.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+
+    x = as_float(x)
+    select = METHODS[method]
+
+    finite = np.flatnonzero(np.isfinite(y))
+    if len(finite) == 0:
+        return np.array([0])
+
+    breaks = np.flatnonzero(np.diff(finite) > 1) + 1
+    max_gaps = max(0, (n_out - 2) // 4)
+    if len(breaks) > max_gaps:
+        width = x[finite[breaks]] - x[finite[breaks - 1]]
+        widest = np.argsort(-width, kind="stable")[:max_gaps]
+        breaks = np.sort(breaks[widest])
+    runs = np.split(finite, breaks)
+    gaps = finite[breaks - 1] + 1
+
+    lengths = np.array([len(run) for run in runs])
+    spare = n_out - len(gaps) - 2 * len(runs)
+    shares = 2 + spare * lengths // len(finite)
+
+    keep = [gaps]
+    for run, share in zip(runs, shares):
+        keep.append(run[select(x[run], y[run], share)])
+
+    return np.unique(np.concatenate(keep))
@@ -26,3 +26,9 @@ def load_external(path):
 def get_viewport():
     viewport = getattr(piweather.config, "VIEWPORT", timedelta(hours=24))
     return datetime.now() - viewport
+
+
+def get_resolution():
+    viewport = getattr(piweather.config, "VIEWPORT", timedelta(hours=24))
+    max_points = getattr(piweather.config, "MAX_POINTS", 1000)
+    return viewport / max_points
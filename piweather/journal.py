@@ -0,0 +1,295 @@
+import glob
+import logging
+import numpy as np
+import os
+import piweather
+import threading
+
+from apscheduler.events import EVENT_SCHEDULER_SHUTDOWN
+from apscheduler.jobstores.base import JobLookupError
+from datetime import datetime
+from piweather.cache import get_query_cache
+from piweather.database import get_schema, map_numpy_dtype
+
+
+def get_journal():
+    if piweather.write_journal is not None:
+        return piweather.write_journal
+
+    settings = getattr(piweather.config, "JOURNAL", None)
+    if not settings:
+        return None
+
+    piweather.write_journal = Journal(**settings)
+    return piweather.write_journal
+
+
+def record_dtype(dtypes):
+    """Fixed-size record of a row, `time` first and the columns by name."""
+    fields = [("time", map_numpy_dtype(datetime))]
+    for col in sorted(dtypes):
+        fields.append((col, map_numpy_dtype(dtypes[col])))
+    return np.dtype(fields)
+
+
+class Segment(object):
+    """Memory-mapped file of `capacity` records behind a small header.
+
+    The header holds the record size, the number of records written and the
+    number of records already committed to the database. A record is
+    complete before the write counter covering it is incremented.
+    """
+
+    HEADER = 64
+    ITEMSIZE, CAPACITY, WRITTEN, COMMITTED = range(4)
+
+    def __init__(self, path, dtype, capacity):
+        self._path = path
+        if not os.path.exists(path):
+            self._records = np.memmap(path, dtype=dtype, mode="w+",
+                                      offset=Segment.HEADER,
+                                      shape=(capacity,))
+            self._header = np.memmap(path, dtype=np.int64, mode="r+",
+                                     shape=(4,))
+            self._header[:] = (dtype.itemsize, capacity, 0, 0)
+            return
+
+        self._header = np.memmap(path, dtype=np.int64, mode="r+", shape=(4,))
+        if self._header[Segment.ITEMSIZE] != dtype.itemsize:
+            raise ValueError(
+                "Journal segment {} does not match the record size {}".format(
+                    path, dtype.itemsize))
+        self._records = np.memmap(path, dtype=dtype, mode="r+",
+                                  offset=Segment.HEADER,
+                                  shape=(int(self._header[Segment.CAPACITY]),))
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def written(self):
+        return int(self._header[Segment.WRITTEN])
+
+    @property
+    def committed(self):
+        return int(self._header[Segment.COMMITTED])
+
+    @property
+    def full(self):
+        return self.written >= len(self._records)
+
+    def __len__(self):
+        return self.written - self.committed
+
+    def append(self, row):
+        n = self.written
+        self._records[n] = tuple(row[col] for col in self._records.dtype.names)
+        self._header[Segment.WRITTEN] = n + 1
+
+    def read(self, max_rows):
+        start = self.committed
+        return np.array(self._records[start:min(start + max_rows,
+                                                self.written)])
+
+    def commit(self, n):
+        self._records.flush()
+        self._header[Segment.COMMITTED] += n
+        self._header.flush()
+
+    def truncate(self):
+        self._header[Segment.WRITTEN:] = 0
+        self._header.flush()
+
+    def close(self):
+        self._records.flush()
+        self._header.flush()
+        del self._records, self._header
+
+    def remove(self):
+        self.close()
+        os.remove(self._path)
+
+
+class TableJournal(object):
+    """Sequence of segments `<table>-<seq>.journal` holding rows of a table."""
+
+    def __init__(self, directory, table, dtypes, segment_rows):
+        self._directory = directory
+        self._table = table
+        self._dtype = record_dtype(dtypes)
+        self._segment_rows = segment_rows
+        self._lock = threading.Lock()
+
+        paths = sorted(glob.glob(self._path("[0-9]" * 8)))
+        self._segments = [Segment(path, self._dtype, segment_rows)
+                          for path in paths]
+        self._seq = int(paths[-1][-16:-8]) if paths else -1
+        if not self._segments:
+            self._roll()
+
+    @property
+    def table(self):
+        return self._table
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(segment) for segment in self._segments)
+
+    def append(self, row):
+        with self._lock:
+            if self._segments[-1].full:
+                self._roll()
+            self._segments[-1].append(row)
+
+    def pending(self, max_rows):
+        """Returns the oldest segment with uncommitted rows and these rows."""
+        with self._lock:
+            for segment in self._segments:
+                if len(segment):
+                    return segment, segment.read(max_rows)
+        return None, None
+
+    def checkpoint(self, segment, n):
+        with self._lock:
+            segment.commit(n)
+            if len(segment):
+                return
+            if segment is self._segments[-1]:
+                segment.truncate()
+                return
+            logging.debug("remove drained journal segment {}".format(
+                segment.path))
+            self._segments.remove(segment)
+            segment.remove()
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    def _roll(self):
+        self._seq += 1
+        path = self._path("{:08d}".format(self._seq))
+        logging.debug("open journal segment {}".format(path))
+        self._segments.append(Segment(path, self._dtype, self._segment_rows))
+
+    def _path(self, seq):
+        return os.path.join(self._directory,
+                            "{}-{}.journal".format(self._table, seq))
+
+
+class Journal(object):
+    """Local store-and-forward journal in front of the database.
+
+    Every row is appended to a memory-mapped segment of its table first,
+    which neither waits for nor depends on the database. A scheduler job
+    replays the journal every `interval` seconds in transactions of up to
+    `batch_rows` rows, rows are checkpointed once their transaction is
+    committed. If the database is unreachable the rows stay in the journal,
+    also across restarts, until a later replay succeeds.
+
+    Tables can be registered with their own `write(schema, con, table, rows)`
+    replacing the plain insert, e.g. to merge rows with existing ones. Query
+    cache entries of such tables are dropped after a replay.
+    """
+
+    def __init__(self, directory, segment_rows=65536, batch_rows=5000,
+                 interval=5):
+        self._directory = directory
+        self.segment_rows = segment_rows
+        self.batch_rows = batch_rows
+        self._tables = {}
+        self._writers = {}
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._job = piweather.scheduler.add_job(
+            self.replay, "interval", seconds=interval)
+        piweather.scheduler.add_listener(
+            self._on_shutdown, EVENT_SCHEDULER_SHUTDOWN)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def __len__(self):
+        return sum(len(journal) for journal in self.tables)
+
+    @property
+    def tables(self):
+        with self._lock:
+            return list(self._tables.values())
+
+    def register(self, table, dtypes, write=None):
+        with self._lock:
+            if table not in self._tables:
+                self._tables[table] = TableJournal(
+                    self._directory, table, dtypes, self.segment_rows)
+            if write is not None:
+                self._writers[table] = write
+
+    def append(self, table, row):
+        self._tables[table].append(row)
+
+    def replay(self):
+        """Write the journaled rows to the database, returns their number.
+
+        Stops at the first failing transaction, the rows of which are kept.
+        """
+        replayed = 0
+        with self._replay_lock:
+            schema = get_schema()
+            for journal in self.tables:
+                while True:
+                    segment, records = journal.pending(self.batch_rows)
+                    if segment is None:
+                        break
+                    write = self._writers.get(journal.table)
+                    try:
+                        with schema.engine.begin() as con:
+                            if write is None:
+                                schema.write(
+                                    con, journal.table, _rows(records))
+                            else:
+                                write(schema, con, journal.table,
+                                      _rows(records))
+                    except Exception:
+                        logging.exception(
+                            "Replay of {} journaled rows of '{}' "
+                            "failed".format(len(journal), journal.table))
+                        return replayed
+                    journal.checkpoint(segment, len(records))
+                    replayed += len(records)
+                    if write is not None:
+                        self._invalidate(journal.table)
+
+        if replayed:
+            logging.debug("replayed {} journaled rows".format(replayed))
+        return replayed
+
+    def close(self):
+        piweather.scheduler.remove_listener(self._on_shutdown)
+        try:
+            self._job.remove()
+        except JobLookupError:
+            pass
+        self.replay()
+        for journal in self.tables:
+            journal.close()
+
+    def _invalidate(self, table):
+        cache = get_query_cache()
+        if cache is not None:
+            cache.invalidate(table)
+
+    def _on_shutdown(self, event):
+        self.replay()
+
+
+def _rows(records):
+    names = records.dtype.names
+    columns = [records[name].tolist() for name in names]
+    return [dict(zip(names, values)) for values in zip(*columns)]
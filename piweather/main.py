@@ -7,7 +7,8 @@ import piweather
 import sys
 import time
 
-from piweather.dashboard import create_app, default_layout
+from piweather import metrics
+from piweather.database import get_schema
 from piweather.helper import load_external
 
 
@@ -21,6 +22,17 @@ if __name__ == '__main__':
                         help="run dashboard server")
     parser.add_argument("--debug", action="store_true",
                         help="enable debug output")
+
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    for name, help_ in (("export", "export the measurement tables"),
+                        ("restore", "restore exported measurement tables")):
+        command = commands.add_parser(name, help=help_)
+        command.add_argument("directory", help="directory of the exports")
+        command.add_argument("-t", "--table", action="append",
+                             dest="tables", metavar="TABLE",
+                             help="only process TABLE (repeatable)")
+    commands.choices["export"].add_argument(
+        "--chunk-rows", type=int, help="rows read and compressed at once")
     args = parser.parse_args()
 
     logLevel = logging.DEBUG if args.debug else logging.INFO
@@ -31,16 +43,34 @@ if __name__ == '__main__':
 
     try:
         piweather.config = load_external(args.config)
-        sensors = load_external(piweather.config.SENSORS)
+        with get_schema().deferred():
+            sensors = load_external(piweather.config.SENSORS)
         piweather.config.SENSORS = sensors.SENSORS
         piweather.config.MEASUREMENTS = sensors.MEASUREMENTS
     except FileNotFoundError:
         logging.error("Config file not found at {}".format(args.config))
         sys.exit(1)
 
+    if args.command is not None:
+        from piweather import backup
+        measurements = [
+            m for m in piweather.config.MEASUREMENTS
+            if args.tables is None or m.table in args.tables]
+        if args.command == "export":
+            backup.export_all(measurements, args.directory,
+                              chunk_rows=args.chunk_rows)
+        else:
+            backup.restore_all(measurements, args.directory)
+        sys.exit(0)
+
+    metrics.watch(piweather.scheduler)
     piweather.scheduler.start()
+    if piweather.async_scheduler is not None:
+        piweather.async_scheduler.start()
 
     if args.dash:
+        # dash, plotly and flask are only loaded to serve the dashboard
+        from piweather.dashboard import create_app, default_layout
         piweather.app = create_app()
 
         try:
@@ -61,6 +91,10 @@ if __name__ == '__main__':
             port=piweather.config.PORT,
             use_reloader=False)
     else:
+        metrics_port = getattr(piweather.config, "METRICS_PORT", None)
+        if metrics_port is not None:
+            metrics.serve(metrics_port, host=piweather.config.HOSTS)
+
         logging.info("Press 'CTRL+C' to quit!")
         while True:
             try:
@@ -68,4 +102,6 @@ if __name__ == '__main__':
             except KeyboardInterrupt:
                 break
 
+    if piweather.async_scheduler is not None:
+        piweather.async_scheduler.shutdown(wait=True)
     piweather.scheduler.shutdown(wait=True)
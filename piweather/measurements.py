@@ -1,35 +1,152 @@
 import logging
 import numpy as np
 import piweather
+import threading
+import time
+from apscheduler.events import EVENT_SCHEDULER_SHUTDOWN
+from apscheduler.jobstores.base import JobLookupError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from piweather.database import get_engine, map_dtype
-from sqlalchemy import MetaData, Table, Column, sql
+from functools import partial
+from piweather import metrics
+from piweather.acquisition import get_async_scheduler, run_blocking
+from piweather.buffer import get_buffer
+from piweather.cache import get_query_cache
+from piweather.columnar import ColumnarArchive
+from piweather.database import get_schema, fetch_columns, iter_columns
+from piweather.helper import get_viewport
+from piweather.journal import get_journal
+from piweather.rollups import (Rollups, choose_resolution, rollup_column,
+                               rollup_dtypes, rollup_record_dtypes)
+from piweather.tail import TailWindow
+from sqlalchemy import sql
+
+
+def store(measurements):
+    """Write the last values of `measurements` within one transaction.
+
+    The values are fanned out to the sinks of each measurement as well, rows
+    returned by table sinks are written together with the raw rows. With a
+    journal the rows and finished rollup buckets are only appended to it and
+    replayed later. Rows of archived measurements are appended to their
+    archive instead. The query cache and tail windows are updated once the
+    rows are stored.
+    """
+    buf = get_buffer()
+    journal = get_journal()
+    rows = []
+    for m in measurements:
+        if m.archive is not None:
+            m.archive.write(m.table, m.last)
+        else:
+            rows.append((m.table, m.last))
+    for m in measurements:
+        for sink in m.sinks:
+            rows.extend(sink.push(m.last))
+
+    finished = [(m, m.rollups.add(m.last))
+                for m in measurements if m.rollups is not None]
+    finished = [(m, f) for m, f in finished if f]
+
+    if journal is not None:
+        for table, row in rows:
+            journal.append(table, row)
+        for m, f in finished:
+            m.rollups.journal(journal, f)
+        _publish(measurements, rows)
+        return
+
+    if buf is not None:
+        buf.extend(rows, on_stored=partial(_publish, measurements, rows))
+        rows = []
+    if rows or finished:
+        schema = get_schema()
+        with schema.engine.begin() as con:
+            for table, row in rows:
+                schema.write(con, table, row)
+            for m, f in finished:
+                m.rollups.write(schema, con, f)
+
+    if buf is None:
+        _publish(measurements, rows)
+    cache = get_query_cache()
+    if cache is not None:
+        for m, f in finished:
+            for suffix, _ in f:
+                cache.invalidate(m.rollups.tables[suffix])
+
+
+def _publish(measurements, rows):
+    """Add stored `rows` to the query cache and tail windows."""
+    cache = get_query_cache()
+    if cache is not None:
+        for table, row in rows:
+            cache.extend(table, row)
+    for m in measurements:
+        if m.tail is not None:
+            m.tail.append(m.last)
 
 
 class Measurement(object):
 
-    def __init__(self, sensor, table, frequency=0):
+    chunk_rows = 10000
+
+    def __init__(self, sensor, table, frequency=0, partitioned=False,
+                 rollups=False, asynchronous=False, grouped=False,
+                 sinks=(), tail=False, archive=None):
+        if asynchronous and grouped:
+            raise ValueError("Grouped measurements run on the thread pool "
+                             "scheduler only")
+        if archive is not None and (rollups or partitioned):
+            raise ValueError("Archived measurements are partitioned by day "
+                             "and do not support rollups")
         self._sensor = sensor
         self._table = table
+        self._partitioned = partitioned
+        self._asynchronous = asynchronous
+        self._grouped = grouped
+        self._group = None
+        self._rollups = Rollups(table, sensor.dtypes) if rollups else None
+        self._sinks = list(sinks)
+        if isinstance(archive, str):
+            archive = ColumnarArchive(archive)
+        self._archive = archive
+        self._tail = None
+        if tail:
+            capacity = getattr(piweather.config, "TAIL_ROWS", 86400) \
+                if tail is True else tail
+            self._tail = TailWindow(sensor.dtypes, capacity)
         self.frequency = frequency
 
         self._init_db_table()
 
     @property
     def frequency(self):
-        if hasattr(self, "_job"):
+        if self._group is not None:
+            return self._group.frequency
+        elif hasattr(self, "_job"):
             return self._job.trigger.interval.seconds
         else:
             return 0
 
     @frequency.setter
     def frequency(self, f):
+        if self._grouped:
+            if self._group is not None:
+                self._group.remove(self)
+                self._group = None
+            if f > 0:
+                self._group = TickGroup.get(self.scheduler, f)
+                self._group.add(self)
+            return
+
         job = getattr(self, "_job", None)
 
         if f > 0:
             if job is None:
-                self._job = piweather.scheduler.add_job(
-                    self.acquire, "interval", seconds=f)
+                self._job = self.scheduler.add_job(
+                    self.acquire_async if self._asynchronous
+                    else self.acquire, "interval", seconds=f)
             else:
                 self._job.reschedule("interval", seconds=f)
         else:
@@ -60,43 +177,324 @@ class Measurement(object):
     def sensor(self):
         return self._sensor
 
+    @property
+    def dtypes(self):
+        dtypes = dict(time=datetime)
+        dtypes.update(self.sensor.dtypes)
+        if self.rollups is not None:
+            dtypes.update(rollup_dtypes(self.sensor.dtypes))
+        return dtypes
+
+    @property
+    def rollups(self):
+        return self._rollups
+
+    @property
+    def tail(self):
+        return self._tail
+
+    @property
+    def sinks(self):
+        return list(self._sinks)
+
+    @property
+    def archive(self):
+        return self._archive
+
+    @property
+    def scheduler(self):
+        if self._asynchronous:
+            return get_async_scheduler()
+        return piweather.scheduler
+
     def acquire(self):
+        start = time.perf_counter()
         self.last = self.sensor.value
+        metrics.READ_SECONDS.labels(table=self.table).observe(
+            time.perf_counter() - start)
+        self._store()
 
-        with get_engine().connect() as con:
-            table = Table(self.table, MetaData(get_engine()), autoload=True)
-            insert = table.insert().values(**self.last)
-            con.execute(insert)
+    async def acquire_async(self):
+        start = time.perf_counter()
+        self.last = await self.sensor.avalue()
+        metrics.READ_SECONDS.labels(table=self.table).observe(
+            time.perf_counter() - start)
+        await run_blocking(self._store)
 
-    def data(self, columns=None, since=None):
-        with get_engine().connect() as con:
-            table = Table(self.table, MetaData(get_engine()), autoload=True)
+    def _store(self):
+        store([self])
 
-            if columns is None:
-                stm = sql.select([table])
-            elif type(columns) == str:
-                stm = sql.select([table.c[columns]])
-            elif type(columns) == list:
-                stm = sql.select([table.c[col] for col in columns])
+    def data(self, columns=None, since=None, resolution=None,
+             max_points=None):
+        if isinstance(columns, str):
+            columns = (columns,)
+        elif columns is not None:
+            columns = tuple(columns)
 
-            if since is not None:
-                stm.append_whereclause(table.c.time > since)
+        start = time.perf_counter()
+        if self.archive is not None:
+            return self._archive_data(columns, since, start)
 
-            rs = con.execute(stm)
+        schema = get_schema()
+        cache = get_query_cache()
+        with schema.engine.connect() as con:
+            suffix = self._choose_rollup(con, since, resolution, max_points)
+            if suffix is None:
+                table = self.table
+                query = columns
+            else:
+                table = self.rollups.tables[suffix]
+                if columns is None:
+                    columns = ("time",) + tuple(self.columns)
+                query = tuple(rollup_column(col, self.sensor.dtypes)
+                              for col in columns)
 
-            matrix = np.array(rs.fetchall())
-            if matrix.shape == (0,):
-                return {col: [] for col in rs.keys()}
+            if suffix is None and self.tail is not None and \
+                    self.tail.covers(since):
+                data = self.tail.data(columns, since)
+            elif cache is None:
+                data = self._select(con, table, query, columns, since)
             else:
-                return {col: matrix[:, i] for i, col in enumerate(rs.keys())}
+                cached = query
+                if query is not None and "time" not in query:
+                    cached = query + ("time",)
+                data = cache.get(
+                    table, cached, since,
+                    lambda since: self._select(con, table, cached, cached,
+                                               since),
+                    self.dtypes)
+                if columns is not None:
+                    data = {col: data[q] for col, q in zip(columns, query)}
+
+            if suffix is not None:
+                pending, stored = self.rollups.pending(schema, con, suffix)
+                if pending is not None and (
+                        since is None or pending["time"] > since):
+                    if stored:
+                        # the stored row of the bucket is the newest one
+                        data = {col: values[:-1]
+                                for col, values in data.items()}
+                    data = self._append(data, pending, query)
+
+        metrics.QUERY_SECONDS.labels(table=table).observe(
+            time.perf_counter() - start)
+        return data
+
+    def iter_data(self, columns=None, since=None, until=None,
+                  chunk_rows=None):
+        """Iterate over the rows within `(since, until]` in columnar chunks.
+
+        Memory stays bounded by `chunk_rows` regardless of the table size,
+        see `iter_columns()`.
+        """
+        if chunk_rows is None:
+            chunk_rows = self.chunk_rows
+        if isinstance(columns, str):
+            columns = (columns,)
+        elif columns is None:
+            columns = ("time",) + tuple(self.columns)
+
+        if self.archive is not None:
+            return self.archive.iter_data(self.table, columns, since, until,
+                                          chunk_rows)
+        return iter_columns(get_schema(), self.table, columns, self.dtypes,
+                            since, until, chunk_rows)
+
+    def _archive_data(self, columns, since, start):
+        if self.tail is not None and self.tail.covers(since):
+            data = self.tail.data(columns, since)
+        else:
+            data = self.archive.data(self.table, columns, since)
+        metrics.QUERY_SECONDS.labels(table=self.table).observe(
+            time.perf_counter() - start)
+        return data
+
+    def _select(self, con, table, query, keys, since):
+        stm = get_schema().select(table, query, since)
+        if since is not None:
+            rs = con.execute(stm, since=since)
+        else:
+            rs = con.execute(stm)
+        if keys is None:
+            keys = rs.keys()
+
+        dtypes = self.dtypes
+        chunks = iter(lambda: rs.fetchmany(self.chunk_rows), [])
+        return fetch_columns(
+            chunks, keys,
+            {key: dtypes.get(q) for key, q in zip(keys, query or keys)})
+
+    def _append(self, data, row, query):
+        dtypes = self.dtypes
+        keys = tuple(data)
+        last = fetch_columns(
+            [[tuple(row[q] for q in query)]], keys,
+            {key: dtypes.get(q) for key, q in zip(keys, query)})
+        if not len(data[keys[0]]):
+            return last
+        return {key: np.concatenate([data[key], last[key]]) for key in keys}
+
+    def _choose_rollup(self, con, since, resolution, max_points):
+        if self.rollups is None:
+            return None
+
+        if resolution is None and max_points is not None:
+            if since is None:
+                first = get_schema().table(self.rollups.tables["1m"])
+                since = con.execute(
+                    sql.select([sql.func.min(first.c.time)])).scalar()
+            if since is not None:
+                resolution = (datetime.now() - since) / max_points
+
+        if resolution is None:
+            return None
+        return choose_resolution(resolution)
 
     def _init_db_table(self):
-        logging.debug("create table '{}' if not exists".format(self.table))
+        logging.debug("register table '{}'".format(self.table))
+        if self.archive is not None:
+            self.archive.register(self.table, self.sensor.dtypes)
+        else:
+            self._register_sql_table()
+
+        if self.rollups is not None:
+            schema = get_schema()
+            journal = get_journal()
+            for table in self.rollups.tables.values():
+                schema.register(table, rollup_dtypes(self.sensor.dtypes))
+                if journal is not None:
+                    journal.register(
+                        table, rollup_record_dtypes(self.sensor.dtypes),
+                        write=self.rollups.merge_rows)
+            piweather.scheduler.add_listener(
+                self._on_shutdown, EVENT_SCHEDULER_SHUTDOWN)
+
+        for sink in self._sinks:
+            sink.bind(self)
+
+        if self.tail is not None:
+            self.warm_tail()
+
+    def _register_sql_table(self):
+        get_schema().register(
+            self.table, self.sensor.dtypes, partitioned=self._partitioned)
+
+        journal = get_journal()
+        if journal is not None:
+            journal.register(self.table, self.sensor.dtypes)
+
+    def warm_tail(self):
+        """Load the newest rows within the viewport into the tail window."""
+        since = get_viewport()
+        if self.archive is not None:
+            columns = self.archive.data(self.table, since=since)
+        else:
+            schema = get_schema()
+            with schema.engine.connect() as con:
+                rs = con.execute(schema.latest(self.table, since=since),
+                                 since=since, limit=self.tail.capacity + 1)
+                keys = rs.keys()
+                rows = rs.fetchall()[::-1]
+            columns = fetch_columns([rows], keys, self.dtypes)
+
+        self.tail.warm(columns, since)
+        logging.debug("warmed tail of '{}' with {} rows".format(
+            self.table, len(self.tail)))
+
+    def _on_shutdown(self, event):
+        self.rollups.close(get_schema(), get_journal())
+
+
+class TickGroup(object):
+    """Measurements sharing the same frequency, acquired in one tick.
+
+    All sensors of the group are triggered first and collected concurrently
+    afterwards, so a tick takes as long as the slowest sensor instead of the
+    sum of all. The measurements share one timestamp and one transaction.
+    """
+
+    _groups = {}
+    _lock = threading.Lock()
+    _executor = ThreadPoolExecutor(max_workers=8)
+
+    def __init__(self, scheduler, frequency):
+        self._measurements = []
+        self.frequency = frequency
+        self._job = scheduler.add_job(self.tick, "interval", seconds=frequency)
+
+    @classmethod
+    def get(cls, scheduler, frequency):
+        key = (id(scheduler), frequency)
+        with cls._lock:
+            group = cls._groups.get(key)
+            if group is None or scheduler.get_job(group._job.id) is None:
+                group = cls._groups[key] = cls(scheduler, frequency)
+            return group
+
+    @property
+    def measurements(self):
+        return list(self._measurements)
+
+    def add(self, measurement):
+        self._measurements.append(measurement)
+
+    def remove(self, measurement):
+        self._measurements.remove(measurement)
+        if not self._measurements:
+            try:
+                self._job.remove()
+            except JobLookupError:
+                pass
+
+    def tick(self):
+        measurements = self.measurements
+        now = datetime.now()
+        start = time.perf_counter()
+
+        sensors, waiting = [], []
+        for sensor in {id(m.sensor): m.sensor for m in measurements}.values():
+            leader, future = sensor._claim()
+            if leader:
+                sensors.append((sensor, future))
+            elif future is not None:
+                waiting.append((sensor, future))
+
+        # claimed reads are always released, failures only drop the sensor
+        errors = {}
+        try:
+            for sensor, _ in sensors:
+                try:
+                    sensor.trigger()
+                except Exception as e:
+                    errors[id(sensor)] = (sensor, e)
+            collected = [(sensor, self._executor.submit(sensor.collect))
+                         for sensor, _ in sensors if id(sensor) not in errors]
+            for sensor, result in collected:
+                try:
+                    sensor._update(result.result())
+                except Exception as e:
+                    errors[id(sensor)] = (sensor, e)
+        finally:
+            for sensor, future in sensors:
+                error = errors.get(id(sensor))
+                sensor._release(
+                    future, exception=None if error is None else error[1])
+        for sensor, future in waiting:
+            try:
+                future.result()
+            except Exception as e:
+                errors[id(sensor)] = (sensor, e)
 
-        with get_engine().connect():
-            columns = [Column("time", map_dtype(datetime))]
-            for name, type_ in self.sensor.dtypes.items():
-                columns.append(Column(name, map_dtype(type_)))
+        for sensor, e in errors.values():
+            logging.error("Reading {} failed: {!r}".format(
+                type(sensor).__name__, e))
+        measurements = [m for m in measurements
+                        if id(m.sensor) not in errors]
 
-            table = Table(self.table, MetaData(get_engine()), *columns)
-            table.create(checkfirst=True)
+        elapsed = time.perf_counter() - start
+        for m in measurements:
+            metrics.READ_SECONDS.labels(table=m.table).observe(elapsed)
+        for m in measurements:
+            m.last = dict(m.sensor.last, time=now)
+        if measurements:
+            store(measurements)
@@ -0,0 +1,233 @@
+import bisect
+import logging
+import threading
+
+from apscheduler.events import (EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED,
+                                EVENT_JOB_SUBMITTED)
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1., 2.5, 5., 10.)
+ROW_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+
+
+class Histogram(object):
+    """Cumulative histogram with fixed upper bounds `buckets`."""
+
+    def __init__(self, buckets):
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+
+        cumulative = 0
+        for bound, count in zip(self._buckets + ("+Inf",), counts):
+            cumulative += count
+            yield "_bucket", (("le", str(bound)),), cumulative
+        yield "_sum", (), total
+        yield "_count", (), cumulative
+
+
+class Counter(object):
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    def samples(self):
+        yield "", (), self._value
+
+
+class Gauge(Counter):
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+
+class Family(object):
+    """A metric with one child per combination of label values."""
+
+    def __init__(self, name, documentation, kind, factory):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation),
+                 "# TYPE {} {}".format(self.name, self.kind)]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            for suffix, extra, value in child.samples():
+                lines.append("{}{}{} {}".format(
+                    self.name, suffix, _labels(key + extra), value))
+        return lines
+
+
+class Registry(object):
+    """Collection of metric families rendered in the Prometheus format."""
+
+    def __init__(self):
+        self._families = OrderedDict()
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        return self._add(Family(name, documentation, "histogram",
+                                lambda: Histogram(buckets)))
+
+    def counter(self, name, documentation):
+        return self._add(Family(name, documentation, "counter", Counter))
+
+    def gauge(self, name, documentation):
+        return self._add(Family(name, documentation, "gauge", Gauge))
+
+    def render(self):
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def _add(self, family):
+        self._families[family.name] = family
+        return family
+
+
+REGISTRY = Registry()
+
+READ_SECONDS = REGISTRY.histogram(
+    "piweather_sensor_read_seconds", "Duration of sensor reads.")
+INSERT_SECONDS = REGISTRY.histogram(
+    "piweather_insert_seconds", "Duration of inserts into a table.")
+ROWS_WRITTEN = REGISTRY.histogram(
+    "piweather_rows_written", "Rows written per insert.", ROW_BUCKETS)
+QUERY_SECONDS = REGISTRY.histogram(
+    "piweather_query_seconds", "Duration of Measurement.data() queries.")
+QUERY_CACHE_REQUESTS = REGISTRY.counter(
+    "piweather_query_cache_requests_total",
+    "Measurement.data() queries answered by the query cache.")
+QUERY_CACHE_BYTES = REGISTRY.gauge(
+    "piweather_query_cache_bytes", "Memory held by the query cache.")
+JOB_LATENESS = REGISTRY.histogram(
+    "piweather_job_lateness_seconds",
+    "Delay of scheduled jobs behind their run time.")
+JOB_MISSED = REGISTRY.counter(
+    "piweather_job_missed_total",
+    "Runs of scheduled jobs which were skipped.")
+
+
+def render():
+    return REGISTRY.render()
+
+
+def job_label(func):
+    """Table of the measurement a job acquires, else the job's name."""
+    owner = getattr(func, "__self__", None)
+    table = getattr(owner, "table", None)
+    if isinstance(table, str):
+        return table
+    return getattr(func, "__qualname__", str(func))
+
+
+def watch(scheduler):
+    """Record lateness and missed runs of the jobs of an APScheduler.
+
+    Returns a function removing the listeners again.
+    """
+    labels = {}
+
+    def label(job_id):
+        if job_id not in labels:
+            job = scheduler.get_job(job_id)
+            labels[job_id] = job_label(job.func) if job else job_id
+        return labels[job_id]
+
+    def on_submitted(event):
+        now = datetime.now(event.scheduled_run_times[0].tzinfo)
+        histogram = JOB_LATENESS.labels(job=label(event.job_id))
+        for run_time in event.scheduled_run_times:
+            histogram.observe((now - run_time).total_seconds())
+
+    def on_missed(event):
+        JOB_MISSED.labels(job=label(event.job_id)).inc()
+
+    scheduler.add_listener(on_submitted, EVENT_JOB_SUBMITTED)
+    scheduler.add_listener(on_missed,
+                           EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+    def unwatch():
+        scheduler.remove_listener(on_submitted)
+        scheduler.remove_listener(on_missed)
+    return unwatch
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve the metrics on `/metrics` from a background thread."""
+    server = _ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever,
+                              name="piweather-metrics", daemon=True)
+    thread.start()
+    logging.info("Serving metrics on {}:{}/metrics".format(
+        host, server.server_address[1]))
+    return server
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only available from Python 3.7 on
+    daemon_threads = True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("metrics: " + format % args)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(
+        key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in pairs) + "}"
@@ -0,0 +1,64 @@
+import re
+import threading
+
+
+def month_start(time):
+    return time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(time):
+    start = month_start(time)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+class MonthlyPartitions(object):
+    """Routes rows and range queries of a table to its per-month partitions.
+
+    Partition `<table>_YYYYMM` holds all rows with `time` in that month. The
+    router keeps track of the partitions known to exist, so queries only touch
+    the partitions overlapping the requested range.
+    """
+
+    def __init__(self, table, existing=()):
+        self._table = table
+        self._pattern = re.compile(r"^{}_(\d{{6}})$".format(re.escape(table)))
+        self._months = set()
+        self._lock = threading.Lock()
+
+        for name in existing:
+            match = self._pattern.match(name)
+            if match is not None:
+                self._months.add(match.group(1))
+
+    @property
+    def table(self):
+        return self._table
+
+    def name(self, time):
+        return "{}_{:%Y%m}".format(self.table, time)
+
+    def bounds(self, time):
+        return month_start(time), next_month(time)
+
+    def exists(self, time):
+        return "{:%Y%m}".format(time) in self._months
+
+    def add(self, time):
+        with self._lock:
+            self._months.add("{:%Y%m}".format(time))
+
+    def partitions(self, since=None, until=None):
+        lower = None if since is None else "{:%Y%m}".format(since)
+        upper = None if until is None else "{:%Y%m}".format(until)
+
+        with self._lock:
+            months = sorted(self._months)
+
+        if lower is not None:
+            months = [m for m in months if m >= lower]
+        if upper is not None:
+            months = [m for m in months if m <= upper]
+
+        return ["{}_{}".format(self.table, month) for month in months]
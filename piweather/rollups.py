@@ -0,0 +1,242 @@
+import logging
+import math
+import threading
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import sql
+
+
+RESOLUTIONS = OrderedDict([
+    ("1m", timedelta(minutes=1)),
+    ("1h", timedelta(hours=1)),
+    ("1d", timedelta(days=1)),
+])
+
+AGGREGATES = ("count", "min", "max", "mean", "last")
+
+
+def bucket(time, width):
+    return datetime.min + ((time - datetime.min) // width) * width
+
+
+def rollup_table(table, suffix):
+    return "{}_{}".format(table, suffix)
+
+
+def rollup_dtypes(dtypes):
+    rollup = OrderedDict()
+    for col, type_ in dtypes.items():
+        rollup[col + "_count"] = int
+        rollup[col + "_min"] = type_
+        rollup[col + "_max"] = type_
+        rollup[col + "_mean"] = float
+        rollup[col + "_last"] = type_
+    return rollup
+
+
+def rollup_record_dtypes(dtypes):
+    """Like `rollup_dtypes()`, but with float aggregates.
+
+    Used for journal records, which need a NaN for the aggregates of values
+    that were missing throughout a bucket.
+    """
+    record = OrderedDict()
+    for col in dtypes:
+        record[col + "_count"] = int
+        for aggregate in AGGREGATES[1:]:
+            record[col + "_" + aggregate] = float
+    return record
+
+
+def rollup_column(column, dtypes):
+    """Map a requested column to its rollup column, raw columns to means.
+
+    Columns of the sensor `dtypes` are raw columns even if their names end
+    like an aggregate (e.g. "windspeed_max"), everything else is taken as a
+    rollup column already.
+    """
+    if column in dtypes:
+        return column + "_mean"
+    return column
+
+
+def choose_resolution(resolution):
+    """Return the coarsest rollup suffix not coarser than `resolution`."""
+    choice = None
+    for suffix, width in RESOLUTIONS.items():
+        if width <= resolution:
+            choice = suffix
+    return choice
+
+
+class Bucket(object):
+    """Running count/min/max/mean/last of the columns within one bucket."""
+
+    def __init__(self, time, columns):
+        self.time = time
+        self._stats = {col: [0, None, None, 0., None] for col in columns}
+
+    def add(self, row):
+        for col, stats in self._stats.items():
+            value = row[col]
+            if value is None or (isinstance(value, float) and
+                                 math.isnan(value)):
+                continue
+            stats[0] += 1
+            stats[1] = value if stats[1] is None else min(stats[1], value)
+            stats[2] = value if stats[2] is None else max(stats[2], value)
+            stats[3] += value
+            stats[4] = value
+
+    def merge(self, row):
+        for col, stats in self._stats.items():
+            count = row[col + "_count"] or 0
+            if count == 0:
+                continue
+            if stats[0] == 0:
+                stats[4] = row[col + "_last"]
+            stats[1] = row[col + "_min"] if stats[1] is None \
+                else min(stats[1], row[col + "_min"])
+            stats[2] = row[col + "_max"] if stats[2] is None \
+                else max(stats[2], row[col + "_max"])
+            stats[3] += row[col + "_mean"] * count
+            stats[0] += count
+
+    def row(self):
+        row = {"time": self.time}
+        for col, (count, min_, max_, sum_, last) in self._stats.items():
+            row[col + "_count"] = count
+            row[col + "_min"] = min_
+            row[col + "_max"] = max_
+            row[col + "_mean"] = sum_ / count if count else None
+            row[col + "_last"] = last
+        return row
+
+
+class Rollups(object):
+    """Incrementally maintained 1 min / 1 h / 1 day rollups of a table.
+
+    Every acquired row updates the open bucket of each resolution. Finished
+    buckets are written as plain inserts, only the first bucket after startup
+    and the buckets still open on shutdown are merged with a row that may
+    already exist for them. With a journal the buckets are appended to it
+    instead and merged when they are replayed.
+    """
+
+    def __init__(self, table, dtypes):
+        self._table = table
+        self._columns = list(dtypes.keys())
+        self._open = {}
+        self._merge = set(RESOLUTIONS)
+        self._lock = threading.Lock()
+
+    @property
+    def tables(self):
+        return OrderedDict(
+            (suffix, rollup_table(self._table, suffix))
+            for suffix in RESOLUTIONS
+        )
+
+    def add(self, row):
+        """Add `row`, returns a list of finished `(suffix, Bucket)` pairs."""
+        finished = []
+        with self._lock:
+            for suffix, width in RESOLUTIONS.items():
+                start = bucket(row["time"], width)
+                current = self._open.get(suffix)
+                if current is None or current.time != start:
+                    if current is not None:
+                        finished.append((suffix, current))
+                    current = self._open[suffix] = Bucket(
+                        start, self._columns)
+                current.add(row)
+        return finished
+
+    def pending(self, schema, con, suffix):
+        """The open bucket of `suffix` as row and whether it was stored.
+
+        Only the buckets open since startup may have been stored already, the
+        stored row is merged into the returned one then.
+        """
+        with self._lock:
+            current = self._open.get(suffix)
+            if current is None:
+                return None, False
+            row = current.row()
+            merging = suffix in self._merge
+        if not merging:
+            return row, False
+
+        rollup = schema.table(self.tables[suffix])
+        existing = con.execute(sql.select([rollup]).where(
+            rollup.c.time == row["time"])).fetchone()
+        if existing is None:
+            return row, False
+        merged = Bucket(row["time"], self._columns)
+        merged.merge(row)
+        merged.merge(existing)
+        return merged.row(), True
+
+    def write(self, schema, con, finished):
+        for suffix, current in finished:
+            table = self.tables[suffix]
+            if suffix in self._merge:
+                self._merge.discard(suffix)
+                self._write_merged(schema, con, table, current)
+            else:
+                schema.write(con, table, current.row())
+
+    def journal(self, journal, finished):
+        for suffix, current in finished:
+            journal.append(self.tables[suffix], current.row())
+
+    def merge_rows(self, schema, con, table, rows):
+        """Write journaled `rows` of `table` merged with existing buckets."""
+        for row in rows:
+            current = Bucket(row["time"], self._columns)
+            current.merge(row)
+            self._write_merged(schema, con, table, current)
+
+    def rebuild(self, schema, con, rows):
+        """Merge the buckets of time ordered `rows` with existing buckets.
+
+        The open buckets may have been written as well, so they are merged
+        when they are finished.
+        """
+        self._merge.update(RESOLUTIONS)
+        for suffix, width in RESOLUTIONS.items():
+            buckets = OrderedDict()
+            for row in rows:
+                start = bucket(row["time"], width)
+                if start not in buckets:
+                    buckets[start] = Bucket(start, self._columns)
+                buckets[start].add(row)
+            for current in buckets.values():
+                self._write_merged(schema, con, self.tables[suffix], current)
+
+    def close(self, schema, journal=None):
+        with self._lock:
+            finished = list(self._open.items())
+            self._open = {}
+        self._merge.update(RESOLUTIONS)
+
+        if journal is not None:
+            self.journal(journal, finished)
+            return
+        with schema.engine.begin() as con:
+            for suffix, current in finished:
+                self._write_merged(
+                    schema, con, self.tables[suffix], current)
+
+    def _write_merged(self, schema, con, table, current):
+        rollup = schema.table(table)
+        where = rollup.c.time == current.time
+
+        existing = con.execute(sql.select([rollup]).where(where)).fetchone()
+        if existing is not None:
+            logging.debug("merge bucket {} of '{}'".format(
+                current.time, table))
+            current.merge(existing)
+            con.execute(rollup.delete().where(where))
+        schema.write(con, table, current.row())
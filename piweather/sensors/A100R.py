@@ -1,7 +1,6 @@
 import logging
-import numpy as np
-import piweather
 import time
+import warnings
 
 from piweather.sensors import Sensor
 
@@ -12,92 +11,125 @@ except ImportError:
     logging.warning("Module RPi.gpio not found, maybe you're not on a Raspi")
 
 
+def wind_statistics(pulses, start, end, calib, gust_window=3):
+    """Wind speed statistics from the pulse timestamps within (start, end].
+
+    The average is the pulse rate over the whole interval, min, max and std
+    refer to the speeds of single revolutions, i.e. inter-pulse intervals,
+    and the gust is the maximum running mean over `gust_window` seconds.
+    """
+    stats = {
+        "windspeed_avg": 0.,
+        "windspeed_std": 0.,
+        "windspeed_min": 0.,
+        "windspeed_max": 0.,
+        "windspeed_gust": 0.,
+    }
+    if end > start:
+        stats["windspeed_avg"] = calib * len(pulses) / (end - start)
+    if len(pulses) < 2:
+        return stats
+
+    # numpy is imported on use only, importing the sensors stays light
+    import numpy as np
+    speeds = calib / np.diff(pulses)
+    stats["windspeed_min"] = float(speeds.min())
+    stats["windspeed_max"] = float(speeds.max())
+    if len(speeds) > 1:
+        stats["windspeed_std"] = float(speeds.std(ddof=1))
+
+    first = np.searchsorted(pulses, pulses - gust_window, side="right")
+    revolutions = np.arange(len(pulses)) - first + 1
+    stats["windspeed_gust"] = float(calib * revolutions.max() / gust_window)
+
+    return stats
+
+
 class A100R(Sensor):
+    """A100R anemometer counting one pulse per revolution.
 
-    # TODO: When object goes out of scope the job and callbacks remain
+    The GPIO callback only stores the monotonic timestamp of each pulse in a
+    preallocated ring, which `read()` consumes up to the write position it
+    observed. The callback thread is the only writer, so no lock is needed.
+    """
+
+    # TODO: When object goes out of scope the callbacks remain
 
     dtypes = {
         "windspeed_avg": float,
         "windspeed_std": float,
         "windspeed_min": float,
         "windspeed_max": float,
+        "windspeed_gust": float,
     }
 
-    def __init__(self, pin, sampling_time=10, R=60, *args, **kwargs):
+    def __init__(self, pin, sampling_time=None, R=60, capacity=4096,
+                 gust_window=3, *args, **kwargs):
         super(A100R, self).__init__(*args, **kwargs)
+        if sampling_time is not None:
+            # statistics now span the interval between two reads
+            warnings.warn("A100R(sampling_time=...) is ignored and will be "
+                          "removed, statistics span the measurement interval",
+                          DeprecationWarning, stacklevel=2)
         self._pin = pin
         self._calib = 60/R    # R in rpm/(m/s)
-        self._init_gpio()
-        self._reset_statistics()
-        self.counts_per_second(reset=True)
+        self._gust_window = gust_window
 
-        self._job = piweather.scheduler.add_job(
-            self.sample, "interval", seconds=sampling_time)
+        import numpy as np
+        self._ring = np.zeros(capacity, dtype=np.float64)
+        self._head = 0
+        self._tail = 0
+        self._start_time = time.monotonic()
+        self._cps_head = 0
+        self._cps_time = self._start_time
+
+        self._init_gpio()
 
     @property
     def pin(self):
         return self._pin
 
     @property
-    def avg(self):
-        if self._nSamples == 0:
-            return 0.
-        return self._calib * self._sum / self._nSamples
-
-    @property
-    def std(self):
-        if self._nSamples <= 1:
-            return 0.
-        return self._calib * float(
-            np.sqrt(
-                (self._sum2 - self._sum*self._sum / self._nSamples)
-                / (self._nSamples - 1)
-            )
-        )
-
-    @property
-    def min(self):
-        return self._calib * self._min
-
-    @property
-    def max(self):
-        return self._calib * self._max
+    def capacity(self):
+        return len(self._ring)
 
     def read(self):
-        data = {
-            "windspeed_avg": self.avg,
-            "windspeed_std": self.std,
-            "windspeed_min": self.min,
-            "windspeed_max": self.max,
-        }
-        self._reset_statistics()
-        return data
+        end = time.monotonic()
+        pulses = self._consume()
+        stats = wind_statistics(pulses, self._start_time, end, self._calib,
+                                self._gust_window)
+        self._start_time = end
+        return stats
 
     def counts_per_second(self, reset=True):
-        now = time.time()
-        seconds = now - getattr(self, "_start_time", 0)
-        counts = getattr(self, "_counts", 0)
+        now = time.monotonic()
+        head = self._head
+        cps = (head - self._cps_head) / (now - self._cps_time)
 
         if reset:
-            self._start_time = now
-            self._counts = 0
+            self._cps_head = head
+            self._cps_time = now
 
-        return counts / seconds
+        return cps
 
     def counter_callback(self, channel):
-        self._counts += 1
+        self._record(time.monotonic())
 
-    def sample(self):
-        cps = self.counts_per_second(reset=True)
+    def _record(self, timestamp):
+        head = self._head
+        self._ring[head % len(self._ring)] = timestamp
+        self._head = head + 1
 
-        if self._nSamples == 0 or self._min > cps:
-            self._min = cps
-        if self._nSamples == 0 or self._max < cps:
-            self._max = cps
+    def _consume(self):
+        head, tail = self._head, self._tail
+        if head - tail > len(self._ring):
+            logging.warning("A100R: {} pulses lost, ring too small".format(
+                head - tail - len(self._ring)))
+            tail = head - len(self._ring)
+        self._tail = head
 
-        self._sum += cps
-        self._sum2 += cps*cps
-        self._nSamples += 1
+        import numpy as np
+        return self._ring[np.arange(tail, head) % len(self._ring)]
 
     def _init_gpio(self):
         try:
@@ -107,10 +139,3 @@ class A100R(Sensor):
         except NameError:
             logging.warning(
                 "Module RPi.gpio not found, maybe you're not on as Raspi")
-
-    def _reset_statistics(self):
-        self._nSamples = 0
-        self._sum = 0
-        self._sum2 = 0
-        self._min = 0
-        self._max = 0
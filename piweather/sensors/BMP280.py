@@ -29,14 +29,45 @@ class BMP280(Sensor):
         "16":  4,
     }
 
+    STANDBY = {     # t_sb in ms
+        "0.5":  0b000,
+        "62.5": 0b001,
+        "125":  0b010,
+        "250":  0b011,
+        "500":  0b100,
+        "1000": 0b101,
+        "2000": 0b110,
+        "4000": 0b111,
+    }
+
+    MEASUREMENT_TIME = {    # max. conversion time in s by osrs_p
+        OSRS["x1"]:  0.007,
+        OSRS["x2"]:  0.009,
+        OSRS["x4"]:  0.014,
+        OSRS["x8"]:  0.023,
+        OSRS["x16"]: 0.044,
+    }
+
     ADDR_CAL = 0x88
+    ADDR_STATUS = 0xF3
     ADDR_CFG = 0xF5
     ADDR_CTRL = 0xF4
     ADDR_DATA = 0xF7
 
     CMD_READ = 0x02
 
+    MODE_FORCED = "forced"
+    MODE_NORMAL = "normal"
+    CMD_NORMAL = 0x03
+
     FILTER_MASK = 0b00011100  # t_sb[0:2] | filter[0:2] | _[0:1] | spi3w_en[0]
+    T_SB_MASK = 0b11100000
+    MEASURING_MASK = 0b00001000
+
+    POLL_INTERVAL = 0.001
+
+    CALIBRATION = ("T1", "T2", "T3",
+                   "P1", "P2", "P3", "P4", "P5", "P6", "P7", "P8", "P9")
 
     def __init__(
         self,
@@ -44,6 +75,8 @@ class BMP280(Sensor):
         osrs_p=OSRS["x4"],
         osrs_t=OSRS["x1"],
         filtr=FILTER["OFF"],
+        mode=MODE_FORCED,
+        t_sb=STANDBY["0.5"],
         *args,
         **kwargs
     ):
@@ -58,9 +91,12 @@ class BMP280(Sensor):
         self._i2c_addr = i2c_addr
         self._bus = smbus.SMBus(1)  # TODO: Make this selectable
 
+        self._mode = BMP280.MODE_FORCED
         self.osrs_p = osrs_p
         self.osrs_t = osrs_t
         self.filtr = filtr
+        self.t_sb = t_sb
+        self.mode = mode
 
         self._get_calibration()
 
@@ -68,6 +104,19 @@ class BMP280(Sensor):
     def i2c_addr(self):
         return self._i2c_addr
 
+    @property
+    def calibration(self):
+        return self._calibration
+
+    @calibration.setter
+    def calibration(self, cal):
+        self._calibration = cal
+        # numpy is imported on use only, importing the sensors stays light
+        import numpy as np
+        self._calibration_array = np.array(
+            tuple(cal[key] for key in BMP280.CALIBRATION),
+            dtype=[(key, np.float64) for key in BMP280.CALIBRATION])[()]
+
     @property
     def osrs_p(self):
         return self._osrs_p
@@ -78,6 +127,7 @@ class BMP280(Sensor):
             raise ValueError(
                 "Invalid pressure oversampling value {:b}".format(osrs))
         self._osrs_p = osrs
+        self._apply_mode()
 
     @property
     def osrs_t(self):
@@ -89,11 +139,40 @@ class BMP280(Sensor):
             raise ValueError(
                 "Invalid temperature oversampling value {:b}".format(osrs))
         self._osrs_t = osrs
+        self._apply_mode()
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        if mode not in (BMP280.MODE_FORCED, BMP280.MODE_NORMAL):
+            raise ValueError("Invalid mode {}".format(mode))
+        self._mode = mode
+        self._apply_mode()
+
+    @property
+    def t_sb(self):
+        cfg_reg = self._bus.read_byte_data(self.i2c_addr, BMP280.ADDR_CFG)
+        return (cfg_reg & BMP280.T_SB_MASK) >> 5
+
+    @t_sb.setter
+    def t_sb(self, t_sb):
+        if t_sb not in BMP280.STANDBY.values():
+            raise ValueError(
+                "Invalid standby value {:b}".format(t_sb))
+
+        cfg_reg = self._bus.read_byte_data(self.i2c_addr, BMP280.ADDR_CFG)
+        cfg_reg = (cfg_reg & (BMP280.T_SB_MASK ^ 0xFF)) | (t_sb << 5)
+
+        logging.debug("BMP280: set ADDR_CFG register: {:8b}".format(cfg_reg))
+        self._bus.write_byte_data(self.i2c_addr, BMP280.ADDR_CFG, cfg_reg)
 
     @property
     def filtr(self):
-        cfg_reg = self._bus.read_byte_data(BMP280.ADDR_CFG)
-        filtr = cfg_reg & BMP280.FILTER_MASK
+        cfg_reg = self._bus.read_byte_data(self.i2c_addr, BMP280.ADDR_CFG)
+        filtr = (cfg_reg & BMP280.FILTER_MASK) >> 2
         logging.debug("BMP280: read filter setting: {:8b}".format(filtr))
         return filtr
 
@@ -125,10 +204,18 @@ class BMP280(Sensor):
         return c_uint16((msb << 8) + lsb).value
 
     def read(self):
-        read_cmd = (self.osrs_t << 5) + (self.osrs_p << 2) + BMP280.CMD_READ
-        self._bus.write_byte_data(self.i2c_addr, BMP280.ADDR_CTRL, read_cmd)
+        self.trigger()
+        return self.collect()
 
-        self._wait_measurement_time()
+    def trigger(self):
+        if self.mode == BMP280.MODE_NORMAL:
+            return
+        self._write_ctrl(BMP280.CMD_READ)
+        self._triggered = time.monotonic()
+
+    def collect(self):
+        if self.mode == BMP280.MODE_FORCED:
+            self._wait_measurement_time()
 
         data_reg = self._bus.read_i2c_block_data(
             self.i2c_addr, BMP280.ADDR_DATA, 6)
@@ -143,52 +230,95 @@ class BMP280(Sensor):
             "temperature": T,
         }
 
+    @staticmethod
+    def unpack(data_regs):
+        """Split an (N, 6) array of data register dumps into raw_T, raw_p."""
+        import numpy as np
+        d = np.asarray(data_regs, dtype=np.int64)
+        raw_p = (d[:, 0] << 12) | (d[:, 1] << 4) | (d[:, 2] >> 4)
+        raw_T = (d[:, 3] << 12) | (d[:, 4] << 4) | (d[:, 5] >> 4)
+        return raw_T, raw_p
+
+    def compensate(self, raw_T, raw_p):
+        """Compensate arrays of raw samples at once.
+
+        Runs the datasheet formulas of the scalar path on float64 arrays with
+        the calibration as typed record, so results are bit-for-bit equal.
+        """
+        import numpy as np
+        cal = self._calibration_array
+        T = self._compensated_temperature(
+            np.asarray(raw_T, dtype=np.float64), cal)
+        p = self._compensated_pressure(
+            np.asarray(raw_p, dtype=np.float64), T, cal)
+
+        return {
+            "pressure": p,
+            "temperature": T,
+        }
+
     def _get_calibration(self):
         cal_reg = self._bus.read_i2c_block_data(self.i2c_addr,
                                                 BMP280.ADDR_CAL,
                                                 24)
-        self.calibration = dict()
-        self.calibration["T1"] = self.to_ushort(cal_reg[0:2])
-        self.calibration["T2"] = self.to_short(cal_reg[2:4])
-        self.calibration["T3"] = self.to_short(cal_reg[4:6])
-        self.calibration["P1"] = self.to_ushort(cal_reg[6:8])
-        self.calibration["P2"] = self.to_short(cal_reg[8:10])
-        self.calibration["P3"] = self.to_short(cal_reg[10:12])
-        self.calibration["P4"] = self.to_short(cal_reg[12:14])
-        self.calibration["P5"] = self.to_short(cal_reg[14:16])
-        self.calibration["P6"] = self.to_short(cal_reg[16:18])
-        self.calibration["P7"] = self.to_short(cal_reg[18:20])
-        self.calibration["P8"] = self.to_short(cal_reg[20:22])
-        self.calibration["P9"] = self.to_short(cal_reg[22:24])
+        calibration = dict()
+        calibration["T1"] = self.to_ushort(cal_reg[0:2])
+        calibration["T2"] = self.to_short(cal_reg[2:4])
+        calibration["T3"] = self.to_short(cal_reg[4:6])
+        calibration["P1"] = self.to_ushort(cal_reg[6:8])
+        calibration["P2"] = self.to_short(cal_reg[8:10])
+        calibration["P3"] = self.to_short(cal_reg[10:12])
+        calibration["P4"] = self.to_short(cal_reg[12:14])
+        calibration["P5"] = self.to_short(cal_reg[14:16])
+        calibration["P6"] = self.to_short(cal_reg[16:18])
+        calibration["P7"] = self.to_short(cal_reg[18:20])
+        calibration["P8"] = self.to_short(cal_reg[20:22])
+        calibration["P9"] = self.to_short(cal_reg[22:24])
+        self.calibration = calibration
+
+    def _apply_mode(self):
+        # Forced mode writes ctrl_meas on each trigger, normal mode once
+        if getattr(self, "_mode", None) == BMP280.MODE_NORMAL:
+            self._write_ctrl(BMP280.CMD_NORMAL)
+
+    def _write_ctrl(self, mode_bits):
+        ctrl = (self.osrs_t << 5) + (self.osrs_p << 2) + mode_bits
+        self._bus.write_byte_data(self.i2c_addr, BMP280.ADDR_CTRL, ctrl)
+
+    def _measuring(self):
+        status = self._bus.read_byte_data(self.i2c_addr, BMP280.ADDR_STATUS)
+        return bool(status & BMP280.MEASURING_MASK)
 
     def _wait_measurement_time(self):
-        if self.osrs_p == BMP280.OSRS["x1"]:
-            time.sleep(0.007)
-        elif self.osrs_p == BMP280.OSRS["x2"]:
-            time.sleep(0.009)
-        elif self.osrs_p == BMP280.OSRS["x4"]:
-            time.sleep(0.014)
-        elif self.osrs_p == BMP280.OSRS["x8"]:
-            time.sleep(0.023)
-        elif self.osrs_p == BMP280.OSRS["x16"]:
-            time.sleep(0.044)
-
-    def _compensated_temperature(self, raw_T):
-        cal = self.calibration
+        deadline = getattr(self, "_triggered", 0) + \
+            BMP280.MEASUREMENT_TIME[self.osrs_p]
+
+        while self._measuring():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning("BMP280: conversion exceeds maximum time")
+                return
+            time.sleep(min(BMP280.POLL_INTERVAL, remaining))
+
+    def _compensated_temperature(self, raw_T, cal=None):
+        if cal is None:
+            cal = self.calibration
 
         var1 = (raw_T/16384. - cal["T1"]/1024.) * cal["T2"]
         var2 = (raw_T/131072. - cal["T1"]/8192.)**2 * cal["T3"]
         T = (var1 + var2) / 5120.
 
-        logging.debug("  raw_T = {}".format(raw_T))
-        logging.debug("   var1 = {}".format(var1))
-        logging.debug("   var2 = {}".format(var2))
-        logging.debug("      T = {}".format(T))
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("  raw_T = {}".format(raw_T))
+            logging.debug("   var1 = {}".format(var1))
+            logging.debug("   var2 = {}".format(var2))
+            logging.debug("      T = {}".format(T))
 
         return T
 
-    def _compensated_pressure(self, raw_p, T):
-        cal = self.calibration
+    def _compensated_pressure(self, raw_p, T, cal=None):
+        if cal is None:
+            cal = self.calibration
 
         var1 = T*2560. - 64000.
         var2 = var1**2 * cal["P6"] / 32768.
@@ -202,9 +332,10 @@ class BMP280(Sensor):
         var2 = p * cal["P8"] / 32768.
         p = p + (var1 + var2 + cal["P7"]) / 16.
 
-        logging.debug("  raw_p = {}".format(raw_p))
-        logging.debug("   var1 = {}".format(var1))
-        logging.debug("   var2 = {}".format(var2))
-        logging.debug("      p = {}".format(p))
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("  raw_p = {}".format(raw_p))
+            logging.debug("   var1 = {}".format(var1))
+            logging.debug("   var2 = {}".format(var2))
+            logging.debug("      p = {}".format(p))
 
         return p
@@ -1,39 +1,129 @@
 import logging
-import numpy as np
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from piweather.sensors import Sensor
 
 
+def read_lines(path):
+    try:
+        logging.debug("DS18x20: opening path: {}".format(path))
+        with open(path, "r") as f:
+            return f.readlines()
+    except FileNotFoundError:
+        logging.error("DS18x20: File not found at {}".format(path))
+        return None
+
+
+class DS18x20Bus(object):
+    """Coordinates all DS18x20 sensors attached to one w1 bus master.
+
+    A single simultaneous conversion is triggered through the master's
+    `therm_bulk_read` file where the kernel provides it, afterwards the
+    `w1_slave` files of all sensors are read in parallel. Sensors created via
+    `sensor()` are served from that shared result for `cache` seconds.
+    `master` may point to a fake sysfs tree.
+    """
+
+    DEFAULT_MASTER = "/sys/bus/w1/devices/w1_bus_master1"
+
+    def __init__(self, master=DEFAULT_MASTER, cache=1, timeout=2):
+        self._master = master
+        self._cache = cache
+        self._timeout = timeout
+        self._paths = []
+        self._lines = {}
+        self._last_query = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def master(self):
+        return self._master
+
+    @property
+    def bulk_read_path(self):
+        return os.path.join(self.master, "therm_bulk_read")
+
+    def slaves(self):
+        path = os.path.join(self.master, "w1_master_slaves")
+        lines = read_lines(path) or []
+        return [line.strip() for line in lines if line.strip()]
+
+    def sensor(self, slave, *args, **kwargs):
+        path = os.path.join(os.path.dirname(self.master), slave, "w1_slave")
+        self._paths.append(path)
+        return DS18x20(path, *args, bus=self, **kwargs)
+
+    def lines(self, path):
+        with self._lock:
+            if time.monotonic() - self._last_query > self._cache:
+                self._read_all()
+            return self._lines.get(path)
+
+    def _convert(self):
+        if not os.path.exists(self.bulk_read_path):
+            return
+
+        logging.debug("DS18x20: trigger bulk conversion")
+        with open(self.bulk_read_path, "w") as f:
+            f.write("trigger\n")
+
+        deadline = time.monotonic() + self._timeout
+        while time.monotonic() < deadline:
+            with open(self.bulk_read_path, "r") as f:
+                if f.read().strip() != "-1":
+                    return
+            time.sleep(0.01)
+        logging.warning("DS18x20: bulk conversion timed out")
+
+    def _read_all(self):
+        self._convert()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=4)
+        paths = list(self._paths)
+        self._lines = dict(zip(paths, self._executor.map(read_lines, paths)))
+        self._last_query = time.monotonic()
+
+
 class DS18x20(Sensor):
 
     dtypes = {
         "temperature": float,
     }
 
-    def __init__(self, path, *args, **kwargs):
+    def __init__(self, path, *args, bus=None, **kwargs):
         super(DS18x20, self).__init__(*args, **kwargs)
         self._path = path
+        self._bus = bus
 
     @property
     def path(self):
         return self._path
 
+    @property
+    def bus(self):
+        return self._bus
+
     def read(self):
-        try:
-            logging.debug("DS18x20: opening path: {}".format(self.path))
-            with open(self.path, "r") as f:
-                lines = f.readlines()
-        except FileNotFoundError:
-            logging.error("DS18x20: File not found at {}".format(self.path))
-            return {"temperature": np.NaN}
+        if self.bus is not None:
+            lines = self.bus.lines(self.path)
+        else:
+            lines = read_lines(self.path)
+
+        if lines is None:
+            return {"temperature": float("nan")}
 
         if self._crc_is_invalid(lines):
             logging.warning("DS18x20: invalid CRC")
-            return {"temperature": np.NaN}
+            return {"temperature": float("nan")}
 
         raw = self._extract_raw_temperature(lines)
         if raw == "85000":
             logging.warning("DS18x20: T=85000 error occured")
-            return {"temperature": np.NaN}
+            return {"temperature": float("nan")}
 
         return {
             "temperature": int(raw)/1000,
@@ -17,3 +17,6 @@ class Dummy(Sensor):
             "random": random.random(),
             "randint": random.randint(0, 5)
         }
+
+    async def aread(self):
+        return self.read()
@@ -1,7 +1,18 @@
+import asyncio
+import threading
 import time
 
+from concurrent.futures import Future
+from piweather.acquisition import run_blocking
+
 
 class Sensor(object):
+    """Base class of all sensors.
+
+    `value` and `avalue()` return the cached values or read the sensor if the
+    cache expired. Only one read is in flight per sensor at a time, callers
+    arriving meanwhile wait for and receive the result of that read.
+    """
 
     dtypes = {}
 
@@ -9,19 +20,48 @@ class Sensor(object):
         self._cache = cache
         self._last_query = 0
         self._last_value = {}
+        self._read_lock = threading.Lock()
+        self._inflight = None
+        self._stats = dict(reads=0, cache_hits=0, coalesced=0)
         if self.dtypes == {}:
             raise NotImplementedError(
                 "Must specify dtypes for {}".format(type(self)))
 
     @property
     def value(self):
-        if self._cache_expired():
-            new_values = self.read()
-            self._check_dtype_consistency(new_values)
-            self._last_value = new_values
-            self._last_query = time.monotonic()
+        leader, future = self._claim()
+        if future is None:
+            return self._last_value
+        if not leader:
+            return future.result()
+
+        try:
+            self._update(self.read())
+        except Exception as e:
+            self._release(future, exception=e)
+            raise
+        self._release(future)
+        return self._last_value
+
+    async def avalue(self):
+        leader, future = self._claim()
+        if future is None:
+            return self._last_value
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            self._update(await self.aread())
+        except Exception as e:
+            self._release(future, exception=e)
+            raise
+        self._release(future)
         return self._last_value
 
+    @property
+    def stats(self):
+        return dict(self._stats)
+
     @property
     def last(self):
         return self._last_value
@@ -29,6 +69,52 @@ class Sensor(object):
     def read(self):
         raise NotImplementedError("Override this method!")
 
+    async def aread(self):
+        """Override this method for sensors which can be read natively async,
+        by default the blocking `read()` runs in the acquisition executor."""
+        return await run_blocking(self.read)
+
+    def trigger(self):
+        """Start a conversion without waiting for its result.
+
+        Sensors with a separate conversion phase override this together with
+        `collect()`, so several of them can convert at the same time.
+        """
+
+    def collect(self):
+        """Return the values of the conversion started by `trigger()`."""
+        return self.read()
+
+    def _claim(self):
+        """Returns `(leader, future)`, `future` is None on a cache hit.
+
+        The leader must perform the read and `_release()` the future, all
+        other callers wait for it.
+        """
+        with self._read_lock:
+            if not self._cache_expired():
+                self._stats["cache_hits"] += 1
+                return False, None
+            if self._inflight is not None:
+                self._stats["coalesced"] += 1
+                return False, self._inflight
+            self._stats["reads"] += 1
+            self._inflight = Future()
+            return True, self._inflight
+
+    def _release(self, future, exception=None):
+        with self._read_lock:
+            self._inflight = None
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(self._last_value)
+
+    def _update(self, new_values):
+        self._check_dtype_consistency(new_values)
+        self._last_value = new_values
+        self._last_query = time.monotonic()
+
     def _cache_expired(self):
         return time.monotonic() - self._last_query > self._cache
 
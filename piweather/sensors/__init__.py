@@ -1,5 +1,5 @@
 from piweather.sensors.Sensor import Sensor  # noqa
 from piweather.sensors.Dummy import Dummy  # noqa
-from piweather.sensors.DS18x20 import DS18x20  # noqa
+from piweather.sensors.DS18x20 import DS18x20, DS18x20Bus  # noqa
 from piweather.sensors.A100R import A100R  # noqa
 from piweather.sensors.BMP280 import BMP280  # noqa
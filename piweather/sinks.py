@@ -0,0 +1,109 @@
+import collections
+import logging
+
+from piweather.database import get_schema
+from piweather.journal import get_journal
+
+
+def reduce_last(rows, dtypes):
+    return rows[-1]
+
+
+def reduce_mean(rows, dtypes):
+    """Average the sensor columns of `rows`, keeping the last timestamp."""
+    reduced = dict(time=rows[-1]["time"])
+    for col, type_ in dtypes.items():
+        mean = sum(row[col] for row in rows) / len(rows)
+        reduced[col] = type_(round(mean)) if type_ is int else type_(mean)
+    return reduced
+
+
+REDUCERS = {
+    "last": reduce_last,
+    "mean": reduce_mean,
+}
+
+
+class Sink(object):
+    """Consumer of the rows acquired by a `Measurement`.
+
+    Rows are collected in windows of `every` rows, each full window is
+    reduced to one row (see `REDUCERS`) and passed to `emit()`. `push()`
+    returns the `(table, row)` pairs the measurement has to persist.
+    """
+
+    def __init__(self, every=1, reduce="last"):
+        if every < 1:
+            raise ValueError("Decimation ratio must be >= 1")
+        self.every = every
+        self._reduce = REDUCERS[reduce]
+        self._window = []
+        self._dtypes = {}
+
+    def bind(self, measurement):
+        self._dtypes = dict(measurement.sensor.dtypes)
+
+    def push(self, row):
+        self._window.append(row)
+        if len(self._window) < self.every:
+            return ()
+
+        window, self._window = self._window, []
+        return self.emit(self._reduce(window, self._dtypes)) or ()
+
+    def emit(self, row):
+        raise NotImplementedError("Override this method!")
+
+
+class TableSink(Sink):
+    """Stores the (decimated) rows in a table of their own."""
+
+    def __init__(self, table, every=1, reduce="last"):
+        super(TableSink, self).__init__(every, reduce)
+        self._table = table
+
+    @property
+    def table(self):
+        return self._table
+
+    def bind(self, measurement):
+        super(TableSink, self).bind(measurement)
+        logging.debug("register sink table '{}'".format(self.table))
+        get_schema().register(self.table, measurement.sensor.dtypes)
+
+        journal = get_journal()
+        if journal is not None:
+            journal.register(self.table, measurement.sensor.dtypes)
+
+    def emit(self, row):
+        return [(self.table, row)]
+
+
+class TailSink(Sink):
+    """Keeps the latest `maxlen` (decimated) rows in memory."""
+
+    def __init__(self, maxlen, every=1, reduce="last"):
+        super(TailSink, self).__init__(every, reduce)
+        self._rows = collections.deque(maxlen=maxlen)
+
+    @property
+    def rows(self):
+        return list(self._rows)
+
+    def emit(self, row):
+        self._rows.append(row)
+
+
+class CallbackSink(Sink):
+    """Publishes the (decimated) rows by calling `callback(row)`."""
+
+    def __init__(self, callback, every=1, reduce="last"):
+        super(CallbackSink, self).__init__(every, reduce)
+        self._callback = callback
+
+    def emit(self, row):
+        try:
+            self._callback(row)
+        except Exception:
+            logging.exception("Sink callback {} raised".format(
+                self._callback))
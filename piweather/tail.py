@@ -0,0 +1,95 @@
+import numpy as np
+import threading
+
+from datetime import datetime
+from piweather.database import map_numpy_dtype
+
+
+class TailWindow(object):
+    """Preallocated ring of the newest `capacity` rows of a measurement.
+
+    One typed array per column is allocated up front, so memory is bounded
+    by `capacity` regardless of the sampling rate. The window knows the time
+    after which it holds every row of the table (`complete_since`), queries
+    for rows after a later time can be answered without the database.
+    """
+
+    def __init__(self, dtypes, capacity, complete_since=None):
+        if capacity < 1:
+            raise ValueError("Tail window capacity must be >= 1")
+        self._capacity = capacity
+        self._dtypes = dict(time=datetime, **dtypes)
+        self._columns = {
+            col: np.empty(capacity, dtype=map_numpy_dtype(type_))
+            for col, type_ in self._dtypes.items()
+        }
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.complete_since = complete_since or datetime.now()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def nbytes(self):
+        return sum(col.nbytes for col in self._columns.values())
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        with self._lock:
+            self._append(row)
+
+    def warm(self, columns, complete_since):
+        """Fill the window with time ordered `columns`, e.g. from the DB.
+
+        `columns` must contain every row of the table after `complete_since`,
+        rows exceeding the capacity are dropped oldest first.
+        """
+        n = len(columns["time"])
+        skip = max(0, n - self._capacity)
+        with self._lock:
+            self.complete_since = complete_since
+            if skip:
+                self.complete_since = max(
+                    complete_since,
+                    np.datetime64(columns["time"][skip - 1]).astype(datetime))
+            for col, values in self._columns.items():
+                values[:n - skip] = columns[col][skip:]
+            self._head = (n - skip) % self._capacity
+            self._size = n - skip
+
+    def covers(self, since):
+        return since is not None and since >= self.complete_since
+
+    def data(self, columns=None, since=None):
+        """Columns of the rows after `since` in time order."""
+        if columns is None:
+            columns = tuple(self._columns)
+
+        with self._lock:
+            if self._size < self._capacity:
+                index = np.arange(self._size)
+            else:
+                index = np.roll(np.arange(self._capacity), -self._head)
+
+            times = self._columns["time"][index]
+            if since is not None:
+                first = np.searchsorted(
+                    times, np.datetime64(since, "us"), side="right")
+                index = index[first:]
+
+            return {col: self._columns[col][index] for col in columns}
+
+    def _append(self, row):
+        if self._size == self._capacity:
+            overwritten = self._columns["time"][self._head]
+            self.complete_since = max(self.complete_since,
+                                      overwritten.astype(datetime))
+        for col, values in self._columns.items():
+            values[self._head] = row[col]
+        self._head = (self._head + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
@@ -11,6 +11,17 @@ class TransientDBTestCase(unittest.TestCase):
             piweather.scheduler.start()
 
     def tearDown(self):
+        if piweather.write_buffer is not None:
+            piweather.write_buffer.close()
+            piweather.write_buffer = None
+        if piweather.write_journal is not None:
+            piweather.write_journal.close()
+            piweather.write_journal = None
+        if piweather.async_scheduler is not None:
+            piweather.async_scheduler.shutdown()
+            piweather.async_scheduler = None
+        piweather.query_cache = None
         piweather.db = None
+        piweather.schema = None
         for job in piweather.scheduler.get_jobs():
             job.remove()
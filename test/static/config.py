@@ -12,3 +12,5 @@ SENSORS = "test/static/sensors.py"
 DASH = "test/static/dash.py"
 
 VIEWPORT = timedelta(hours=24)
+MAX_POINTS = 1000
+LIVE_INTERVAL = 10
@@ -0,0 +1,82 @@
+import os
+import piweather
+import tempfile
+import threading
+import time
+
+from piweather import Measurement
+from piweather import sensors
+from piweather.acquisition import AsyncScheduler, get_async_scheduler
+from piweather.database import get_engine
+from test import TransientDBTestCase
+
+
+class BlockingDummy(sensors.Dummy):
+
+    def __init__(self, *args, **kwargs):
+        super(BlockingDummy, self).__init__(*args, **kwargs)
+        self.threads = set()
+
+    def read(self):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        return super(BlockingDummy, self).read()
+
+    async def aread(self):
+        return await sensors.Sensor.aread(self)
+
+
+class TestAsyncScheduler(TransientDBTestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        piweather.db = get_engine("sqlite:///" + self.path)
+        get_async_scheduler().start()
+
+    def tearDown(self):
+        super(TestAsyncScheduler, self).tearDown()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_runs_coroutine_jobs_on_interval(self):
+        calls = []
+
+        async def job():
+            calls.append(time.monotonic())
+
+        get_async_scheduler().add_job(job, "interval", seconds=0.05)
+        time.sleep(0.18)
+        self.assertGreaterEqual(len(calls), 2)
+
+    def test_jobs_can_be_rescheduled_and_removed(self):
+        async def job():
+            pass
+
+        scheduler = AsyncScheduler()
+        j = scheduler.add_job(job, "interval", seconds=60)
+        j.reschedule("interval", seconds=120)
+        self.assertEqual(j.trigger.interval.seconds, 120)
+        j.remove()
+        self.assertListEqual(scheduler.get_jobs(), [])
+
+    def test_measurement_targets_async_scheduler(self):
+        pre = len(piweather.scheduler.get_jobs())
+        m = Measurement(sensors.Dummy(), table="async_table",
+                        frequency=0.05, asynchronous=True)
+
+        self.assertEqual(len(piweather.scheduler.get_jobs()), pre)
+        self.assertEqual(len(get_async_scheduler().get_jobs()), 1)
+        time.sleep(0.2)
+        self.assertGreaterEqual(len(m.data()["random"]), 2)
+
+    def test_blocking_reads_run_in_bounded_executor(self):
+        sensor = BlockingDummy()
+        ms = [Measurement(sensor, table="blocking", frequency=0.05,
+                          asynchronous=True) for _ in range(8)]
+        time.sleep(0.3)
+
+        self.assertTrue(all(m.last for m in ms))
+        self.assertLessEqual(len(sensor.threads), 4)
+        self.assertNotIn("piweather-acquisition", sensor.threads)
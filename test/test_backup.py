@@ -0,0 +1,133 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from piweather import Measurement
+from piweather import backup
+from piweather import sensors
+from piweather.database import get_schema
+from test import TransientDBTestCase
+
+
+class TestBackup(TransientDBTestCase):
+
+    def setUp(self):
+        super(TestBackup, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "t" + backup.EXTENSION)
+        self.meas = Measurement(sensors.Dummy(), table="source")
+
+    def acquire(self, n, start=datetime(2017, 8, 25)):
+        for i in range(n):
+            with patch("piweather.measurements.datetime") as mock_dt:
+                mock_dt.now.return_value = start + timedelta(seconds=i)
+                self.meas.acquire()
+
+    def assertSameData(self, first, second):
+        for col in ("time", "random", "randint"):
+            self.assertListEqual(list(first[col]), list(second[col]))
+
+    def test_round_trip_in_chunks(self):
+        self.acquire(7)
+        self.assertEqual(backup.export(self.meas, self.path, chunk_rows=3), 7)
+
+        target = Measurement(sensors.Dummy(), table="target")
+        self.assertEqual(backup.restore(target, self.path), 7)
+        self.assertSameData(target.data(), self.meas.data())
+
+    def test_read_decodes_typed_columns(self):
+        self.acquire(3)
+        backup.export(self.meas, self.path)
+
+        table, dtypes, chunks = backup.read(self.path)
+        chunk, = list(chunks)
+        self.assertEqual(table, "source")
+        self.assertEqual(dtypes, sensors.Dummy.dtypes)
+        self.assertEqual(chunk["time"].dtype.str, "<M8[us]")
+        self.assertEqual(chunk["randint"].dtype.str, "<i8")
+        self.assertEqual(chunk["time"][-1].astype(datetime),
+                         datetime(2017, 8, 25, 0, 0, 2))
+
+    def test_regular_timestamps_compress(self):
+        self.acquire(1000)
+        backup.export(self.meas, self.path)
+        # 24 bytes per row uncompressed, the random floats take 8 of them
+        self.assertLess(os.path.getsize(self.path), 12 * 1000)
+
+    def test_restore_into_archive(self):
+        self.acquire(4)
+        backup.export(self.meas, self.path)
+
+        target = Measurement(sensors.Dummy(), table="target",
+                             archive=os.path.join(self.directory, "archive"))
+        self.assertEqual(backup.restore(target, self.path), 4)
+        self.assertSameData(target.data(), self.meas.data())
+
+    def test_null_integers_round_trip(self):
+        chunk = dict(time=np.array([datetime(2017, 8, 25)] * 2,
+                                   dtype="datetime64[us]"),
+                     random=np.array([1., 2.]),
+                     randint=np.array([None, 3], dtype=object))
+        with patch.object(self.meas, "iter_data", return_value=[chunk]):
+            self.assertEqual(backup.export(self.meas, self.path), 2)
+
+        target = Measurement(sensors.Dummy(), table="target")
+        backup.restore(target, self.path)
+        rows = get_schema().engine.execute(
+            "SELECT randint FROM target").fetchall()
+        self.assertListEqual(rows, [(None,), (3,)])
+
+    def test_empty_table(self):
+        self.assertEqual(backup.export(self.meas, self.path), 0)
+        target = Measurement(sensors.Dummy(), table="target")
+        self.assertEqual(backup.restore(target, self.path), 0)
+
+    def test_foreign_file_is_rejected(self):
+        with open(self.path, "wb") as f:
+            f.write(b"SQLite format 3\0")
+        with self.assertRaises(ValueError):
+            backup.restore(self.meas, self.path)
+
+    def test_restore_rebuilds_rollups(self):
+        self.acquire(90)
+        backup.export(self.meas, self.path, chunk_rows=50)
+
+        target = Measurement(sensors.Dummy(), table="target", rollups=True)
+        backup.restore(target, self.path)
+        rows = get_schema().engine.execute(
+            "SELECT random_count FROM target_1m ORDER BY time").fetchall()
+        self.assertListEqual([r[0] for r in rows], [60, 30])
+
+        rolled = target.data(columns=["random"],
+                             resolution=timedelta(minutes=1))
+        self.assertAlmostEqual(rolled["random"][0],
+                               np.mean(self.meas.data()["random"][:60]))
+
+    def test_restore_into_open_bucket_is_merged(self):
+        self.acquire(3, start=datetime(2017, 8, 25, 0, 1))
+        backup.export(self.meas, self.path)
+
+        target = Measurement(sensors.Dummy(), table="target", rollups=True)
+        self.meas = target
+        self.acquire(1)
+        self.acquire(1, start=datetime(2017, 8, 25, 0, 1, 30))
+        backup.restore(target, self.path)
+        self.acquire(1, start=datetime(2017, 8, 25, 0, 2))
+
+        rows = get_schema().engine.execute(
+            "SELECT random_count FROM target_1m ORDER BY time").fetchall()
+        self.assertListEqual(rows, [(1,), (4,)])
+
+    def test_restore_warms_tail(self):
+        now = datetime.now().replace(microsecond=0)
+        self.acquire(3, start=now - timedelta(minutes=1))
+        backup.export(self.meas, self.path)
+
+        target = Measurement(sensors.Dummy(), table="target", tail=10)
+        backup.restore(target, self.path)
+        self.assertEqual(len(target.tail), 3)
@@ -0,0 +1,90 @@
+import piweather
+import time
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from piweather import Measurement
+from piweather import sensors
+from piweather.buffer import get_buffer
+from piweather.database import Schema
+from piweather.helper import load_external
+from test import TransientDBTestCase
+
+
+class TestWriteBuffer(TransientDBTestCase):
+
+    def setUp(self):
+        super(TestWriteBuffer, self).setUp()
+        self.meas = Measurement(sensors.Dummy(), table="buffered")
+
+    def tearDown(self):
+        piweather.config = None
+        super(TestWriteBuffer, self).tearDown()
+
+    def use_buffer(self, **kwargs):
+        piweather.config = SimpleNamespace(WRITE_BUFFER=kwargs)
+        return get_buffer()
+
+    def test_buffer_is_disabled_by_default(self):
+        piweather.config = load_external("test/static/config.py")
+        self.assertIsNone(get_buffer())
+        self.meas.acquire()
+        self.assertEqual(len(self.meas.data()["random"]), 1)
+
+    def test_acquire_updates_last_but_defers_insert(self):
+        buf = self.use_buffer(max_rows=10, max_age=60)
+        self.meas.acquire()
+
+        self.assertIn("random", self.meas.last)
+        self.assertEqual(len(buf), 1)
+        self.assertEqual(len(self.meas.data()["random"]), 0)
+
+    def test_flushes_when_max_rows_is_reached(self):
+        buf = self.use_buffer(max_rows=3, max_age=60)
+        for _ in range(3):
+            self.meas.acquire()
+
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(len(self.meas.data()["random"]), 3)
+
+    def test_flushes_when_oldest_row_exceeds_max_age(self):
+        buf = self.use_buffer(max_rows=10, max_age=0.1)
+        self.meas.acquire()
+        time.sleep(0.15)
+        self.meas.acquire()
+
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(len(self.meas.data()["random"]), 2)
+
+    def test_flushes_rows_of_several_tables_at_once(self):
+        other = Measurement(sensors.Dummy(), table="buffered_other")
+        buf = self.use_buffer(max_rows=10, max_age=60)
+        self.meas.acquire()
+        other.acquire()
+        buf.flush()
+
+        self.assertEqual(len(self.meas.data()["random"]), 1)
+        self.assertEqual(len(other.data()["random"]), 1)
+
+    def test_failed_flush_keeps_rows_for_next_flush(self):
+        buf = self.use_buffer(max_rows=10, max_age=60)
+        self.meas.acquire()
+
+        with patch.object(Schema, "write", side_effect=OSError("offline")):
+            with self.assertRaises(OSError):
+                buf.flush()
+        self.assertEqual(len(buf), 1)
+        self.assertEqual(len(self.meas.data()["random"]), 0)
+
+        buf.flush()
+        self.assertEqual(len(self.meas.data()["random"]), 1)
+
+    def test_tail_is_updated_once_rows_are_flushed(self):
+        meas = Measurement(sensors.Dummy(), table="buffered_tail", tail=10)
+        buf = self.use_buffer(max_rows=10, max_age=60)
+        meas.acquire()
+        self.assertEqual(len(meas.tail), 0)
+
+        buf.flush()
+        self.assertEqual(len(meas.tail), 1)
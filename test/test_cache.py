@@ -0,0 +1,115 @@
+import piweather
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from piweather import Measurement
+from piweather import sensors
+from piweather.cache import get_query_cache
+from test import TransientDBTestCase
+
+
+class TestQueryCache(TransientDBTestCase):
+
+    def setUp(self):
+        super(TestQueryCache, self).setUp()
+        piweather.config = SimpleNamespace(
+            QUERY_CACHE=dict(max_bytes=2**20, ttl=60, bucket=60))
+        self.meas = Measurement(sensors.Dummy(), table="cached",
+                                rollups=True)
+        self.t0 = datetime(2017, 1, 1, 12)
+
+    def tearDown(self):
+        piweather.config = None
+        super(TestQueryCache, self).tearDown()
+
+    def acquire_at(self, *seconds):
+        for s in seconds:
+            with patch("piweather.measurements.datetime") as mock_dt:
+                mock_dt.now.return_value = self.t0 + timedelta(seconds=s)
+                self.meas.acquire()
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.acquire_at(0, 1, 2)
+        first = self.meas.data()
+        second = self.meas.data()
+
+        self.assertEqual(get_query_cache().stats["hits"], 1)
+        self.assertEqual(get_query_cache().stats["misses"], 1)
+        self.assertEqual(first.keys(), second.keys())
+        self.assertListEqual(list(second["random"]), list(first["random"]))
+
+    def test_acquire_extends_cached_entries(self):
+        self.acquire_at(0, 1)
+        self.meas.data(columns="random")
+        self.acquire_at(2)
+
+        data = self.meas.data(columns="random")
+        self.assertEqual(len(data["random"]), 3)
+        self.assertEqual(data["random"][-1], self.meas.last["random"])
+        self.assertListEqual(list(data), ["random"])
+        self.assertEqual(get_query_cache().stats["hits"], 1)
+
+    def test_since_within_bucket_shares_entry(self):
+        self.acquire_at(*range(0, 50, 5))
+        first = self.meas.data(since=self.t0 + timedelta(seconds=12))
+        second = self.meas.data(since=self.t0 + timedelta(seconds=32))
+
+        self.assertEqual(len(first["time"]), 7)
+        self.assertEqual(len(second["time"]), 3)
+        self.assertEqual(get_query_cache().stats["hits"], 1)
+
+    def test_finished_rollup_bucket_invalidates_entries(self):
+        self.acquire_at(0, 30)
+        columns = ["time", "random_count"]
+        self.meas.data(columns, resolution=timedelta(minutes=1))
+        self.acquire_at(60)
+
+        rolled = self.meas.data(columns, resolution=timedelta(minutes=1))
+        self.assertEqual(get_query_cache().stats["misses"], 2)
+        self.assertEqual(list(rolled["random_count"]), [2, 1])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.acquire_at(*range(100))
+        cache = get_query_cache()
+        cache.max_bytes = 1
+
+        self.meas.data(columns="random")
+        self.meas.data(columns="randint")
+        self.assertEqual(cache.stats["entries"], 1)
+        self.assertGreater(cache.stats["bytes"], 0)
+
+    def test_expired_entries_are_queried_again(self):
+        get_query_cache().ttl = 0
+        self.meas.data()
+        self.meas.data()
+        self.assertEqual(get_query_cache().stats["hits"], 0)
+
+    def test_moving_since_and_inserts_stay_bounded(self):
+        cache = get_query_cache()
+        for minute in range(30):
+            self.acquire_at(*range(minute * 60, minute * 60 + 60, 10))
+            self.meas.data(columns="random",
+                           since=self.t0 + timedelta(minutes=minute))
+
+        self.assertEqual(cache.stats["entries"], cache.max_since)
+        self.assertEqual(cache.stats["bytes"], sum(
+            entry.nbytes for entry in cache._entries.values()))
+
+        cache.max_bytes = cache.stats["bytes"]
+        self.acquire_at(*range(1800, 3600, 10))
+        self.assertEqual(cache.stats["entries"], 1)
+        self.assertEqual(cache.stats["bytes"], sum(
+            entry.nbytes for entry in cache._entries.values()))
+
+        cache.ttl = 0
+        self.acquire_at(3600)
+        self.assertEqual(cache.stats["bytes"], 0)
+
+    def test_appended_rows_are_counted(self):
+        self.acquire_at(0)
+        self.meas.data(columns="random")
+        before = get_query_cache().stats["bytes"]
+        self.acquire_at(1, 2)
+        self.assertEqual(get_query_cache().stats["bytes"], before + 2 * 16)
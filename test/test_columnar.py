@@ -0,0 +1,145 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from piweather import Measurement
+from piweather import sensors
+from piweather.columnar import (ColumnarArchive, append_array, load_array,
+                                migrate)
+from piweather.database import get_schema
+from test import TransientDBTestCase
+
+
+def rows(n, start=datetime(2017, 8, 25, 22), step=timedelta(hours=1)):
+    return [dict(time=start + i * step, random=i / 2., randint=i)
+            for i in range(n)]
+
+
+class TestColumnarArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.archive = ColumnarArchive(self.directory)
+        self.archive.register("t", sensors.Dummy.dtypes)
+
+    def test_rows_are_partitioned_by_day(self):
+        self.archive.write("t", rows(5))
+        self.assertEqual(
+            [os.path.basename(p) for p in self.archive.partitions("t")],
+            ["20170825", "20170826"])
+
+        data = self.archive.data("t")
+        self.assertEqual(list(data), ["time", "randint", "random"])
+        self.assertEqual(data["randint"].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(data["time"].dtype, np.dtype("datetime64[us]"))
+
+    def test_appends_survive_reopening(self):
+        for row in rows(3):
+            self.archive.write("t", row)
+
+        data = ColumnarArchive(self.directory).data("t", "random")
+        self.assertEqual(data["random"].tolist(), [0., .5, 1.])
+
+    def test_range_reads_map_only_overlapping_partitions(self):
+        self.archive.write("t", rows(5))
+        since = datetime(2017, 8, 26, 0)
+
+        with patch("piweather.columnar.load_array",
+                   wraps=load_array) as load:
+            data = self.archive.data("t", ["time", "randint"], since=since)
+
+        self.assertEqual(data["randint"].tolist(), [3, 4])
+        self.assertIsInstance(data["randint"], np.memmap)
+        self.assertTrue(all("20170826" in call[0][0]
+                            for call in load.call_args_list))
+
+    def test_interrupted_append_is_ignored(self):
+        self.archive.write("t", rows(2))
+        path = self.archive.partitions("t")[0]
+        with open(os.path.join(path, "random.npy"), "ab") as f:
+            f.write(np.float64(42.).tobytes())
+
+        self.assertEqual(self.archive.data("t", "random")["random"].tolist(),
+                         [0., .5])
+        self.archive.write("t", rows(1, start=datetime(2017, 8, 25, 23, 30)))
+        self.assertEqual(self.archive.data("t", "random")["random"].tolist(),
+                         [0., .5, 0.])
+
+    def test_interrupted_append_does_not_shift_columns(self):
+        self.archive.write("t", rows(1))
+        path = self.archive.partitions("t")[0]
+        for col, value in (("random", 42.), ("randint", 42)):
+            append_array(os.path.join(path, col + ".npy"),
+                         np.array([value], dtype=self.archive.dtypes("t")[col]))
+
+        self.archive.write("t", rows(2)[1:])
+        data = self.archive.data("t")
+        self.assertEqual(data["random"].tolist(), [0., .5])
+        self.assertEqual(data["randint"].tolist(), [0, 1])
+
+    def test_column_added_behind_existing_rows_is_missing(self):
+        self.archive.write("t", rows(1))
+        self.archive.register("t", dict(sensors.Dummy.dtypes, gust=float,
+                                        gusts=int))
+        self.archive.write("t", [dict(row, gust=3., gusts=2)
+                                 for row in rows(2)[1:]])
+
+        data = self.archive.data("t", ["gust", "gusts"])
+        self.assertTrue(np.isnan(data["gust"][0]))
+        self.assertEqual(data["gust"][1], 3.)
+        self.assertTrue(np.isnan(data["gusts"][0]))
+        self.assertEqual(data["gusts"][1], 2)
+
+    def test_iter_data_yields_bounded_chunks(self):
+        self.archive.write("t", rows(5, step=timedelta(minutes=1)))
+        chunks = list(self.archive.iter_data("t", "randint", chunk_rows=2))
+        self.assertEqual([c["randint"].tolist() for c in chunks],
+                         [[0, 1], [2, 3], [4]])
+
+    def test_empty_range(self):
+        self.assertEqual(self.archive.data("t", ["time", "random"]),
+                         {"time": [], "random": []})
+
+
+class TestArchivedMeasurement(TransientDBTestCase):
+
+    def setUp(self):
+        super(TestArchivedMeasurement, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_acquire_writes_to_archive_only(self):
+        m = Measurement(sensors.Dummy(), "archived", archive=self.directory)
+        m.acquire()
+        m.acquire()
+
+        self.assertEqual(len(m.data()["random"]), 2)
+        self.assertEqual(m.data("random")["random"][-1], m.last["random"])
+        self.assertNotIn("archived", get_schema().bind.table_names())
+
+    def test_rollups_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Measurement(sensors.Dummy(), "archived", rollups=True,
+                        archive=self.directory)
+
+    def test_migrate_copies_sql_table(self):
+        m = Measurement(sensors.Dummy(), "legacy")
+        for _ in range(5):
+            m.acquire()
+
+        archive = ColumnarArchive(self.directory)
+        self.assertEqual(migrate(get_schema(), "legacy", archive,
+                                 chunk_rows=2), 5)
+        self.assertEqual(migrate(get_schema(), "legacy", archive), 0)
+
+        archived = Measurement(sensors.Dummy(), "legacy", archive=archive)
+        expected = m.data()
+        data = archived.data()
+        for col in ("time", "random", "randint"):
+            self.assertListEqual(list(data[col]), list(expected[col]))
@@ -0,0 +1,96 @@
+import piweather
+import time
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from dash.exceptions import PreventUpdate
+from piweather import Measurement
+from piweather import sensors
+from piweather.dashboard import LiveGraph, Scatter, extend_live_graph
+from test import TransientDBTestCase
+
+
+class TestLiveGraph(TransientDBTestCase):
+
+    def setUp(self):
+        super(TestLiveGraph, self).setUp()
+        self.meas = Measurement(sensors.Dummy(), table="live")
+        piweather.config = SimpleNamespace(
+            MEASUREMENTS=[self.meas], VIEWPORT=timedelta(hours=1),
+            MAX_POINTS=1000)
+
+    def tearDown(self):
+        piweather.config = None
+        super(TestLiveGraph, self).tearDown()
+
+    def acquire_at(self, meas, *times):
+        for t in times:
+            with patch("piweather.measurements.datetime") as mock_dt:
+                mock_dt.now.return_value = t
+                meas.acquire()
+
+    def watermarks(self, meas=None):
+        plot = Scatter(meas or self.meas, "random")
+        graph = LiveGraph([plot], interval=1)
+        store = graph.children[-1]
+        return store.data
+
+    def test_scatter_watermark_is_last_sample(self):
+        self.meas.acquire()
+        wm = self.watermarks()["traces"][0]
+        self.assertEqual(wm["table"], "live")
+        self.assertEqual(wm["column"], "random")
+        self.assertEqual(wm["since"][:19],
+                         self.meas.last["time"].isoformat()[:19])
+
+    def test_extends_only_new_rows(self):
+        self.meas.acquire()
+        watermarks = self.watermarks()
+        time.sleep(0.01)
+        self.meas.acquire()
+        self.meas.acquire()
+
+        (update, indices, limit), watermarks = extend_live_graph(
+            1, watermarks)
+        self.assertListEqual(indices, [0])
+        self.assertEqual(len(update["y"][0]), 2)
+
+        with self.assertRaises(PreventUpdate):
+            extend_live_graph(2, watermarks)
+
+    def test_rollup_traces_are_extended_by_rollup_rows(self):
+        piweather.config.VIEWPORT = timedelta(days=1)
+        rolled = Measurement(sensors.Dummy(), table="live_rolled",
+                             rollups=True)
+        piweather.config.MEASUREMENTS = [rolled]
+        t0 = datetime.now().replace(second=0, microsecond=0) - \
+            timedelta(minutes=10)
+        self.acquire_at(rolled, t0, t0 + timedelta(seconds=10))
+        watermarks = self.watermarks(rolled)
+        self.assertEqual(watermarks["traces"][0]["resolution"], 86.4)
+
+        self.acquire_at(rolled, t0 + timedelta(seconds=20))
+        with self.assertRaises(PreventUpdate):
+            extend_live_graph(1, watermarks)
+
+        self.acquire_at(rolled, t0 + timedelta(minutes=1, seconds=5))
+        (update, indices, limit), watermarks = extend_live_graph(
+            2, watermarks)
+        self.assertEqual(len(update["x"][0]), 1)
+        self.assertEqual(update["x"][0][0], t0 + timedelta(minutes=1))
+
+    def test_traces_are_trimmed_to_viewport_by_time(self):
+        now = datetime.now()
+        self.acquire_at(self.meas, *[now - timedelta(minutes=50, seconds=i)
+                                     for i in (3, 2, 1)])
+        watermarks = self.watermarks()
+        self.acquire_at(self.meas, now, now + timedelta(seconds=1))
+
+        with patch("piweather.dashboard.get_viewport",
+                   return_value=now - timedelta(minutes=30)):
+            (update, indices, limit), watermarks = extend_live_graph(
+                1, watermarks)
+        self.assertEqual(len(update["y"][0]), 2)
+        self.assertListEqual(limit["x"], [2])
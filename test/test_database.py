@@ -1,9 +1,15 @@
+import numpy as np
+import os
+import tempfile
 import unittest
 import piweather
 import piweather.database as db
 
 from piweather.helper import load_external
-from sqlalchemy import Integer, Float
+from datetime import datetime
+from sqlalchemy import Integer, Float, inspect
+from unittest.mock import patch
+from test import TransientDBTestCase
 
 
 class TestDatabase(unittest.TestCase):
@@ -32,6 +38,34 @@ class TestDatabase(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             db.get_engine()
 
+    def test_sqlite_profile_applies_pragmas_on_connect(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        engine = db.get_engine("sqlite:///" + path)
+        with engine.connect() as con:
+            for pragma, value in (("journal_mode", "wal"),
+                                  ("synchronous", 1),
+                                  ("busy_timeout", 5000)):
+                self.assertEqual(
+                    con.execute("PRAGMA {}".format(pragma)).scalar(), value)
+        engine.dispose()
+
+    def test_server_profile_sizes_pool_and_pings(self):
+        piweather.config = load_external("test/static/config.py")
+        piweather.config.DB_OPTIONS = dict(pool_size=2)
+        with patch("piweather.database.create_engine") as create:
+            db.create_profiled_engine("postgresql://host/db")
+
+        kwargs = create.call_args[1]
+        self.assertEqual(kwargs["pool_size"], 2)
+        self.assertTrue(kwargs["pool_pre_ping"])
+
+    def test_unknown_profile_raises(self):
+        with self.assertRaises(ValueError):
+            db.create_profiled_engine("sqlite://", profile="tuned")
+
     def test_can_map_python_types_to_SQL_columns(self):
         with self.subTest("valid conversion"):
             self.assertEqual(db.map_dtype(int), Integer)
@@ -40,3 +74,156 @@ class TestDatabase(unittest.TestCase):
         with self.subTest("unkown type"):
             with self.assertRaises(TypeError):
                 db.map_dtype(None)
+
+
+class TestSchema(TransientDBTestCase):
+
+    dtypes = {"value": float, "count": int}
+
+    def test_schema_is_bound_to_current_engine(self):
+        schema = db.get_schema()
+        self.assertIs(schema, db.get_schema())
+        self.assertIs(schema.bind, piweather.db)
+
+        piweather.db = db.create_engine("sqlite:///:memory:")
+        self.assertIsNot(schema, db.get_schema())
+
+    def test_register_creates_table_with_time_column(self):
+        schema = db.get_schema()
+        schema.register("schema_table", self.dtypes)
+        self.assertTrue(piweather.db.has_table("schema_table"))
+        self.assertIn("time", schema.table("schema_table").c)
+
+    def test_deferred_registrations_are_created_on_exit(self):
+        schema = db.get_schema()
+        with schema.deferred():
+            schema.register("deferred0", self.dtypes)
+            schema.register("deferred1", self.dtypes)
+            self.assertFalse(piweather.db.has_table("deferred0"))
+        self.assertTrue(piweather.db.has_table("deferred0"))
+        self.assertTrue(piweather.db.has_table("deferred1"))
+
+    def test_existing_tables_are_reflected(self):
+        db.get_schema().register("reflected", self.dtypes)
+        piweather.schema = None
+
+        table = db.get_schema().table("reflected")
+        self.assertSetEqual(set(table.c.keys()), {"time", "value", "count"})
+
+    def test_statements_are_cached(self):
+        schema = db.get_schema()
+        schema.register("cached", self.dtypes)
+        self.assertIs(schema.insert("cached"), schema.insert("cached"))
+        since = datetime.now()
+        self.assertIs(schema.select("cached", ("value",), since),
+                      schema.select("cached", ("value",), since))
+
+    def test_tables_have_time_index(self):
+        db.get_schema().register("indexed", self.dtypes)
+        indexes = inspect(piweather.db).get_indexes("indexed")
+        self.assertIn(["time"], [idx["column_names"] for idx in indexes])
+
+    def test_unindexed_tables_are_migrated(self):
+        piweather.db.execute(
+            "CREATE TABLE legacy (time DATETIME, value FLOAT, count INTEGER)")
+        db.get_schema().register("legacy", self.dtypes)
+        indexes = inspect(piweather.db).get_indexes("legacy")
+        self.assertIn(["time"], [idx["column_names"] for idx in indexes])
+
+    def test_missing_columns_are_migrated(self):
+        piweather.db.execute("CREATE TABLE legacy (time DATETIME)")
+        db.get_schema().register("legacy", self.dtypes)
+        table = db.get_schema().table("legacy")
+        self.assertIn("count", table.c)
+
+        columns = inspect(piweather.db).get_columns("legacy")
+        self.assertIn("value", [c["name"] for c in columns])
+
+
+class TestPartitions(TransientDBTestCase):
+
+    dtypes = {"value": float}
+
+    def setUp(self):
+        super(TestPartitions, self).setUp()
+        self.schema = db.get_schema()
+        self.schema.register("part", self.dtypes, partitioned=True)
+
+    def write(self, *times):
+        with self.schema.engine.connect() as con:
+            self.schema.write(con, "part", [
+                {"time": t, "value": float(i)} for i, t in enumerate(times)])
+
+    def count(self, since=None):
+        with self.schema.engine.connect() as con:
+            stm = self.schema.select("part", ("time",), since)
+            return len(con.execute(stm, since=since).fetchall())
+
+    def test_rows_are_routed_to_monthly_partitions(self):
+        self.write(datetime(2017, 1, 5), datetime(2017, 2, 5))
+        self.assertTrue(piweather.db.has_table("part_201701"))
+        self.assertTrue(piweather.db.has_table("part_201702"))
+        self.assertListEqual(self.schema.partitions("part").partitions(),
+                             ["part_201701", "part_201702"])
+
+    def test_range_queries_only_touch_overlapping_partitions(self):
+        self.write(datetime(2017, 1, 5), datetime(2017, 2, 5),
+                   datetime(2017, 2, 6))
+        router = self.schema.partitions("part")
+
+        self.assertListEqual(router.partitions(since=datetime(2017, 2, 1)),
+                             ["part_201702"])
+        self.assertEqual(self.count(), 3)
+        self.assertEqual(self.count(since=datetime(2017, 2, 1)), 2)
+        self.assertEqual(self.count(since=datetime(2017, 2, 5, 12)), 1)
+
+    def test_existing_partitions_are_discovered(self):
+        self.write(datetime(2017, 3, 1))
+        piweather.schema = None
+
+        schema = db.get_schema()
+        schema.register("part", self.dtypes, partitioned=True)
+        self.assertListEqual(schema.partitions("part").partitions(),
+                             ["part_201703"])
+
+    def test_existing_partitions_are_migrated(self):
+        self.write(datetime(2017, 3, 1))
+        piweather.schema = None
+
+        schema = db.get_schema()
+        schema.register("part", dict(self.dtypes, gust=float),
+                        partitioned=True)
+        with schema.engine.begin() as con:
+            schema.write(con, "part", [
+                {"time": datetime(2017, 3, 2), "value": 1., "gust": 2.},
+                {"time": datetime(2017, 4, 2), "value": 1., "gust": 3.}])
+            rows = con.execute(schema.select("part", ("time", "gust"))) \
+                .fetchall()
+        self.assertListEqual([row[1] for row in rows], [None, 2., 3.])
+
+    def test_partition_bounds_wrap_year(self):
+        router = self.schema.partitions("part")
+        self.assertTupleEqual(router.bounds(datetime(2017, 12, 24, 18)),
+                              (datetime(2017, 12, 1), datetime(2018, 1, 1)))
+
+
+class TestFetchColumns(unittest.TestCase):
+
+    def test_fills_typed_arrays_from_chunks(self):
+        chunks = [[(datetime(2017, 1, 1), 1.5, 1)],
+                  [(datetime(2017, 1, 2), 2.5, 2)]]
+        data = db.fetch_columns(chunks, ["time", "f", "i"],
+                                {"time": datetime, "f": float, "i": int})
+
+        self.assertEqual(data["time"].dtype, np.dtype("datetime64[us]"))
+        np.testing.assert_array_equal(data["f"], [1.5, 2.5])
+        np.testing.assert_array_equal(data["i"], [1, 2])
+        self.assertEqual(data["i"].dtype, np.int64)
+
+    def test_null_integers_fall_back_to_float(self):
+        data = db.fetch_columns([[(1,), (None,)]], ["i"], {"i": int})
+        self.assertTrue(np.isnan(data["i"][1]))
+
+    def test_empty_result_returns_empty_columns(self):
+        data = db.fetch_columns([], ["time"], {"time": datetime})
+        self.assertListEqual(data["time"], [])
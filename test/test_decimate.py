@@ -0,0 +1,60 @@
+import numpy as np
+import unittest
+
+from datetime import datetime, timedelta
+from piweather.decimate import as_float, decimate, lttb, minmax
+
+
+class TestDecimate(unittest.TestCase):
+
+    def setUp(self):
+        self.x = np.arange(10000, dtype=float)
+        self.y = np.sin(self.x / 500.)
+
+    def test_short_series_are_kept(self):
+        np.testing.assert_array_equal(decimate(self.x[:5], self.y[:5], 10),
+                                      np.arange(5))
+
+    def test_lttb_keeps_budget_and_endpoints(self):
+        keep = lttb(self.x, self.y, 100)
+        self.assertEqual(len(keep), 100)
+        self.assertEqual(keep[0], 0)
+        self.assertEqual(keep[-1], len(self.x) - 1)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_lttb_preserves_spikes(self):
+        self.y[4321] = 100.
+        self.assertIn(4321, lttb(self.x, self.y, 100))
+
+    def test_minmax_keeps_extrema(self):
+        keep = minmax(self.x, self.y, 100)
+        self.assertLessEqual(len(keep), 100)
+        self.assertIn(np.argmax(self.y), keep)
+        self.assertIn(np.argmin(self.y), keep)
+
+    def test_nan_gaps_survive_decimation(self):
+        self.y[3000:3500] = np.nan
+        for method in ("lttb", "minmax"):
+            with self.subTest(method):
+                keep = decimate(self.x, self.y, 200, method=method)
+                self.assertLessEqual(len(keep), 200)
+                self.assertIn(3000, keep)
+                self.assertEqual(np.isnan(self.y[keep]).sum(), 1)
+
+    def test_scattered_nans_share_one_budget(self):
+        self.y[::7] = np.nan
+        self.y[5000:5400] = np.nan
+        for method in ("lttb", "minmax"):
+            with self.subTest(method):
+                keep = decimate(self.x, self.y, 200, method=method)
+                self.assertLessEqual(len(keep), 200)
+                self.assertGreater(len(keep), 100)
+                self.assertIn(5000, keep)
+
+    def test_accepts_datetime_objects(self):
+        t0 = datetime(2017, 1, 1)
+        x = np.array([t0 + timedelta(seconds=i) for i in range(1000)],
+                     dtype=object)
+        np.testing.assert_array_equal(as_float(x)[:2], [as_float(x)[0],
+                                                        as_float(x)[0] + 1e6])
+        self.assertEqual(len(decimate(x, self.y[:1000], 50)), 50)
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import piweather
+from piweather import Measurement
+from piweather import sensors
+from piweather.database import Schema, get_schema
+from piweather.journal import Journal, TableJournal, record_dtype
+from test import TransientDBTestCase
+
+
+def rows(n, start=datetime(2017, 8, 25)):
+    return [dict(time=start + timedelta(seconds=i), random=i / 2.,
+                 randint=i) for i in range(n)]
+
+
+class TestTableJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def segments(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_records_have_fixed_size(self):
+        dtype = record_dtype(sensors.Dummy.dtypes)
+        self.assertEqual(dtype.names, ("time", "randint", "random"))
+        self.assertEqual(dtype.itemsize, 24)
+
+    def test_rows_survive_reopening(self):
+        journal = TableJournal(self.directory, "t", sensors.Dummy.dtypes, 10)
+        for row in rows(3):
+            journal.append(row)
+        journal.close()
+
+        journal = TableJournal(self.directory, "t", sensors.Dummy.dtypes, 10)
+        self.assertEqual(len(journal), 3)
+        segment, records = journal.pending(10)
+        self.assertEqual(records["time"].astype(object)[2],
+                         datetime(2017, 8, 25, 0, 0, 2))
+        self.assertEqual(records["random"].tolist(), [0., .5, 1.])
+        self.assertEqual(records["randint"].tolist(), [0, 1, 2])
+
+    def test_rolls_full_segments_and_removes_drained_ones(self):
+        journal = TableJournal(self.directory, "t", sensors.Dummy.dtypes, 2)
+        for row in rows(5):
+            journal.append(row)
+        self.assertEqual(len(self.segments()), 3)
+
+        while True:
+            segment, records = journal.pending(10)
+            if segment is None:
+                break
+            journal.checkpoint(segment, len(records))
+
+        self.assertEqual(len(journal), 0)
+        self.assertEqual(self.segments(), ["t-00000002.journal"])
+
+    def test_mismatching_segment_is_rejected(self):
+        journal = TableJournal(self.directory, "t", sensors.Dummy.dtypes, 2)
+        journal.close()
+        with self.assertRaises(ValueError):
+            TableJournal(self.directory, "t", {"random": float}, 2)
+
+
+class TestJournal(TransientDBTestCase):
+
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        piweather.write_journal = Journal(
+            self.directory, segment_rows=4, batch_rows=3, interval=60)
+        self.meas = Measurement(sensors.Dummy(), table="journaled")
+
+    def test_acquire_only_appends_to_journal(self):
+        for _ in range(5):
+            self.meas.acquire()
+
+        self.assertEqual(len(piweather.write_journal), 5)
+        self.assertEqual(len(self.meas.data()["random"]), 0)
+
+    def test_replay_writes_rows_in_batches_and_truncates(self):
+        for _ in range(5):
+            self.meas.acquire()
+
+        self.assertEqual(piweather.write_journal.replay(), 5)
+        self.assertEqual(len(piweather.write_journal), 0)
+        self.assertEqual(len(self.meas.data()["random"]), 5)
+        self.assertEqual(
+            os.listdir(self.directory), ["journaled-00000001.journal"])
+
+    def test_failing_replay_keeps_rows_for_next_attempt(self):
+        for _ in range(5):
+            self.meas.acquire()
+
+        with patch.object(Schema, "write", side_effect=OSError("offline")):
+            self.assertEqual(piweather.write_journal.replay(), 0)
+        self.assertEqual(len(piweather.write_journal), 5)
+
+        self.assertEqual(piweather.write_journal.replay(), 5)
+        self.assertEqual(len(self.meas.data()["random"]), 5)
+
+    def test_rollup_buckets_are_journaled_and_merged_on_replay(self):
+        m = Measurement(sensors.Dummy(), table="rolled", rollups=True)
+        t0 = datetime(2017, 1, 1, 12)
+        for t in (t0, t0 + timedelta(seconds=30), t0 + timedelta(minutes=1)):
+            with patch("piweather.measurements.datetime") as mock_dt:
+                mock_dt.now.return_value = t
+                m.acquire()
+        m.rollups.close(get_schema(), piweather.write_journal)
+
+        def counts():
+            return get_schema().engine.execute(
+                "SELECT random_count FROM rolled_1m ORDER BY time").fetchall()
+
+        self.assertListEqual(counts(), [])
+        piweather.write_journal.replay()
+        self.assertListEqual([r[0] for r in counts()], [2, 1])
+
+        with patch("piweather.measurements.datetime") as mock_dt:
+            mock_dt.now.return_value = t0 + timedelta(minutes=1, seconds=30)
+            m.acquire()
+        m.rollups.close(get_schema(), piweather.write_journal)
+        piweather.write_journal.replay()
+        self.assertListEqual([r[0] for r in counts()], [2, 2])
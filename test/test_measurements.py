@@ -1,9 +1,11 @@
 import datetime
+import numpy as np
 import time
 from unittest.mock import patch, PropertyMock
 
 import piweather
 from piweather import Measurement
+from piweather.measurements import TickGroup
 from piweather import sensors
 from test import TransientDBTestCase
 
@@ -90,3 +92,144 @@ class TestMeasurements(TransientDBTestCase):
         with self.subTest("string argument"):
             data = m.data(columns="randint")
             self.assertNotIn("random", data)
+
+    def test_data_returns_typed_columns(self):
+        m = Measurement(sensors.Dummy(), table="typed_table")
+        m.acquire()
+        m.acquire()
+        data = m.data()
+
+        self.assertEqual(data["time"].dtype, np.dtype("datetime64[us]"))
+        self.assertEqual(data["random"].dtype, np.float64)
+        self.assertEqual(data["randint"].dtype, np.int64)
+
+    def test_data_is_fetched_in_chunks(self):
+        m = Measurement(sensors.Dummy(), table="chunked_table")
+        m.chunk_rows = 2
+        for _ in range(5):
+            m.acquire()
+        data = m.data(columns=["time", "randint"])
+
+        self.assertEqual(len(data["time"]), 5)
+        self.assertEqual(data["randint"].dtype, np.int64)
+
+    def test_iter_data_yields_bounded_chunks_in_time_order(self):
+        m = Measurement(sensors.Dummy(), table="iter_table")
+        for _ in range(7):
+            m.acquire()
+
+        chunks = list(m.iter_data(columns=["randint"], chunk_rows=3))
+        self.assertListEqual([len(c["randint"]) for c in chunks], [3, 3, 1])
+        self.assertNotIn("time", chunks[0])
+
+        times = np.concatenate(
+            [c["time"] for c in m.iter_data(chunk_rows=3)])
+        np.testing.assert_array_equal(times, np.sort(m.data()["time"]))
+
+    def test_iter_data_respects_time_range(self):
+        m = Measurement(sensors.Dummy(), table="iter_table")
+        m.acquire()
+        since = m.last["time"]
+        m.acquire()
+        until = m.last["time"]
+        m.acquire()
+
+        chunks = list(m.iter_data(since=since, until=until))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["time"][0], np.datetime64(until))
+
+    def test_iter_data_does_not_lose_rows_with_equal_timestamps(self):
+        m = Measurement(sensors.Dummy(), table="iter_table")
+        t0 = datetime.datetime(2017, 1, 1)
+        with patch("piweather.measurements.datetime") as mock_dt:
+            mock_dt.now.return_value = t0
+            for _ in range(5):
+                m.acquire()
+            mock_dt.now.return_value = t0 + datetime.timedelta(seconds=1)
+            m.acquire()
+
+        chunks = list(m.iter_data(columns="randint", chunk_rows=2))
+        self.assertEqual(sum(len(c["randint"]) for c in chunks), 6)
+        self.assertListEqual(
+            sorted(np.concatenate([c["randint"] for c in chunks])),
+            sorted(m.data()["randint"]))
+
+    def test_iter_data_fetches_ties_of_a_full_page_at_once(self):
+        m = Measurement(sensors.Dummy(), table="iter_table")
+        t0 = datetime.datetime(2017, 1, 1)
+        with patch("piweather.measurements.datetime") as mock_dt:
+            for s in (0, 1, 1, 1, 2):
+                mock_dt.now.return_value = t0 + datetime.timedelta(seconds=s)
+                m.acquire()
+
+        chunks = list(m.iter_data(chunk_rows=2))
+        self.assertListEqual([len(c["time"]) for c in chunks], [4, 1])
+
+
+class SlowDummy(sensors.Dummy):
+
+    def trigger(self):
+        self.triggered = time.monotonic()
+
+    def collect(self):
+        time.sleep(0.1)
+        return self.read()
+
+
+class TestTickGroup(TransientDBTestCase):
+
+    def test_grouped_measurements_share_one_job(self):
+        pre = len(piweather.scheduler.get_jobs())
+        m0 = Measurement(sensors.Dummy(), table="g0", frequency=60,
+                         grouped=True)
+        m1 = Measurement(sensors.Dummy(), table="g1", frequency=60,
+                         grouped=True)
+
+        self.assertEqual(len(piweather.scheduler.get_jobs()), pre + 1)
+        self.assertIs(m0._group, m1._group)
+        self.assertEqual(m1.frequency, 60)
+
+        m0.frequency = 0
+        m1.frequency = 0
+        self.assertEqual(len(piweather.scheduler.get_jobs()), pre)
+
+    def test_tick_shares_timestamp_and_overlaps_sensor_reads(self):
+        ms = [Measurement(SlowDummy(), table="g{}".format(i), frequency=60,
+                          grouped=True) for i in range(4)]
+
+        start = time.monotonic()
+        ms[0]._group.tick()
+        self.assertLess(time.monotonic() - start, 0.3)
+
+        self.assertEqual(len({m.last["time"] for m in ms}), 1)
+        for m in ms:
+            self.assertEqual(len(m.data()["random"]), 1)
+
+    def test_shared_sensor_is_read_once_per_tick(self):
+        sensor = sensors.Dummy()
+        with patch.object(sensor, "collect",
+                          wraps=sensor.collect) as collect:
+            m0 = Measurement(sensor, table="g0", frequency=60, grouped=True)
+            Measurement(sensor, table="g1", frequency=60, grouped=True)
+            m0._group.tick()
+        self.assertEqual(collect.call_count, 1)
+
+    def test_failing_sensor_does_not_block_the_group(self):
+        failing, healthy = sensors.Dummy(), sensors.Dummy()
+        failing.collect = lambda: 1 / 0
+        m0 = Measurement(failing, table="g0", frequency=60, grouped=True)
+        m1 = Measurement(healthy, table="g1", frequency=60, grouped=True)
+
+        with self.assertLogs(level="ERROR"):
+            m0._group.tick()
+        self.assertEqual(len(m0.data()["random"]), 0)
+        self.assertEqual(len(m1.data()["random"]), 1)
+
+        for sensor in (healthy, failing):
+            value = TickGroup._executor.submit(lambda: sensor.value)
+            self.assertIn("random", value.result(timeout=1))
+
+    def test_grouped_and_asynchronous_are_exclusive(self):
+        with self.assertRaises(ValueError):
+            Measurement(sensors.Dummy(), table="g0", asynchronous=True,
+                        grouped=True)
@@ -0,0 +1,96 @@
+import time
+import unittest
+import urllib.request
+
+import dash_html_components as html
+import piweather
+from piweather import Measurement
+from piweather import metrics
+from piweather import sensors
+from piweather.dashboard import create_app
+from test import TransientDBTestCase
+from types import SimpleNamespace
+
+
+def sample(name, **labels):
+    """Value of a sample in the rendered metrics, None if missing."""
+    prefix = name + metrics._labels(tuple(sorted(labels.items())))
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix + " "):
+            return float(line.split()[-1])
+    return None
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = metrics.Registry()
+        family = registry.histogram("h", "help", buckets=(1, 5))
+        for value in (0.5, 2, 3, 10):
+            family.labels(table="t").observe(value)
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ["# HELP h help", "# TYPE h histogram"])
+        self.assertEqual(lines[2:], [
+            'h_bucket{table="t",le="1"} 1',
+            'h_bucket{table="t",le="5"} 3',
+            'h_bucket{table="t",le="+Inf"} 4',
+            'h_sum{table="t"} 15.5',
+            'h_count{table="t"} 4',
+        ])
+
+    def test_counter_and_label_escaping(self):
+        registry = metrics.Registry()
+        registry.counter("c_total", "help").labels(job='a"b').inc(3)
+        self.assertIn('c_total{job="a\\"b"} 3', registry.render())
+
+
+class TestMeasurementMetrics(TransientDBTestCase):
+
+    def test_acquire_and_data_are_timed_per_table(self):
+        m = Measurement(sensors.Dummy(), table="metered")
+        m.acquire()
+        m.data()
+
+        for name in ("piweather_sensor_read_seconds_count",
+                     "piweather_insert_seconds_count",
+                     "piweather_query_seconds_count"):
+            self.assertGreaterEqual(sample(name, table="metered"), 1)
+        self.assertGreaterEqual(
+            sample("piweather_rows_written_sum", table="metered"), 1)
+
+    def test_scheduler_jobs_report_lateness(self):
+        self.addCleanup(metrics.watch(piweather.scheduler))
+        Measurement(sensors.Dummy(), table="scheduled", frequency=0.05)
+        time.sleep(0.2)
+        self.assertGreaterEqual(
+            sample("piweather_job_lateness_seconds_count", job="scheduled"),
+            1)
+
+
+class TestEndpoints(unittest.TestCase):
+
+    def test_dash_server_serves_metrics(self):
+        piweather.config = SimpleNamespace(TITLE="test")
+        try:
+            app = create_app()
+            app.layout = html.Div()
+            client = app.server.test_client()
+            response = client.get("/metrics")
+        finally:
+            piweather.config = None
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.content_type)
+        self.assertIn("# TYPE piweather_insert_seconds histogram",
+                      response.get_data(as_text=True))
+
+    def test_headless_server_serves_metrics(self):
+        server = metrics.serve(0, host="127.0.0.1")
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode("utf-8")
+        self.assertIn("# TYPE piweather_job_missed_total counter", body)
@@ -0,0 +1,145 @@
+import numpy as np
+import unittest
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import piweather
+from piweather import Measurement
+from piweather import sensors
+from piweather.database import get_schema
+from piweather.rollups import (Bucket, Rollups, bucket, choose_resolution,
+                               rollup_column)
+from test import TransientDBTestCase
+
+
+class TestRollupHelpers(unittest.TestCase):
+
+    def test_bucket_floors_time_to_width(self):
+        t = datetime(2017, 8, 25, 15, 38, 17, 123)
+        self.assertEqual(bucket(t, timedelta(minutes=1)),
+                         datetime(2017, 8, 25, 15, 38))
+        self.assertEqual(bucket(t, timedelta(days=1)),
+                         datetime(2017, 8, 25))
+
+    def test_chooses_coarsest_resolution_meeting_request(self):
+        self.assertIsNone(choose_resolution(timedelta(seconds=30)))
+        self.assertEqual(choose_resolution(timedelta(minutes=5)), "1m")
+        self.assertEqual(choose_resolution(timedelta(hours=2)), "1h")
+        self.assertEqual(choose_resolution(timedelta(days=30)), "1d")
+
+    def test_plain_columns_map_to_mean(self):
+        dtypes = {"random": float, "windspeed_max": float}
+        self.assertEqual(rollup_column("time", dtypes), "time")
+        self.assertEqual(rollup_column("random", dtypes), "random_mean")
+        self.assertEqual(rollup_column("random_max", dtypes), "random_max")
+        self.assertEqual(rollup_column("windspeed_max", dtypes),
+                         "windspeed_max_mean")
+        self.assertEqual(rollup_column("windspeed_max_max", dtypes),
+                         "windspeed_max_max")
+
+
+class TestBucket(unittest.TestCase):
+
+    def test_aggregates_values_and_skips_nan(self):
+        b = Bucket(datetime(2017, 1, 1), ["t"])
+        for value in (3., float("nan"), 1., 2.):
+            b.add({"t": value})
+        row = b.row()
+
+        self.assertEqual(row["t_count"], 3)
+        self.assertEqual(row["t_min"], 1.)
+        self.assertEqual(row["t_max"], 3.)
+        self.assertEqual(row["t_mean"], 2.)
+        self.assertEqual(row["t_last"], 2.)
+
+    def test_merges_existing_row(self):
+        earlier = Bucket(datetime(2017, 1, 1), ["t"])
+        earlier.add({"t": 4.})
+        later = Bucket(datetime(2017, 1, 1), ["t"])
+        later.add({"t": 2.})
+        later.merge(earlier.row())
+        row = later.row()
+
+        self.assertEqual(row["t_count"], 2)
+        self.assertEqual(row["t_mean"], 3.)
+        self.assertEqual(row["t_last"], 2.)
+
+
+class TestRollups(TransientDBTestCase):
+
+    def acquire_at(self, meas, *times):
+        for t in times:
+            with patch("piweather.measurements.datetime") as mock_dt:
+                mock_dt.now.return_value = t
+                meas.acquire()
+
+    def test_measurement_creates_rollup_tables(self):
+        Measurement(sensors.Dummy(), table="rolled", rollups=True)
+        for suffix in ("1m", "1h", "1d"):
+            self.assertTrue(piweather.db.has_table("rolled_" + suffix))
+
+    def test_finished_buckets_are_written(self):
+        m = Measurement(sensors.Dummy(), table="rolled", rollups=True)
+        t0 = datetime(2017, 1, 1, 12)
+        self.acquire_at(m, t0, t0 + timedelta(seconds=30),
+                        t0 + timedelta(minutes=1))
+
+        rows = get_schema().engine.execute(
+            "SELECT random_count FROM rolled_1m").fetchall()
+        self.assertListEqual([r[0] for r in rows], [2])
+
+    def test_data_serves_resolution_from_rollups(self):
+        m = Measurement(sensors.Dummy(), table="rolled", rollups=True)
+        t0 = datetime(2017, 1, 1, 12)
+        self.acquire_at(m, *[t0 + timedelta(seconds=10 * i)
+                             for i in range(13)])
+
+        raw = m.data(columns=["time", "random"])
+        self.assertEqual(len(raw["random"]), 13)
+
+        rolled = m.data(columns=["time", "random"],
+                        resolution=timedelta(minutes=1))
+        self.assertEqual(len(rolled["random"]), 3)
+        self.assertAlmostEqual(rolled["random"][0],
+                               sum(raw["random"][:6]) / 6)
+
+    def test_raw_columns_named_like_aggregates_map_to_mean(self):
+        sensor = sensors.Dummy()
+        sensor.dtypes = {"random": float, "random_max": float}
+        sensor.read = lambda: {"random": 1., "random_max": 2.}
+        m = Measurement(sensor, table="extremes", rollups=True)
+        t0 = datetime(2017, 1, 1, 12)
+        self.acquire_at(m, t0, t0 + timedelta(minutes=1))
+
+        rolled = m.data(columns=["random_max", "random_max_max"],
+                        resolution=timedelta(minutes=1))
+        self.assertListEqual(list(rolled["random_max"]), [2., 2.])
+        self.assertListEqual(list(rolled["random_max_max"]), [2., 2.])
+
+    def test_pending_bucket_is_merged_with_stored_row(self):
+        m = Measurement(sensors.Dummy(), table="restarted", rollups=True)
+        t0 = datetime(2017, 1, 1, 12)
+        self.acquire_at(m, t0, t0 + timedelta(seconds=10))
+        m.rollups.close(get_schema())
+        self.acquire_at(m, t0 + timedelta(seconds=20))
+
+        rolled = m.data(columns=["time", "random_count"],
+                        resolution=timedelta(minutes=1))
+        self.assertListEqual(list(rolled["time"]), [np.datetime64(t0)])
+        self.assertListEqual(list(rolled["random_count"]), [3])
+
+    def test_open_buckets_are_merged_on_close(self):
+        rollups = Rollups("merged", sensors.Dummy.dtypes)
+        m = Measurement(sensors.Dummy(), table="merged", rollups=True)
+        t0 = datetime(2017, 1, 1, 12)
+        row = dict(time=t0, random=1., randint=1)
+
+        m.rollups.add(row)
+        m.rollups.close(get_schema())
+        rollups.add(dict(row, random=3.))
+        rollups.close(get_schema())
+
+        rows = get_schema().engine.execute(
+            "SELECT random_count, random_mean FROM merged_1h").fetchall()
+        self.assertListEqual(rows, [(2, 2.)])
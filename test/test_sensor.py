@@ -1,11 +1,14 @@
+import asyncio
 import numpy as np
 import os
-import piweather
+import shutil
+import tempfile
+import threading
 import time
 import unittest
 
 from piweather import sensors
-from test import TransientDBTestCase
+from piweather.sensors.A100R import wind_statistics
 from tempfile import NamedTemporaryFile
 from unittest.mock import patch, MagicMock
 
@@ -46,6 +49,71 @@ class TestSensor(unittest.TestCase):
                 s.value
 
 
+class SlowDummy(sensors.Dummy):
+
+    def __init__(self, *args, **kwargs):
+        super(SlowDummy, self).__init__(*args, **kwargs)
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        time.sleep(0.1)
+        return super(SlowDummy, self).read()
+
+    async def aread(self):
+        self.reads += 1
+        await asyncio.sleep(0.1)
+        return super(SlowDummy, self).read()
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_read(self):
+        s = SlowDummy()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(s.value))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(s.reads, 1)
+        self.assertEqual(len({id(r) for r in results}), 1)
+        self.assertEqual(s.stats["reads"], 1)
+        self.assertEqual(s.stats["coalesced"], 4)
+
+    def test_concurrent_coroutines_share_one_read(self):
+        s = SlowDummy()
+
+        async def gather():
+            return await asyncio.gather(*[s.avalue() for _ in range(5)])
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(gather())
+        finally:
+            loop.close()
+        self.assertEqual(s.reads, 1)
+        self.assertEqual(len({id(r) for r in results}), 1)
+
+    def test_counts_cache_hits(self):
+        s = sensors.Dummy(cache=60)
+        s.value
+        s.value
+        self.assertEqual(s.stats["reads"], 1)
+        self.assertEqual(s.stats["cache_hits"], 1)
+
+    @patch.object(sensors.Dummy, "read", side_effect=IOError)
+    def test_failed_read_is_propagated_and_released(self, read):
+        s = sensors.Dummy()
+        with self.assertRaises(IOError):
+            s.value
+        with self.assertRaises(IOError):
+            s.value
+        self.assertEqual(read.call_count, 2)
+
+
 class TestDS18x20(unittest.TestCase):
 
     valid = (b"2d 00 4b 46 ff ff 03 10 dd : crc=dd YES\n"
@@ -89,18 +157,16 @@ class TestDS18x20(unittest.TestCase):
         np.testing.assert_equal(s.value["temperature"], np.NaN)
 
 
-class TestA100R(TransientDBTestCase):
+class TestA100R(unittest.TestCase):
 
     def test_has_pin_attribute(self):
         s = sensors.A100R(pin=18)
         self.assertEqual(s.pin, 18)
 
-    def test_A100R_adds_scheduler_job(self):
-        pre = len(piweather.scheduler.get_jobs())
-        sensors.A100R(pin=18)
-        post = len(piweather.scheduler.get_jobs())
-
-        self.assertEqual(post, pre+1)
+    def test_sampling_time_is_deprecated(self):
+        with self.assertWarns(DeprecationWarning):
+            s = sensors.A100R(18, 10, 30)
+        self.assertEqual(s._calib, 2.)
 
     def test_gpio_callback_increases_counts(self):
         s = sensors.A100R(pin=18)
@@ -108,52 +174,54 @@ class TestA100R(TransientDBTestCase):
         s.counter_callback("channel")
         self.assertGreater(s.counts_per_second(), 0)
 
-    @patch("piweather.sensors.A100R.counts_per_second")
-    def test_correctly_sets_min_and_max_values(self, mock_cps):
-        s = sensors.A100R(pin=18)
+    def test_correctly_sets_min_and_max_values(self):
+        pulses = np.array([0., 1., 1.5, 2.5])
+        data = wind_statistics(pulses, 0., 4., calib=1.)
 
-        mock_cps.return_value = 42
-        s.sample()
-        mock_cps.return_value = 21
-        s.sample()
-        data = s.value
+        self.assertEqual(data["windspeed_min"], 1.)
+        self.assertEqual(data["windspeed_max"], 2.)
 
-        self.assertEqual(data["windspeed_min"], 21)
-        self.assertEqual(data["windspeed_max"], 42)
+    def test_correctly_computes_avg_and_std(self):
+        pulses = np.array([0., 1., 1.5, 2.5])
+        data = wind_statistics(pulses, 0., 4., calib=1.)
 
-    @patch("piweather.sensors.A100R.counts_per_second")
-    def test_correctly_updates_runnung_avg_and_std(self, mock_cps):
-        s = sensors.A100R(pin=18)
+        self.assertAlmostEqual(data["windspeed_avg"], 1.)
+        self.assertAlmostEqual(
+            data["windspeed_std"], np.std([1, 2, 1], ddof=1))
 
-        mock_cps.return_value = 10
-        s.sample()
-        mock_cps.return_value = 20
-        s.sample()
-        data = s.value
+    def test_computes_gust_as_maximum_running_mean(self):
+        calm = np.arange(0., 30., 1.)
+        gust = np.arange(30., 33., 0.25)
+        data = wind_statistics(np.r_[calm, gust, calm + 33.], 0., 63.,
+                               calib=1., gust_window=3)
 
-        self.assertAlmostEqual(
-            data["windspeed_avg"], np.mean([10, 20]), delta=0.01)
-        self.assertAlmostEqual(
-            data["windspeed_std"], np.std([10, 20], ddof=1), delta=0.01)
+        self.assertAlmostEqual(data["windspeed_gust"], 4.)
+        self.assertLess(data["windspeed_avg"], 2.)
+
+    def test_returns_0_if_not_enough_samples(self):
+        s = sensors.A100R(pin=18)
+        self.assertEqual(s.value["windspeed_avg"], 0)
+
+        s = sensors.A100R(pin=18)
+        s.counter_callback("channel")
+        self.assertEqual(s.value["windspeed_std"], 0)
 
     def test_retrieving_value_resets_values(self):
         s = sensors.A100R(pin=18)
 
         s.counter_callback("channel")
-        s.sample()
+        s.counter_callback("channel")
 
         self.assertGreater(s.value["windspeed_avg"], 0)
         self.assertEqual(s.value["windspeed_avg"], 0)
 
-    @patch("piweather.sensors.A100R.counts_per_second")
-    def test_returns_0_if_not_enough_samples(self, mock_cps):
-        s = sensors.A100R(pin=18)
+    def test_ring_keeps_latest_pulses_on_overflow(self):
+        s = sensors.A100R(pin=18, capacity=8)
+        for t in range(20):
+            s._record(float(t))
 
-        self.assertEqual(s.value["windspeed_avg"], 0)
-
-        mock_cps.return_value = 10
-        s.sample()
-        self.assertEqual(s.value["windspeed_std"], 0)
+        np.testing.assert_array_equal(s._consume(), np.arange(12., 20.))
+        self.assertEqual(len(s._consume()), 0)
 
 
 smbus = MagicMock()
@@ -216,3 +284,121 @@ class TestBMP280(unittest.TestCase):
         smbus.SMBus().read_i2c_block_data.return_value = datasheet_data_example
 
         self.assertAlmostEqual(s.value["pressure"], 100653.27, delta=0.01)
+
+    def ctrl_writes(self):
+        return [c for c in smbus.SMBus().write_byte_data.call_args_list
+                if c[0][1] == sensors.BMP280.ADDR_CTRL]
+
+    def test_normal_mode_writes_ctrl_register_once(self):
+        smbus.SMBus().write_byte_data.reset_mock()
+        s = sensors.BMP280(mode=sensors.BMP280.MODE_NORMAL,
+                           t_sb=sensors.BMP280.STANDBY["125"])
+        s.read()
+        s.read()
+
+        writes = self.ctrl_writes()
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(writes[0][0][2] & 0b11, 0b11)
+
+    def test_forced_mode_polls_status_register(self):
+        s = sensors.BMP280()
+        smbus.SMBus().read_byte_data.reset_mock()
+        smbus.SMBus().read_byte_data.side_effect = [0x08, 0x08, 0x00]
+        try:
+            s.read()
+        finally:
+            smbus.SMBus().read_byte_data.side_effect = None
+        self.assertEqual(smbus.SMBus().read_byte_data.call_count, 3)
+
+    def test_forced_mode_gives_up_after_maximum_conversion_time(self):
+        s = sensors.BMP280(osrs_p=sensors.BMP280.OSRS["x1"])
+        smbus.SMBus().read_byte_data.return_value = 0x08
+        start = time.monotonic()
+        try:
+            s.read()
+        finally:
+            smbus.SMBus().read_byte_data.return_value = 0x00
+        self.assertLess(time.monotonic() - start, 0.2)
+
+    def test_mode_and_standby_validity_checking(self):
+        s = sensors.BMP280()
+        with self.assertRaises(ValueError):
+            s.mode = "foobar"
+        with self.assertRaises(ValueError):
+            s.t_sb = 0b1000
+
+    def test_batch_compensation_equals_scalar_path(self):
+        s = sensors.BMP280()
+        s.calibration = dict(
+            T1=27504, T2=26435, T3=-1000,
+            P1=36477, P2=-10685, P3=3024, P4=2855, P5=140, P6=-7, P7=15500,
+            P8=-14600, P9=6000,
+        )
+        rng = np.random.RandomState(42)
+        raw_T = rng.randint(400000, 600000, 1000)
+        raw_p = rng.randint(300000, 500000, 1000)
+
+        batch = s.compensate(raw_T, raw_p)
+        for i in range(len(raw_T)):
+            T = s._compensated_temperature(int(raw_T[i]))
+            p = s._compensated_pressure(int(raw_p[i]), T)
+            self.assertEqual(batch["temperature"][i], T)
+            self.assertEqual(batch["pressure"][i], p)
+
+    def test_unpacks_raw_register_dumps(self):
+        raw_T, raw_p = sensors.BMP280.unpack(
+            [[0x65, 0x5a, 0xc0, 0x7e, 0xed, 0x00]])
+        self.assertEqual(raw_p[0], 415148)
+        self.assertEqual(raw_T[0], 519888)
+
+
+class TestDS18x20Bus(unittest.TestCase):
+
+    slaves = ["28-000001", "28-000002", "28-000003"]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.master = os.path.join(self.root, "w1_bus_master1")
+        os.mkdir(self.master)
+        with open(os.path.join(self.master, "w1_master_slaves"), "w") as f:
+            f.write("\n".join(self.slaves) + "\n")
+        for i, slave in enumerate(self.slaves):
+            os.mkdir(os.path.join(self.root, slave))
+            self.write(slave, 20000 + i * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, slave, millidegrees):
+        with open(os.path.join(self.root, slave, "w1_slave"), "w") as f:
+            f.write("2d 00 4b 46 ff ff 03 10 dd : crc=dd YES\n"
+                    "2d 00 4b 46 ff ff 03 10 dd t={}\n".format(millidegrees))
+
+    def test_lists_slaves_of_master(self):
+        bus = sensors.DS18x20Bus(self.master)
+        self.assertListEqual(bus.slaves(), self.slaves)
+
+    def test_sensors_are_served_from_shared_read(self):
+        bus = sensors.DS18x20Bus(self.master, cache=60)
+        ss = [bus.sensor(slave) for slave in bus.slaves()]
+        self.assertEqual(ss[0].value["temperature"], 20.)
+
+        self.write(self.slaves[1], 30000)
+        self.assertEqual(ss[1].value["temperature"], 21.)
+        self.assertEqual(ss[2].value["temperature"], 22.)
+
+    def test_triggers_bulk_conversion_if_available(self):
+        bulk = os.path.join(self.master, "therm_bulk_read")
+        with open(bulk, "w") as f:
+            f.write("0\n")
+
+        bus = sensors.DS18x20Bus(self.master)
+        s = bus.sensor(self.slaves[0])
+        self.assertEqual(s.value["temperature"], 20.)
+        with open(bulk) as f:
+            self.assertEqual(f.read(), "trigger\n")
+
+    def test_missing_slave_returns_NaN(self):
+        bus = sensors.DS18x20Bus(self.master)
+        s = bus.sensor("28-ffffff")
+        np.testing.assert_equal(s.value["temperature"], np.NaN)
@@ -0,0 +1,99 @@
+import unittest
+
+from datetime import datetime, timedelta
+
+import piweather
+from piweather import Measurement
+from piweather import sensors
+from piweather.buffer import WriteBuffer
+from piweather.database import get_schema
+from piweather.sinks import CallbackSink, Sink, TableSink, TailSink
+from test import TransientDBTestCase
+
+
+class TestSink(unittest.TestCase):
+
+    def rows(self, n):
+        start = datetime(2017, 8, 25)
+        return [dict(time=start + timedelta(seconds=i), random=float(i),
+                     randint=i) for i in range(n)]
+
+    def test_decimation_ratio_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TailSink(10, every=0)
+
+    def test_every_nth_row_is_emitted(self):
+        sink = TailSink(10, every=3)
+        for row in self.rows(7):
+            sink.push(row)
+        self.assertEqual([r["randint"] for r in sink.rows], [2, 5])
+
+    def test_mean_reducer_averages_window_and_keeps_dtypes(self):
+        sink = TailSink(10, every=4, reduce="mean")
+        sink._dtypes = sensors.Dummy.dtypes
+        rows = self.rows(4)
+        for row in rows:
+            sink.push(row)
+
+        reduced, = sink.rows
+        self.assertEqual(reduced["time"], rows[-1]["time"])
+        self.assertEqual(reduced["random"], 1.5)
+        self.assertEqual(reduced["randint"], 2)
+        self.assertIsInstance(reduced["randint"], int)
+
+    def test_tail_is_bounded(self):
+        sink = TailSink(2)
+        for row in self.rows(5):
+            sink.push(row)
+        self.assertEqual([r["randint"] for r in sink.rows], [3, 4])
+
+    def test_failing_callback_does_not_raise(self):
+        def fail(row):
+            raise RuntimeError("broker down")
+        CallbackSink(fail).push(self.rows(1)[0])
+
+    def test_base_sink_must_be_overridden(self):
+        with self.assertRaises(NotImplementedError):
+            Sink().push(self.rows(1)[0])
+
+
+class TestMeasurementSinks(TransientDBTestCase):
+
+    def count(self, table):
+        schema = get_schema()
+        with schema.engine.connect() as con:
+            return len(con.execute(schema.select(table)).fetchall())
+
+    def test_one_read_fans_out_to_all_sinks(self):
+        published = []
+        tail = TailSink(100, every=2)
+        sensor = sensors.Dummy()
+        m = Measurement(sensor, table="raw", sinks=[
+            TableSink("filtered", every=5, reduce="mean"),
+            tail,
+            CallbackSink(published.append),
+        ])
+        self.assertTrue(piweather.db.has_table("filtered"))
+
+        for _ in range(10):
+            m.acquire()
+
+        self.assertEqual(sensor.stats["reads"], 10)
+        self.assertEqual(self.count("raw"), 10)
+        self.assertEqual(self.count("filtered"), 2)
+        self.assertEqual(len(tail.rows), 5)
+        self.assertEqual(len(published), 10)
+        self.assertEqual(published[-1], m.last)
+
+    def test_table_sink_rows_go_through_write_buffer(self):
+        m = Measurement(sensors.Dummy(), table="raw",
+                        sinks=[TableSink("filtered", every=2)])
+        piweather.write_buffer = WriteBuffer(
+            get_schema(), max_rows=1000, max_age=60)
+        for _ in range(4):
+            m.acquire()
+        self.assertEqual(self.count("filtered"), 0)
+        piweather.write_buffer.flush()
+
+        self.assertEqual(self.count("raw"), 4)
+        self.assertEqual(self.count("filtered"), 2)
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+import unittest
+
+
+def loaded(code, modules):
+    """Which of `modules` a fresh interpreter has loaded after `code`."""
+    out = subprocess.check_output([sys.executable, "-c", code + "\n"
+                                   "import sys\n"
+                                   "print(sorted(m for m in {!r} "
+                                   "if m in sys.modules))".format(modules)],
+                                  stderr=subprocess.DEVNULL,
+                                  universal_newlines=True)
+    return eval(out.strip().splitlines()[-1])
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_package_import_defers_database_stack(self):
+        self.assertListEqual(
+            loaded("import piweather", ("sqlalchemy", "numpy")), [])
+
+    def test_sensor_import_defers_numpy(self):
+        self.assertListEqual(
+            loaded("import piweather.sensors", ("sqlalchemy", "numpy")), [])
+
+    def test_headless_startup_does_not_load_dashboard(self):
+        self.assertListEqual(
+            loaded("import piweather.main, piweather.sensors\n"
+                   "from piweather import Measurement",
+                   ("dash", "plotly", "flask")), [])
@@ -0,0 +1,106 @@
+import numpy as np
+import unittest
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from piweather import Measurement
+from piweather import sensors
+from piweather.database import Schema, get_schema
+from piweather.tail import TailWindow
+from test import TransientDBTestCase
+
+
+T0 = datetime(2017, 1, 1, 12)
+
+
+def row(i):
+    return dict(time=T0 + timedelta(seconds=i), random=i / 2., randint=i)
+
+
+class TestTailWindow(unittest.TestCase):
+
+    def test_capacity_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TailWindow(sensors.Dummy.dtypes, 0)
+
+    def test_ring_keeps_newest_rows_in_time_order(self):
+        tail = TailWindow(sensors.Dummy.dtypes, 4, complete_since=T0)
+        for i in range(1, 7):
+            tail.append(row(i))
+
+        self.assertEqual(len(tail), 4)
+        self.assertEqual(tail.nbytes, 4 * 3 * 8)
+        self.assertListEqual(list(tail.data()["randint"]), [3, 4, 5, 6])
+        self.assertListEqual(
+            list(tail.data(["randint"], since=row(4)["time"])["randint"]),
+            [5, 6])
+
+    def test_overwriting_rows_advances_complete_since(self):
+        tail = TailWindow(sensors.Dummy.dtypes, 2, complete_since=T0)
+        tail.append(row(1))
+        tail.append(row(2))
+        self.assertTrue(tail.covers(T0))
+
+        tail.append(row(3))
+        self.assertFalse(tail.covers(T0))
+        self.assertTrue(tail.covers(row(1)["time"]))
+
+    def test_warm_drops_rows_beyond_capacity(self):
+        tail = TailWindow(sensors.Dummy.dtypes, 3)
+        rows = [row(i) for i in range(5)]
+        tail.warm({col: np.array([r[col] for r in rows], dtype=type_)
+                   for col, type_ in (("time", "datetime64[us]"),
+                                      ("random", float), ("randint", int))},
+                  T0 - timedelta(hours=1))
+
+        self.assertListEqual(list(tail.data()["randint"]), [2, 3, 4])
+        self.assertEqual(tail.complete_since, row(1)["time"])
+
+
+class TestMeasurementTail(TransientDBTestCase):
+
+    def insert(self, table, rows):
+        schema = get_schema()
+        schema.register(table, sensors.Dummy.dtypes)
+        with schema.engine.begin() as con:
+            schema.write(con, table, rows)
+
+    def test_tail_is_warmed_from_database(self):
+        now = datetime.now()
+        self.insert("tailed", [dict(row(i), time=now - timedelta(hours=h))
+                               for i, h in enumerate((30, 2, 1))])
+
+        m = Measurement(sensors.Dummy(), table="tailed", tail=10)
+        self.assertListEqual(list(m.tail.data()["randint"]), [1, 2])
+
+    def test_covered_queries_skip_the_database(self):
+        m = Measurement(sensors.Dummy(), table="tailed", tail=10)
+        since = datetime.now()
+        m.acquire()
+        m.acquire()
+        expected = m.data(since=since - timedelta(days=2))
+
+        with patch.object(Measurement, "_select") as select:
+            data = m.data(since=since)
+        self.assertFalse(select.called)
+        self.assertListEqual(list(data["random"]), list(expected["random"]))
+        self.assertListEqual(list(data["time"]), list(expected["time"]))
+
+    def test_uncovered_queries_go_to_the_database(self):
+        m = Measurement(sensors.Dummy(), table="tailed", tail=1)
+        m.acquire()
+        m.acquire()
+
+        self.assertEqual(len(m.data(since=datetime.now() -
+                                    timedelta(hours=1))["random"]), 2)
+
+    def test_failed_writes_do_not_reach_the_tail(self):
+        m = Measurement(sensors.Dummy(), table="tailed", tail=10)
+        with patch.object(Schema, "write", side_effect=OSError("offline")):
+            with self.assertRaises(OSError):
+                m.acquire()
+        self.assertEqual(len(m.tail), 0)
+
+        m.acquire()
+        self.assertEqual(len(m.tail), 1)